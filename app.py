@@ -1,11 +1,13 @@
 # run with streamlit run app.py
 
+from time import perf_counter
+start = perf_counter()
+
 import streamlit as st
 from ressources.multipage import MultiPage
 from ressources.setup import *
-from ressources import pageALD, pageCVD, pagePEALD, pagePECVD, pagePlasmaClean
-from ressources import pagePulsedPECVD, pagePulsedCVD, pagePurge
 
+configure_page()
 app = MultiPage()
 
 st.markdown(
@@ -19,13 +21,21 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-app.add_page("ALD", pageALD.app)
-app.add_page("PEALD", pagePEALD.app)
-app.add_page("CVD", pageCVD.app)
-app.add_page("Pulsed CVD", pagePulsedCVD.app)
-app.add_page("PECVD", pagePECVD.app)
-app.add_page("Pulsed PECVD", pagePulsedPECVD.app)
-app.add_page("Plasma cleaning", pagePlasmaClean.app)
-app.add_page("Purge", pagePurge.app)
+# Pages are only imported when first selected
+app.add_page("ALD", "ressources.pageALD", group="ALD")
+app.add_page("PEALD", "ressources.pagePEALD", group="ALD")
+app.add_page("Supercycle ALD", "ressources.pageSupercycle", group="ALD")
+app.add_page("CVD", "ressources.pageCVD", group="CVD")
+app.add_page("Pulsed CVD", "ressources.pagePulsedCVD", group="CVD")
+app.add_page("PECVD", "ressources.pagePECVD", group="CVD")
+app.add_page("Pulsed PECVD", "ressources.pagePulsedPECVD", group="CVD")
+app.add_page("Plasma cleaning", "ressources.pagePlasmaClean", group="Maintenance")
+app.add_page("Purge", "ressources.pagePurge", group="Maintenance")
+app.add_page("Queue", "ressources.pageQueue", group="Queue")
+
+if observing():
+    watch_run(start)  # Ends with a rerun, reporting its render times itself
+else:
+    app.run()
+    record_render(start)
 
-app.run()
@@ -0,0 +1,2 @@
+# The scripts at the root talk to the real devices: they are not tests
+collect_ignore = ["test.py", "test_mks.py"]
@@ -1,3 +1,5 @@
 #!/bin/bash
 
+# The daemon owns the reactor, the app is one of its clients
+python -m ressources.daemon &
 streamlit run app.py
\ No newline at end of file
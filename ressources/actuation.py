@@ -0,0 +1,88 @@
+"""Concurrent actuation of devices sitting on independent buses."""
+
+import threading
+from collections import deque
+from time import perf_counter
+
+# Achieved transition skews (in s) since the last reset
+skews = deque(maxlen=100000)
+_skews_lock = threading.Lock()
+
+
+def on_bus(bus):
+    """
+    Decorator declaring on which bus a device action is sent.
+
+    Actions on different buses can be sent concurrently by `actuate()`.
+    """
+    def decorator(func):
+        func.bus = bus
+        return func
+    return decorator
+
+
+def _run_group(actions):
+    for func, args in actions:
+        func(*args)
+    return perf_counter()
+
+
+def actuate(*actions, pool=None, record=None):
+    """
+    Send simultaneous actions and wait for all of them.
+
+    Actions on the same bus are sent in the given order, actions on
+    independent buses are sent concurrently, so that the skew of the
+    transition is bounded by the slowest bus instead of the sum of them.
+
+    :param actions: tuples (func, *args), None entries are ignored
+    :param pool: executor of the caller (e.g. one per reactor) sending the
+    buses but the first one, which is sent from the calling thread; one
+    worker per other bus is enough. Without it, the buses are sent one after
+    the other.
+    :param record: deque where the skew is recorded, `skews` if None (e.g.
+    one per reactor)
+    :return: achieved skew in seconds, from the first send to the last
+    completion
+    """
+    groups = {}
+    for action in actions:
+        if action is None:
+            continue
+        func, args = action[0], action[1:]
+        groups.setdefault(getattr(func, "bus", None), []).append((func, args))
+    groups = list(groups.values())
+    start = perf_counter()
+    if not groups:
+        return 0.
+    if pool is None:
+        ends = [_run_group(group) for group in groups]
+    else:
+        # The first group is sent from the calling thread
+        futures = [pool.submit(_run_group, group) for group in groups[1:]]
+        ends = [_run_group(groups[0])]
+        ends += [future.result() for future in futures]
+    skew = max(ends) - start
+    with _skews_lock:
+        (skews if record is None else record).append(skew)
+    return skew
+
+
+def skew_summary(reset=True, record=None):
+    """
+    Return the number, mean and max of the recorded transition skews.
+
+    :param reset: clear the recorded skews afterwards
+    :param record: deque of the skews, `skews` if None
+    :return: dict with keys transitions, mean_skew and max_skew (in ms)
+    """
+    record = skews if record is None else record
+    with _skews_lock:
+        values = list(record)
+        if reset:
+            record.clear()
+    if not values:
+        return {"transitions": 0, "mean_skew": 0., "max_skew": 0.}
+    return {"transitions": len(values),
+            "mean_skew": round(1000 * sum(values) / len(values), 3),
+            "max_skew": round(1000 * max(values), 3)}
@@ -14,6 +14,7 @@ class CitoBase:
     (ETHERNET, SERIAL) = (0, 1)
     ethernet_timeout = 1.0  # Ethernet timeout in seconds
     serial_timeout = 1000  # serial timeout in milliseconds
+    port_class = serial.Serial  # Serial port, replaced to record or replay
 
     # Constants for parameters and values
     PNUM_COMMAND = 1001  # Command
@@ -198,7 +199,7 @@ class CitoBase:
 
         # Create serial socket
         elif self.host_mode == self.SERIAL:
-            self._socket = serial.Serial()
+            self._socket = self.port_class()
             try:
                 self._socket.setPort(self.host_addr)
                 self._socket.baudrate = self.baudrate
@@ -561,6 +562,27 @@ class CitoBase:
         :param value: Integer value
         :return: Exception code
         """
+        return self.send_prepared(self.prepare_write_integer(parameter, value))
+
+    def send_prepared(self, tx_array):
+        """
+        Send a write prepared in advance by prepare_write_integer().
+
+        :param tx_array: Data packet returned by prepare_write_integer()
+        :return: Exception code
+        """
+        rx_exception_code, rx_data = self._data_exchange(tx_array)
+        return rx_exception_code
+
+    def prepare_write_integer(self, parameter: int, value: int):
+        """
+        Encode the write of an integer value, to be sent later (possibly
+        several times) with send_prepared().
+
+        :param parameter: Parameter number
+        :param value: Integer value
+        :return: Data packet
+        """
         tx_array = [0x0A, 0x42, 0x00, 0x00]
         tx_array[2] = (parameter >> 8) & 0xFF
         tx_array[3] = parameter & 0xFF
@@ -571,10 +593,7 @@ class CitoBase:
                 tx_array.append(value_pack_byte)
             else:
                 tx_array.append(ord(value_pack_byte))
-
-        # Forward transmit data to data transfer function
-        rx_exception_code, rx_data = self._data_exchange(tx_array)
-        return rx_exception_code
+        return tx_array
 
     def write_float(self, parameter: int, value: float):
         """
@@ -0,0 +1,139 @@
+"""
+Command line client of the reactor daemon:
+
+    python -m ressources.cli reactors
+    python -m ressources.cli status
+    python -m ressources.cli run [--profile] [--record] ALD N=50 t1=0.02 cutCarrier=false
+    python -m ressources.cli stop
+    python -m ressources.cli events
+    python -m ressources.cli trace [--log LOG] [--cycles 10-20] > trace.json
+    python -m ressources.cli queue [add ALD N=50 | cancel ID | pause | resume]
+
+The reactor is chosen with --reactor NAME, the first one by default.
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+
+from ressources.client import Client
+
+
+def parse_params(items):
+    """
+    Recipe parameters from key=value arguments, values read as JSON when
+    possible (numbers, true/false) and as strings otherwise
+    """
+    params = {}
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Parameters are given as key=value ({item}).")
+        try:
+            params[key] = json.loads(value)
+        except json.JSONDecodeError:
+            params[key] = value
+    return params
+
+
+def _time(t):
+    return datetime.fromtimestamp(t).strftime("%H:%M:%S") if t else "-"
+
+
+def print_state(state):
+    if not state["running"]:
+        print(f"idle (last: {state.get('recipe', '-')}, "
+              f"{state.get('ending', 'no run')})")
+        return
+    steps = state.get("steps") or []
+    step = state.get("step", 0)
+    print(f"{state.get('recipe')}: cycle {state.get('cycle', '-')}/"
+          f"{state.get('N', '-')}, step {step} "
+          f"({steps[step-1] if 0 < step <= len(steps) else '-'}), "
+          f"end {_time(state.get('eta'))}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ressources.cli",
+                                     description="Control of the reactors "
+                                     "through their daemon")
+    parser.add_argument("--reactor", help="name of the reactor")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("reactors", help="reactors of the daemon")
+    commands.add_parser("status", help="state of the reactor")
+    run = commands.add_parser("run", help="start a recipe")
+    run.add_argument("--profile", action="store_true",
+                     help="profile the run, saved next to its log")
+    run.add_argument("--record", action="store_true",
+                     help="record the device traffic of the run, to replay "
+                     "it with python -m ressources.replay")
+    run.add_argument("recipe")
+    run.add_argument("params", nargs="*", metavar="key=value")
+    commands.add_parser("stop", help="stop the run and pause the queue")
+    commands.add_parser("events", help="follow the run")
+    trace = commands.add_parser("trace", help="Chrome trace of a run")
+    trace.add_argument("--log", help="log file of the run, the last run "
+                       "by default")
+    trace.add_argument("--cycles", help="range of cycles, e.g. 10-20")
+    queue = commands.add_parser("queue", help="show or change the queue")
+    queue.add_argument("action", nargs="?",
+                       choices=("add", "cancel", "pause", "resume"))
+    queue.add_argument("args", nargs="*")
+    args = parser.parse_args(argv)
+
+    client = Client(reactor=args.reactor)
+    try:
+        if args.command == "reactors":
+            for name, info in client.reactors().items():
+                gases = ", ".join(f"{actuator}={gas}"
+                                  for actuator, gas in info["gases"].items())
+                print(f"{name}: {gases}{', RF' if info['rf'] else ''}")
+        elif args.command == "status":
+            status = client.status()
+            print_state(status["run"])
+            print("relays: " + ", ".join(f"{gas} {'on' if on else 'off'}"
+                                         for gas, on in status["relays"].items()))
+            print(f"queue: {status['queue']['pending']} pending"
+                  f"{' (paused)' if status['queue']['paused'] else ''}")
+        elif args.command == "run":
+            if not client.run(args.recipe, parse_params(args.params),
+                              owner="cli", profile=args.profile,
+                              record=args.record):
+                print("The reactor is busy with another recipe.")
+                return 1
+            print(f"{args.recipe} started.")
+        elif args.command == "stop":
+            print(f"Stopped in {1000*client.stop():.1f} ms.")
+        elif args.command == "events":
+            for state in client.events():
+                print_state(state)
+        elif args.command == "trace":
+            client.trace(sys.stdout, args.log, args.cycles)
+        elif args.action == "add":
+            recipe, *params = args.args
+            print(client.enqueue(recipe, parse_params(params)))
+        elif args.action == "cancel":
+            client.cancel(args.args[0])
+        elif args.action in ("pause", "resume"):
+            client.set_queue(paused=args.action == "pause")
+        else:
+            status = client.queue()
+            print(f"{'paused' if status['paused'] else 'running'}, "
+                  f"{status['handoff']:g} s between recipes")
+            for entry in status["entries"]:
+                start, end = status["plan"].get(entry["id"], (None, None))
+                params = " ".join(f"{key}={value}"
+                                  for key, value in entry["params"].items())
+                print(f"{entry['id']} {entry['status']:>11} {_time(start)} → "
+                      f"{_time(end)}  {entry['recipe']} {params}")
+    except (ValueError, KeyError, ConnectionError) as error:
+        print(error, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':  # running sample
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""Client of the control API of the daemon (see ressources.daemon)."""
+
+import json
+import urllib.error
+import urllib.request
+from urllib.parse import quote, urlencode
+
+from ressources.config import daemon_address
+
+
+class Client:
+    """
+    Calls to the daemon owning the reactors, for one of them. Errors of the API are raised as
+    ValueError (invalid request, e.g. recipe parameters) and KeyError
+    (unknown queue entry), and ConnectionError when the daemon is not
+    running.
+    """
+
+    def __init__(self, address=daemon_address, reactor=None, timeout=5.):
+        """
+        :param address: (host, port) of the daemon
+        :param reactor: name of the reactor, the first one of the daemon if
+        None
+        :param timeout: timeout in s of the requests, waits excluded
+        """
+        self.url = f"http://{address[0]}:{address[1]}"
+        self.reactor = reactor
+        self.timeout = timeout
+
+    def _url(self, path):
+        if self.reactor is None:
+            return self.url + path
+        return (self.url + path + ("&" if "?" in path else "?") +
+                urlencode({"reactor": self.reactor}))
+
+    def _open(self, method, path, body=None, timeout=None):
+        data = None if body is None else json.dumps(body).encode()
+        request = urllib.request.Request(self._url(path), data=data,
+                                         method=method)
+        if data is not None:
+            request.add_header("Content-Type", "application/json")
+        try:
+            return urllib.request.urlopen(request, timeout=timeout)
+        except urllib.error.HTTPError as error:
+            message = json.loads(error.read() or b"{}").get("error", str(error))
+            if error.code == 404:
+                raise KeyError(message) from None
+            raise ValueError(message) from None
+        except (urllib.error.URLError, OSError) as error:
+            raise ConnectionError(f"The reactor daemon is not reachable at "
+                                  f"{self.url} ({error}).") from None
+
+    def _request(self, method, path, body=None, wait=0.):
+        with self._open(method, path, body, self.timeout + wait) as response:
+            return json.loads(response.read())
+
+    # Run
+
+    def reactors(self):
+        """Return the reactors of the daemon, see control.Reactor.info()"""
+        return self._request("GET", "/reactors")
+
+    def status(self):
+        """Return the state of the reactor, see control.Reactor.status()"""
+        return self._request("GET", "/status")
+
+    def wait(self, version, timeout=1.):
+        """
+        Wait until the run state differs from a known version, like
+        runstate.RunState.wait().
+
+        :return: tuple (version, run snapshot)
+        """
+        status = self._request("GET", "/status?" + urlencode(
+            {"after": version, "wait": timeout}), wait=timeout)
+        return status["version"], status["run"]
+
+    def events(self):
+        """Generator of the run states, the current one first"""
+        with self._open("GET", "/events") as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+
+    def run(self, recipe, params, owner=None, profile=False, record=False):
+        """
+        Start a recipe, see control.Reactor.start().
+
+        :return: False if the reactor is busy with another recipe
+        """
+        return self._request("POST", "/run", {"recipe": recipe,
+                                              "params": params,
+                                              "owner": owner,
+                                              "profile": profile,
+                                              "record": record})["started"]
+
+    def stop(self):
+        """Stop the run and pause the queue. Return the stop latency in s"""
+        return self._request("POST", "/stop", {})["latency"]
+
+    def idle(self):
+        """Idle state of the relays, if no recipe runs"""
+        self._request("POST", "/idle", {})
+
+    def set_plasma(self, power):
+        """Set the plasma power, see control.Reactor.set_plasma()"""
+        return self._request("POST", "/plasma", {"power": power})
+
+    def telemetry(self, cursor=None, channels=None):
+        """
+        Telemetry rows of the run not seen yet, like
+        timeseries.TimeSeries.since().
+        """
+        query = {}
+        if cursor is not None:
+            query["cursor"] = ",".join(map(str, cursor))
+        if channels is not None:
+            query["channels"] = ",".join(channels)
+        result = self._request("GET", "/telemetry?" + urlencode(query))
+        return (result["reset"], [tuple(row) for row in result["rows"]],
+                tuple(result["cursor"]))
+
+    def trace(self, out, log=None, cycles=None):
+        """
+        Write the Chrome trace of a run to a text file object, streamed
+        from the daemon.
+
+        :param log: log file of the run, the last run if None
+        :param cycles: range of cycles "first-last", the whole run if None
+        """
+        query = {key: value for key, value in (("log", log),
+                                               ("cycles", cycles)) if value}
+        with self._open("GET", "/trace?" + urlencode(query),
+                        timeout=self.timeout) as response:
+            for chunk in iter(lambda: response.read(1 << 16), b""):
+                out.write(chunk.decode())
+
+    def report_render(self, seconds, kind="rerun"):
+        """
+        Report the time a run of the app took ("cold" or "rerun"), or an
+        update of the page watching a run ("update")
+        """
+        self._request("POST", "/metrics/render", {"seconds": seconds,
+                                                  "kind": kind})
+
+    # Queue
+
+    def queue(self):
+        """Return the entries, settings and plan of the queue"""
+        return self._request("GET", "/queue")
+
+    def enqueue(self, recipe, params):
+        """Add a recipe run to the queue. Return the id of the entry"""
+        return self._request("POST", "/queue", {"recipe": recipe,
+                                                "params": params})["id"]
+
+    def set_queue(self, paused=None, handoff=None):
+        """Pause/resume the queue or change the handoff time"""
+        self._request("POST", "/queue/settings", {"paused": paused,
+                                                  "handoff": handoff})
+
+    def clear_queue(self):
+        """Forget the finished entries"""
+        self._request("POST", "/queue/clear", {})
+
+    def move(self, entry_id, offset):
+        """Move a pending entry by `offset` places"""
+        self._request("POST", f"/queue/{quote(entry_id)}/move",
+                      {"offset": offset})
+
+    def cancel(self, entry_id):
+        """Cancel an entry, stopping it if it is running"""
+        self._request("POST", f"/queue/{quote(entry_id)}/cancel", {})
+
+
+class RemoteSeries:
+    """
+    Telemetry of the daemon with the interface of timeseries.TimeSeries
+    used by livestatus.LiveChart
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def since(self, cursor, channels=None):
+        return self.client.telemetry(cursor, channels)
@@ -0,0 +1,93 @@
+"""Configuration of the reactor, shared by the daemon and its clients."""
+
+# # # # # # # # # # # # # # # # # # # # # # # #
+# Define default variables
+# # # # # # # # # # # # # # # # # # # # # # # #
+
+# Relays from the hat are commanded with I2C
+DEVICE_BUS = 1
+
+# Default precursor names
+Prec1 = "TEB"
+Prec2 = "H2"
+Prec3 = "TMA" # Third precursor line, for supercycles
+Carrier = "Ar"
+
+# Default recipe values
+default = {"t1": 15, # in ms
+           "p1": 40., # in s
+           "t2": 10., # in s
+           "p2": 40., # in s
+           "N": 100, # in s
+           "N2": 1, # in s
+           "plasma": 30} # in Watts
+t1 = default["t1"]
+p1 = default["p1"]
+t2 = default["t2"]
+p2 = default["p2"]
+N = default["N"]
+N2 = default["N2"]
+plasma = default["plasma"]
+
+# Relays attribution
+# Hat adress, relay number
+relays = {
+    Prec1: (0x10, 1),
+    Prec2: (0x10, 2),
+    Carrier: (0x10, 3),
+    Prec3: (0x10, 4)
+}
+
+# IP Address of the Cito Plus RF generator, connected by Ethernet
+# cito_address = "169.254.1.1"
+
+# Address of the Cito Plus RF generator, connected by RS232->USB
+cito_address = "/dev/ttyUSB0"
+
+# Address of the MKS 647C flow controller, connected by RS232->USB
+mks_address = "/dev/ttyUSB1"
+# Channel of the MKS controller measuring each gas flow
+mfc_channels = {Carrier: 1, Prec2: 2}
+
+# Reactors driven by the Pi, the first one by default. Each one has its
+# gases (name of the gas of each actuator of the recipes), the relays of its
+# gases on the hats of the I2C bus, its RF generator and MFC controller (None
+# if it has none), and the folder of its logs and of its queue
+reactors = {
+    "main": {"gases": {"Prec1": Prec1, "Prec2": Prec2, "Prec3": Prec3,
+                       "Carrier": Carrier},
+             "relays": relays,
+             "cito_address": cito_address,
+             "mks_address": mks_address,
+             "mfc_channels": mfc_channels,
+             "logs": "Logs"},
+    # A second chamber on a hat jumpered to another address:
+    # "second": {"gases": {"Prec1": "TMA", "Prec2": "O2", "Carrier": "N2"},
+    #            "relays": {"TMA": (0x11, 1), "O2": (0x11, 2), "N2": (0x11, 3)},
+    #            "cito_address": None,
+    #            "mks_address": "/dev/ttyUSB2",
+    #            "mfc_channels": {"N2": 1},
+    #            "logs": "Logs/second"},
+}
+
+# Interlocks verified on the timeline of the recipes before they run (see
+# ressources.interlocks). A recipe file relaxes them in its "interlocks"
+interlocks = {
+    # Precursors never open together
+    "exclusive": [["Prec1", "Prec2"], ["Prec1", "Prec3"], ["Prec2", "Prec3"]],
+    # Minimum purge between the pulses of two exclusive precursors
+    "min_purge": 1., # in s
+    # The RF is only on with one of these gases flowing
+    "rf_gases": ["Carrier", "Prec2"],
+    # Maximum time the RF stays on without interruption. The deposition
+    # recipes keep it on 120 s at most with their defaults (t1 of PECVD): a
+    # longer plasma is most likely a mistyped duration. The plasma cleaning,
+    # 500 s by default, sets its own limit.
+    "max_rf": 600., # in s
+}
+
+# Telemetry polling period during the runs
+telemetry_period = 1. # in s
+
+# Local address of the control API of the daemon (python -m ressources.daemon)
+daemon_address = ("127.0.0.1", 8642)
@@ -0,0 +1,898 @@
+"""
+Control of the reactors without any user interface: devices, recipe
+executors, queues and run states.
+
+It is imported by the daemon (python -m ressources.daemon), the only process
+owning the hardware. The Streamlit app and the command line are clients of
+its API (see ressources.client).
+"""
+
+import threading
+import time
+from time import perf_counter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
+from datetime import datetime, timedelta
+from dateutil import parser
+import ressources.citobase as cb
+import ressources.mksserial as mks
+import ressources.config as config
+from ressources.config import *
+from ressources.serialio import scheduler, SAFETY, SETPOINT, TELEMETRY
+from ressources.actuation import on_bus, actuate, skew_summary
+from ressources.i2cbus import shared_bus
+from ressources.setpoints import SetpointCache
+from ressources.runstate import RunState
+from ressources.statusblock import StatusBlock, TELEMETRY as STATUS_TELEMETRY
+from ressources.timeseries import TimeSeries
+from ressources.telemetry import TelemetryPoller
+from ressources.timeline import ACTUATORS, bits
+from ressources.engine import Backend, drive
+from ressources.recipes import compile_recipe
+from ressources.recipequeue import RecipeQueue, QueueRunner, PENDING
+from ressources.eta import OverheadModels, RemainingTime
+from ressources.preemption import Preemption
+from ressources.metrics import counter, histogram, gauge, OVERRUN
+from ressources.tracing import TraceRecorder
+from ressources.profiling import SamplingProfiler
+from ressources.replay import DeviceRecorder
+from ressources.interlocks import verify
+from tempfile import mkstemp
+from shutil import move, copymode
+import os
+
+# This module is imported once, by the daemon: everything defined here is
+# shared by all the clients. Devices are only opened on first use.
+
+# # # # # # # # # # # # # # # # # # # # # # # #
+# Devices
+# # # # # # # # # # # # # # # # # # # # # # # #
+
+@lru_cache(maxsize=None)
+def _cito(address):
+    """
+    RF generator on a port and the scheduler of the port, created once per
+    port
+    """
+    return cb.CitoBase(host_mode = 1, host_addr = address), scheduler(address)
+    # return cb.CitoBase(host_mode = 0, host_addr = address), ... # 0 for Ethernet
+
+
+@lru_cache(maxsize=None)
+def _mks(address):
+    """
+    MKS flow controller on a port and the scheduler of the port, created once
+    per port
+    """
+    return mks.MKS(address, host_timeout=1.0), scheduler(address)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # #
+# Log files
+# # # # # # # # # # # # # # # # # # # # # # # #
+
+def append_to_file(logfile="log.txt", text=""):
+    """
+    Function to easily append text to a logfile
+    """
+    with open(logfile, 'a') as fd:
+        fd.write(f'{text}\n')
+
+
+def replacement(filepath, pattern, replacement):
+    """
+    Function to replace a pattern in a file
+    """
+    # Creating a temp file
+    fd, abspath = mkstemp()
+    with os.fdopen(fd, 'w') as file1:
+        with open(filepath, 'r') as file0:
+            for line in file0:
+                file1.write(line.replace(pattern, replacement))
+    copymode(filepath, abspath)
+    os.remove(filepath)
+    move(abspath, filepath)
+
+
+def update_cycle(logname, i, N):
+    """
+    Function to write the current cycle number in the logfile
+    """
+    if i == 0:
+        write_to_log(logname, cycles_done=f"{i+1}/{N}")
+    else:
+        replacement(logname,
+                    f"cycles_done      {i}/{N}",
+                    f"cycles_done      {i+1}/{N}")
+
+
+def write_to_log(logname, **kwargs):
+    """
+    Function to easily create and update a logfile
+    """
+    os.makedirs(os.path.dirname(logname), exist_ok=True)
+    toprint = {str(key): str(value) for key, value in kwargs.items()}
+    append_to_file(logname, text='\n'.join('{:15}  {}'.format(
+        key, value) for key, value in toprint.items()))
+
+
+def published(recipe):
+    """
+    Decorator for the recipes of a reactor: whatever the way the recipe stops
+    (end, STOP or error), the clients are told it is not running anymore
+    """
+    @wraps(recipe)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return recipe(self, *args, **kwargs)
+        finally:
+            if self.run.snapshot()["running"]:
+                self.run.publish(running=False)
+    return wrapper
+
+
+def hold(run, duration, position, stop):
+    """
+    Wait for a step of a run on its stop event, publishing its schedule
+    position. Return False if the run was stopped in the meantime.
+    """
+    now = time.time()
+    run.publish(position=position, at=now, deadline=now+duration)
+    return not stop.wait(duration)
+
+
+class Reactor:
+    """
+    A chamber of the Pi with its own relays, RF generator, flow controller,
+    executor, queue and logs. The reactors run their recipes concurrently:
+    their relay hats share the I2C bus, whose access is arbitrated per
+    transaction (see ressources.i2cbus), and each one records its own
+    transition skews.
+    """
+
+    def __init__(self, name, gases, relays, cito_address=None,
+                 mks_address=None, mfc_channels={}, logs="Logs",
+                 block="aldpi_status"):
+        """
+        :param name: name of the reactor in the API
+        :param gases: gas of each actuator of the recipes (the RF is not a gas)
+        :param relays: (hat address, relay number) of each gas
+        :param cito_address: port of the RF generator, None if there is none
+        :param mks_address: port of the flow controller, None if there is none
+        :param mfc_channels: channel of the flow controller of each gas
+        :param logs: folder of the logs and of the queue of the reactor
+        :param block: name of the shared memory status block
+        """
+        self.name = name
+        self.gases = dict(gases)
+        self.relays = relays
+        self.carrier = self.gases.get("Carrier")
+        self.mfc_channels = mfc_channels
+        self.logs = logs
+        # Relays from the hats are commanded with I2C, shared with the other
+        # reactors
+        self.bus = shared_bus(DEVICE_BUS)
+        # All the I/O on a port goes through a single worker, RF commands first
+        self.ports = [port for port in (cito_address, mks_address) if port]
+        self.citoctrl, self.citoio = _cito(cito_address) if cito_address else (None, None)
+        # Setpoints are only sent to the RF generator when they change
+        self.citocache = SetpointCache()
+        if self.citoctrl is not None:
+            # RF commands encoded once, sent as a single write at the start
+            # of the steps
+            self.RF_ON = self.citoctrl.prepare_write_integer(
+                self.citoctrl.PNUM_COMMAND, self.citoctrl.PVAL_CMD_RFON)
+            self.RF_OFF = self.citoctrl.prepare_write_integer(
+                self.citoctrl.PNUM_COMMAND, self.citoctrl.PVAL_CMD_RFOFF)
+        # Runs the preparation of the next step while the current one goes on
+        self.preparer = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix=f"prepare-{name}")
+        self.mksctrl, self.mksio = _mks(mks_address) if mks_address else (None, None)
+        # Sends the RF commands while the relays are switched (one worker
+        # per bus but the first one, see actuation.actuate), not shared with
+        # the other reactors so that their transitions never wait on ours
+        self.actuation = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix=f"actuation-{name}")
+
+        # Telemetry polled during the runs, downsampled for the charts
+        self.telemetry = TimeSeries(["forward", "reflected", "step"] +
+                                    [f"flow{channel}"
+                                     for channel in mfc_channels.values()])
+        self.poller = TelemetryPoller(self.telemetry, period=telemetry_period,
+                                      name=f"telemetry-{name}")
+        self.poller.add_source(self._read_rf)
+        self.poller.add_source(self._read_flows)
+        self.poller.add_sink(self._publish_telemetry)
+
+        # Overheads of the steps, learned from the logs of the past runs
+        self.overheads = OverheadModels(logs)
+        # Last state written to each relay, to skip redundant writes on reruns
+        self.relay_state = {}
+        # Transition skews of the runs of this reactor only
+        self.skews = deque(maxlen=100000)
+        # Metrics of the executor, served by the daemon on GET /metrics
+        self.overrun = histogram("aldpi_step_overrun_seconds",
+                                 "Time the steps lasted over their planned "
+                                 "duration.", buckets=OVERRUN, reactor=name)
+        self.cycles = counter("aldpi_cycles_total", "Recipe cycles done.",
+                              reactor=name)
+        gauge("aldpi_cycles_per_hour", "Cycles per hour of the current run.",
+              self._cycles_per_hour, reactor=name)
+        # Spans of the steps and device calls of the current run, if any
+        self.tracer = None
+        # Device traffic of the current run, if it is recorded
+        self.recorder = None
+        # Device actions of the changes of the steps, built once
+        self._actions = lru_cache(maxsize=256)(self._build_actions)
+
+        # State of the run, published to the sessions watching it and to the
+        # status block in shared memory, for local monitoring tools
+        # (python -m ressources.statusblock)
+        self.run = RunState()
+        self.status_block = StatusBlock.create(block)
+        self.run.subscribe(self.status_block.update_from_run)
+        self._followed = {"started": None, "step": None}
+        self.run.subscribe(self._follow_run)
+
+        # Stop requests of the runs, from the STOP button of any session
+        self.preemption = Preemption(self.safe_state)
+        # Held during a run, so that queued and interactive runs never overlap
+        self.lock = threading.Lock()
+        self.queue = RecipeQueue(os.path.join(logs, "queue.json"))
+        # Started by the daemon
+        self.runner = QueueRunner(self.queue, self._execute_entry,
+                                  self.safe_state, self.lock)
+
+    ##########################################################################
+    # Devices
+    ##########################################################################
+
+    def span(self, track, name, start):
+        """
+        Record a span ending now in the trace of the run, if one is recorded
+        """
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.record(track, name, start)
+
+    def _io(self, track, name, io, func, *args, **kwargs):
+        """
+        Call a device through the scheduler of its port, recording the span
+        of the call (queue wait included) in the trace of the run
+        """
+        start = perf_counter()
+        try:
+            return io.call(func, *args, **kwargs)
+        finally:
+            self.span(track, name, start)
+
+    @on_bus("i2c")
+    def turn_ON(self, gas):
+        """
+        Open relay from the hat with I2C command
+        """
+        DEVICE_ADDR, rel = self.relays[gas]
+        start = perf_counter()
+        if gas != self.carrier:
+            self.bus.write_byte_data(DEVICE_ADDR, rel, 0xFF)
+        else:
+            self.bus.write_byte_data(DEVICE_ADDR, rel, 0x00) # Carrier Normally Open
+        self.span(f"Relay {gas}", "ON", start)
+        self.relay_state[gas] = True
+        self.status_block.update(relays=self._relay_bits())
+
+    @on_bus("i2c")
+    def turn_OFF(self, gas):
+        """
+        Close relay from the hat with I2C command
+        """
+        DEVICE_ADDR, rel = self.relays[gas]
+        start = perf_counter()
+        if gas != self.carrier:
+            self.bus.write_byte_data(DEVICE_ADDR, rel, 0x00)
+        else:
+            self.bus.write_byte_data(DEVICE_ADDR, rel, 0xFF) # Carrier Normally Open
+        self.span(f"Relay {gas}", "OFF", start)
+        self.relay_state[gas] = False
+        self.status_block.update(relays=self._relay_bits())
+
+    def _relay_bits(self):
+        """
+        Bitmask of the flowing gases, bit n-1 for relay n
+        """
+        return sum(1 << (self.relays[gas][1] - 1)
+                   for gas, on in self.relay_state.items() if on)
+
+    def _on_cito(self, func, *args):
+        """
+        Run a command on the RF generator, opening the connection if needed
+        """
+        if self.citoctrl.isopen() or self.citoctrl.open():
+            return func(*args)
+        return False
+
+    def _write_power(self, plasma):
+        """
+        Send the plasma power setpoint to the RF generator
+        """
+        return self._io("RF", "set power", self.citoio, self._on_cito,
+                        self.citoctrl.set_power_setpoint_watts, plasma,
+                        priority=SETPOINT) is not False
+
+    def _read_power(self):
+        """
+        Read the plasma power setpoint back from the RF generator
+        """
+        return self._io("RF", "read power", self.citoio,
+                        self.citoctrl.get_power_setpoint_watts,
+                        priority=TELEMETRY, key="power_setpoint")[1]
+
+    def set_plasma(self, plasma, logname=None):
+        """
+        Setup the plasma power, only talking to the RF generator if it
+        changed. When starting a recipe (logname given), the setpoint is
+        always written and read back.
+        Return a dict with the setpoint, whether the generator is connected
+        and the value read back.
+        """
+        starting = logname is not None
+        if self.citoctrl is not None and self.citocache.write(
+                "power_setpoint", plasma, self._write_power, plasma,
+                force=starting):
+            value = self.citocache.readback("power_setpoint", self._read_power,
+                                            max_age=0 if starting else None)
+            self.status_block.update(telemetry={"setpoint": value})
+            if logname is not None:
+                write_to_log(logname, plasma_active="Yes")
+            return {"setpoint": plasma, "connected": True, "readback": value}
+        if logname is not None:
+            write_to_log(logname, plasma_active="No")
+        return {"setpoint": plasma, "connected": False, "readback": None}
+
+    @on_bus("rf")
+    def HV_ON(self):
+        """
+        Turn HV on
+        """
+        self._io("RF", "RF on", self.citoio, self._on_cito,
+                 self.citoctrl.send_prepared, self.RF_ON, priority=SAFETY)
+        self.status_block.update(rf=True)
+
+    @on_bus("rf")
+    def HV_OFF(self):
+        """
+        Turn HV off
+        """
+        self._io("RF", "RF off", self.citoio, self._on_cito,
+                 self.citoctrl.send_prepared, self.RF_OFF,
+                 priority=SAFETY)  # turn off the rf
+        self.status_block.update(rf=False)
+
+    def prepare_rf(self):
+        """
+        Get the RF generator ready for a plasma step, during the previous
+        step: open the connection and check that the generator still holds
+        the power setpoint, writing it again if not
+        """
+        if self._io("RF", "connect", self.citoio, self._on_cito,
+                    self.citoctrl.isopen, priority=SETPOINT) is False:
+            return False
+        power = self.citocache.setpoint("power_setpoint")
+        if power is not None and self.citocache.readback(
+                "power_setpoint", self._read_power, max_age=0) != power:
+            return self.citocache.write("power_setpoint", power,
+                                        self._write_power, power, force=True)
+        return True
+
+    def prepare(self, changes):
+        """
+        Get the devices ready for the changes of the next step, in the
+        background
+        """
+        if (1, "RF") in changes and self.citoctrl is not None:
+            self.preparer.submit(self.prepare_rf)
+
+    ##########################################################################
+    # Telemetry
+    ##########################################################################
+
+    def _read_rf(self):
+        """
+        Forward and reflected power of the RF generator, in W.
+        The connection is not opened just for polling.
+        """
+        if self.citoctrl is None or not self.citoctrl.isopen():
+            return {}
+        return {"forward": self._io(
+                    "RF", "read forward", self.citoio,
+                    self.citoctrl.get_forward_power_watts,
+                    priority=TELEMETRY, key="forward")[1],
+                "reflected": self._io(
+                    "RF", "read reflected", self.citoio,
+                    self.citoctrl.get_reflected_power_watts,
+                    priority=TELEMETRY, key="reflected")[1]}
+
+    def _read_flows(self):
+        """
+        Actual flows measured by the MKS controller, in sccm
+        """
+        if self.mksctrl is None or not (
+                self.mksctrl.isopen() or
+                self._io("MFC", "connect", self.mksio, self.mksctrl.open,
+                         priority=SETPOINT)):
+            return {}
+        return {f"flow{channel}": self._io(f"MFC {gas}", "read flow",
+                                           self.mksio,
+                                           self.mksctrl.get_actual_flow,
+                                           channel, priority=TELEMETRY,
+                                           key=channel)
+                for gas, channel in self.mfc_channels.items()}
+
+    def _publish_telemetry(self, values):
+        """
+        Keep the readback snapshot and the status block up to date
+        """
+        for name, value in values.items():
+            self.citocache.update(name, value)
+        self.status_block.update(telemetry={
+            name: value for name, value in values.items()
+            if name in STATUS_TELEMETRY})
+
+    def _follow_run(self, state):
+        """
+        Poll the telemetry while a recipe runs, and mark its steps in the
+        charts
+        """
+        if state["running"] and state.get("started") != self._followed["started"]:
+            self._followed["started"] = state.get("started")
+            self.telemetry.clear(state.get("started"))
+            self.poller.start()
+        elif not state["running"]:
+            self.poller.stop()
+        if state.get("step") != self._followed["step"]:
+            self._followed["step"] = state.get("step")
+            self.telemetry.append(time.time(), {"step": state.get("step")})
+
+    def _cycles_per_hour(self):
+        """
+        Rate of the cycles of the current run, None if no run is going on
+        """
+        state = self.run.snapshot()
+        if not state["running"] or not state.get("started"):
+            return None
+        elapsed = time.time() - state["started"]
+        done = state.get("cycle", 1) - 1
+        return 3600 * done / elapsed if elapsed > 0 else 0.
+
+    ##########################################################################
+    # Safe and idle states
+    ##########################################################################
+
+    def initialize(self, on=("Carrier",), wait=-1):
+        """
+        Make sure the relays are closed, except those of the actuators `on`.
+        In the idle state (wait < 0), only the relays whose state differs from
+        the last written one are written.
+        """
+        for actuator, gas in self.gases.items():
+            flowing = actuator in on
+            if wait >= 0 or self.relay_state.get(gas) != flowing:
+                self.turn_ON(gas) if flowing else self.turn_OFF(gas)
+
+    @on_bus("rf")
+    def _rf_safe(self):
+        """
+        Turn the RF off and release the connection
+        """
+        if self._io("RF", "RF off", self.citoio, self._on_cito,
+                    self.citoctrl.send_prepared, self.RF_OFF,
+                    priority=SAFETY) is not False:
+            self._io("RF", "disconnect", self.citoio, self.citoctrl.close,
+                     priority=SAFETY)
+            self.status_block.update(rf=False)
+
+    def safe_state(self):
+        """
+        Close the precursor valves, keep the carrier flowing and turn the RF
+        off, the relays and the RF generator concurrently
+        """
+        actuate(*((self.turn_ON if gas == self.carrier else self.turn_OFF, gas)
+                  for gas in self.gases.values()),
+                (self._rf_safe,) if self.citoctrl is not None else None,
+                pool=self.actuation, record=self.skews)
+
+    def end_run(self):
+        """
+        Ending procedure for recipes, without any page update
+        """
+        self.safe_state()
+        if self.tracer is not None:
+            self.tracer.close()
+            self.tracer = None
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        skews = skew_summary(record=self.skews)
+        logname = self.run.snapshot().get("logname")
+        if logname and skews["transitions"] > 0:
+            write_to_log(logname, **skews)
+        self.run.end()
+
+    ##########################################################################
+    # Recipe engine
+    # The recipes are defined in the files of ressources/recipes/
+    ##########################################################################
+
+    def check(self, recipe):
+        """
+        Raise ValueError if a compiled recipe uses an actuator that this
+        reactor does not have, or breaks the interlocks (see
+        ressources.interlocks).
+        """
+        used = {actuator for actuator, dose in recipe.dose().items()
+                if dose["pulses"] or dose["time"]}
+        used |= {actuator for actuator in ACTUATORS
+                 if recipe.start_state & bits([actuator])}
+        missing = sorted(actuator for actuator in used
+                         if actuator not in self.gases and
+                         (actuator != "RF" or self.citoctrl is None))
+        if recipe.plasma is not None and self.citoctrl is None:
+            missing.append("RF")
+        if missing:
+            raise ValueError(f"The reactor {self.name} has no "
+                             f"{', '.join(sorted(set(missing)))}.")
+        broken = verify(recipe, self.gases)
+        if broken:
+            raise ValueError(f"{recipe.name} breaks the interlocks: "
+                             f"{'; '.join(broken)}.")
+
+    def _build_actions(self, changes):
+        """
+        Device actions of changes as returned by engine.changes()
+        """
+        actions = []
+        for on, name in changes:
+            if name == "RF":
+                actions.append((self.HV_ON,) if on else (self.HV_OFF,))
+            else:
+                actions.append((self.turn_ON if on else self.turn_OFF,
+                                self.gases[name]))
+        return tuple(actions)
+
+    def switch(self, changes):
+        """
+        Actuate changes as returned by engine.changes(), all at once
+        """
+        actuate(*self._actions(changes), pool=self.actuation,
+                record=self.skews)
+
+    def publish_cycle(self, loops):
+        """
+        Tell the observers the current cycle and sub-cycle
+        """
+        (i, N) = loops[0]
+        if len(loops) > 1:
+            j, N2 = loops[1]
+            self.run.publish(cycle=i+1, N=N, subcycle=j+1, N2=N2, loops=loops)
+        else:
+            self.run.publish(cycle=i+1, N=N, loops=loops)
+
+    def _run_started(self, recipe, owner, profile, record):
+        try:
+            self.execute(recipe, owner, self.preemption.arm(), profile, record)
+        finally:
+            self.safe_state()
+            self.lock.release()
+
+    def _profiled(self, executor):
+        """
+        Function selecting the threads of a run for the profiler: its
+        executor and the device and telemetry threads of the reactor
+        """
+        names = ({f"serialio {port}" for port in self.ports} |
+                 {self.poller.name})
+        prefixes = (f"actuation-{self.name}_", f"prepare-{self.name}_")
+        return lambda thread: (thread is executor or thread.name in names or
+                               thread.name.startswith(prefixes))
+
+    @published
+    def execute(self, recipe, owner, stop, profile=False, record=False):
+        """
+        Run a compiled recipe, from a background thread. The run is published
+        for the sessions watching it, and waits on the stop event instead of
+        sleeping: it stops as soon as the event is set.
+
+        :param profile: profile the threads of the run, see
+        ressources.profiling
+        :param record: record the device traffic of the run, see
+        ressources.replay
+        :return: True if the recipe went to its end
+        """
+        run, preemption = self.run, self.preemption
+        with preemption.actuating(stop) as allowed:
+            if allowed:
+                self.initialize(on=[actuator for actuator in self.gases
+                                    if recipe.start_state & bits([actuator])],
+                                wait=0)
+        wait, now = max(recipe.wait, 0), time.time()
+        run.begin(owner=owner, recipe=recipe.name, title=recipe.title,
+                  step=1, steps=["Starting recipe in..."], schedule=([wait], 1),
+                  position=0., at=now, deadline=now+wait, profile=profile)
+        if stop.wait(wait):
+            self.end_run()
+            return False
+        start_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
+        logname = os.path.join(self.logs, f"{start_time}_{recipe.name}.txt")
+        os.makedirs(self.logs, exist_ok=True)
+        # Timeline of the run, see ressources.tracing
+        self.tracer = TraceRecorder(logname[:-len(".txt")] + ".trace")
+        if record:
+            self.recorder = DeviceRecorder(
+                logname[:-len(".txt")] + ".replay.jsonl", self, recipe)
+        expected = self.overheads.expected(recipe)
+        cycle_time = expected/recipe.cycles if recipe.cycles else 0.
+        run.publish(started=time.time(), logname=logname, start_time=start_time,
+                    cycle_time=cycle_time, eta=time.time()+expected,
+                    schedule=recipe.schedule(), position=0., at=time.time())
+        # Features of the run, for the overhead models of the next ones
+        features = dict(planned=recipe.total, n_steps=recipe.steps,
+                        n_cycles=recipe.cycles)
+        if recipe.log_cycle_time:
+            write_to_log(logname, recipe=recipe.name, start=start_time,
+                         reactor=self.name, **recipe.log,
+                         time_per_cycle=timedelta(seconds=cycle_time),
+                         **features)
+        else:
+            write_to_log(logname, recipe=recipe.name, start=start_time,
+                         reactor=self.name, **recipe.log, **features)
+        if record:
+            write_to_log(logname, recording=self.recorder.path)
+        profiler = (SamplingProfiler(self._profiled(threading.current_thread()))
+                    .start() if profile else None)
+        try:
+            completed = drive(recipe, DeviceBackend(self, recipe, logname, stop))
+        finally:
+            if profiler is not None:
+                profiler.stop()
+                write_to_log(logname, profile=profiler.save(logname[:-len(".txt")]))
+        end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
+        ending, latency = "normal" if completed else "cancelled", {}
+        if not completed and preemption.stop_latency() is not None:
+            # Stopped from a STOP button, the reactor is already safe
+            ending = "forced"
+            latency = {"stop_latency": f"{preemption.latency*1000:.1f} ms" +
+                       (f" (over {preemption.bound*1000:.0f} ms)"
+                        if preemption.late else "")}
+        write_to_log(logname, end=end_time,
+                     duration=f"{parser.parse(end_time)-parser.parse(start_time)}",
+                     ending=ending, **latency)
+        run.publish(ending=ending)
+        self.end_run()
+        return completed
+
+    ##########################################################################
+    # Recipe queue
+    # Recipes run unattended, one after the other, by a background thread
+    ##########################################################################
+
+    def _execute_entry(self, entry, stop):
+        recipe = compile_recipe(entry["recipe"], **entry["params"])
+        self.check(recipe)
+        return self.execute(recipe, owner="queue",
+                            stop=self.preemption.arm(stop))
+
+    def queued_duration(self, entry):
+        """
+        Expected duration of a queue entry in s, from its compiled recipe
+        """
+        try:
+            recipe = compile_recipe(entry["recipe"], **entry["params"])
+        except ValueError:
+            return 0.
+        return self.overheads.expected(recipe) + max(recipe.wait, 0)
+
+    ##########################################################################
+    # Control API
+    # What the clients can do, served by ressources.daemon
+    ##########################################################################
+
+    def start(self, name, params, owner=None, profile=False, record=False):
+        """
+        Start a recipe file of ressources/recipes/ in the background, with
+        some of its parameters overridden. Raise ValueError if they are
+        invalid or if the recipe needs an actuator this reactor lacks.
+
+        :param owner: id of the client starting the run
+        :param profile: profile the run, see ressources.profiling
+        :param record: record the device traffic of the run, see
+        ressources.replay
+        :return: False if the reactor is busy with another recipe
+        """
+        recipe = compile_recipe(name, **params)
+        self.check(recipe)
+        if not self.lock.acquire(blocking=False):
+            return False
+        version = self.run.version
+        threading.Thread(target=self._run_started, daemon=True,
+                         name=f"recipe-{self.name}",
+                         args=(recipe, owner, profile, record)).start()
+        self.run.wait(version, timeout=1.)
+        return True
+
+    def stop(self):
+        """
+        Forced ending of the current recipe, if any, and pause of the queue.
+        The reactor is put in a safe state right away; the run then ends and
+        logs the stop latency by itself.
+
+        :return: stop latency in s
+        """
+        latency = self.preemption.stop()
+        self.runner.pause()
+        state = self.run.snapshot()
+        if state.get("logname") and not state["ended"] and not state["running"]:
+            # Run that failed before writing its ending
+            end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
+            duration = f"{parser.parse(end_time)-parser.parse(state['start_time'])}"
+            write_to_log(state['logname'], end=end_time,
+                         duration=duration,
+                         ending="forced")
+            self.end_run()
+        return latency
+
+    def idle(self):
+        """
+        Put the reactor in its idle state (precursors closed, carrier on)
+        when no recipe runs, only writing the relays whose state differs
+        """
+        if self.lock.acquire(blocking=False):
+            try:
+                self.initialize(wait=-1)
+            finally:
+                self.lock.release()
+
+    def enqueue(self, name, params):
+        """
+        Add a recipe run to the queue. Raise ValueError if the parameters are
+        invalid.
+
+        :return: id of the new entry
+        """
+        self.check(compile_recipe(name, **params))
+        entry_id = self.queue.add(name, params)
+        self.runner.wake()
+        return entry_id
+
+    def queue_status(self):
+        """
+        Entries of the queue, its settings, and the expected start and end
+        times of the running and pending entries as {id: [start, end]}
+        """
+        return {"entries": self.queue.snapshot(), "paused": self.queue.paused,
+                "handoff": self.queue.handoff,
+                "plan": {entry["id"]: [start, end]
+                         for entry, start, end
+                         in self.queue.eta(self.queued_duration)}}
+
+    def status(self):
+        """
+        State of the reactor: current run (see runstate.RunState), relays and
+        last readings
+        """
+        return {"reactor": self.name, "version": self.run.version,
+                "run": self.run.snapshot(),
+                "relays": dict(self.relay_state),
+                "readings": {name: value for name, (value, age)
+                             in self.citocache.snapshot().items()},
+                "queue": {"paused": self.queue.paused,
+                          "pending": sum(entry["status"] == PENDING
+                                         for entry in self.queue.snapshot())}}
+
+    def info(self):
+        """
+        Description of the reactor for the clients: its gases, its MFC
+        channels and whether it has an RF generator
+        """
+        return {"gases": self.gases, "mfc_channels": self.mfc_channels,
+                "rf": self.citoctrl is not None}
+
+
+class DeviceBackend(Backend):
+    """
+    Backend of the recipe engine driving the devices of a reactor. The run
+    is published to the sessions watching it, and stopped as soon as its
+    stop event is set: the waits return, and no actuation is sent anymore.
+    """
+
+    def __init__(self, reactor, recipe, logname, stop):
+        self.reactor = reactor
+        self.recipe = recipe
+        self.logname = logname
+        self.stop = stop
+        self.began = self.cycle_began = perf_counter()
+        self.remaining = RemainingTime.of(reactor.overheads.get(recipe.name),
+                                          recipe)
+
+    def actuate(self, changes):
+        self.began = perf_counter()
+        with self.reactor.preemption.actuating(self.stop) as allowed:
+            if allowed:
+                self.reactor.switch(changes)
+        recorder = self.reactor.recorder
+        if recorder is not None:
+            recorder.record("transition", self.began, changes=changes,
+                            duration=perf_counter() - self.began)
+
+    def plasma(self, power):
+        self.reactor.run.publish(rf=self.reactor.set_plasma(power,
+                                                            self.logname))
+
+    def cycle(self, loops):
+        tracer = self.reactor.tracer
+        if tracer is not None and tracer.cycle != loops[0][0] + 1:
+            tracer.cycle, self.cycle_began = loops[0][0] + 1, perf_counter()
+        self.reactor.publish_cycle(loops)
+
+    def cycle_done(self, iteration, count):
+        update_cycle(self.logname, iteration, count)
+        self.reactor.cycles.inc()
+        self.remaining.cycle_done()
+        # The cycle is in the record: one name for all, see tracing.MAX_NAMES
+        self.reactor.span("Cycles", "cycle", self.cycle_began)
+
+    def step(self, step, labels):
+        self.reactor.run.publish(step=step.index+1, steps=labels)
+
+    def prepare(self, changes):
+        self.reactor.prepare(changes)
+
+    def wait(self, step, position):
+        try:
+            return hold(self.reactor.run, step.duration, position, self.stop)
+        finally:
+            # From the actuation of the step to its end
+            self.reactor.span("Steps", self.recipe.labels[step.index],
+                               self.began)
+
+    def step_done(self, step, elapsed):
+        self.reactor.overrun.observe(elapsed - step.duration)
+        self.remaining.step_done(step.duration, elapsed)
+        self.reactor.run.publish(eta=time.time() + self.remaining.remaining)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # #
+# Reactors of the Pi
+# # # # # # # # # # # # # # # # # # # # # # # #
+
+# Built by load() on first use: importing this module opens nothing, so that
+# tools building a reactor of their own (ressources.replay) leave the devices
+# and the status blocks of the daemon alone
+reactors = {}
+_loading = threading.Lock()
+
+
+def load():
+    """Build the reactors of config.reactors, once, and return them by name."""
+    with _loading:
+        if not reactors:
+            for i, (name, settings) in enumerate(config.reactors.items()):
+                # The first reactor keeps the name of the status block of a
+                # single reactor
+                reactors[name] = Reactor(name, block="aldpi_status" if i == 0
+                                         else f"aldpi_status_{name}",
+                                         **settings)
+    return reactors
+
+
+def get(name=None):
+    """
+    Return a reactor by name, the first one by default.
+    Raise KeyError if there is no such reactor.
+    """
+    load()
+    if name is None:
+        return next(iter(reactors.values()))
+    if name not in reactors:
+        raise KeyError(f"reactor {name}")
+    return reactors[name]
@@ -0,0 +1,266 @@
+"""
+Headless daemon owning the reactors, serving their control API over HTTP on
+the local host:
+
+    python -m ressources.daemon [--host HOST] [--port PORT]
+
+Requests and responses are JSON. Every request may name its reactor with
+?reactor=NAME, the first reactor of config.reactors by default:
+
+    GET  /reactors               reactors of the Pi (control.Reactor.info())
+    GET  /status                 state of the reactor (Reactor.status())
+    GET  /status?after=V&wait=S  same, as soon as the run state differs from
+                                 version V (or after S seconds)
+    GET  /events                 run states as JSON lines, streamed
+    GET  /telemetry?cursor=C     telemetry rows of the run since cursor C
+    POST /run                    {"recipe", "params", "owner", "profile",
+                                 "record"}: start a recipe, profiled if
+                                 profile is true, its device traffic
+                                 recorded if record is true
+    POST /stop                   stop the run, in a safe state, pause the queue
+    POST /idle                   idle state of the relays, if no recipe runs
+    POST /plasma                 {"power"}: set the plasma power
+    GET  /queue                  entries, settings and plan of the queue
+    POST /queue                  {"recipe", "params"}: add an entry
+    POST /queue/settings         {"paused", "handoff"}
+    POST /queue/clear            forget the finished entries
+    POST /queue/<id>/move        {"offset"}: move a pending entry
+    POST /queue/<id>/cancel      cancel an entry, stopping it if running
+    GET  /metrics                metrics in the Prometheus text format
+    GET  /trace?log=L&cycles=A-B Chrome trace of a run (of its log file L,
+                                 the last run by default), streamed
+    POST /metrics/render         {"seconds", "kind"}: render time of the app,
+                                 or of an update of the run it watches
+
+The port is only bound to the local host: anyone on the Raspberry Pi can
+control the reactors, nobody else.
+"""
+
+import argparse
+import json
+import os
+import traceback
+from time import perf_counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import ressources.control as control
+import ressources.metrics as metrics
+from ressources.tracing import export, parse_cycles
+from ressources.config import daemon_address
+
+# Time in s between two empty lines of the event stream, to detect the
+# clients that left
+KEEPALIVE = 15.
+
+# Render times of the pages of the app, reported by its sessions
+render_times = {kind: metrics.histogram("aldpi_ui_render_seconds",
+                                        "Time spent running the app for a "
+                                        "page.", buckets=metrics.RENDER,
+                                        kind=kind)
+                for kind in ("cold", "rerun", "update")}
+
+
+def _field(body, key):
+    if key not in body:
+        raise ValueError(f"Missing field ({key}).")
+    return body[key]
+
+
+class _Text:
+    """Text writer on the binary stream of a response"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        self.stream.write(text.encode())
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Routes the requests of the API to the reactors of ressources.control
+    """
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        pass  # The clients poll the status: the runs have their own logs
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            reactor = control.get(query.get("reactor"))
+            if method == "GET" and parts == ["events"]:
+                return self._stream(reactor)
+            if method == "GET" and parts == ["trace"]:
+                return self._trace(reactor, query)
+            if method == "GET" and parts == ["metrics"]:
+                return self._send(200, metrics.exposition().encode(),
+                                  "text/plain; version=0.0.4")
+            body = self._body() if method == "POST" else {}
+            self._reply(200, self._route(reactor, method, parts, query, body))
+        except ValueError as error:
+            self._reply(400, {"error": str(error)})
+        except KeyError as error:
+            self._reply(404, {"error": f"Not found ({error.args[0]})."})
+        except Exception as error:
+            # A bug, not a bad request: logged by the daemon, and reported to
+            # the client instead of a dropped connection
+            traceback.print_exc()
+            self._reply(500, {"error": f"Internal error ({error!r})."})
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except json.JSONDecodeError as error:
+            raise ValueError(f"Invalid JSON: {error}") from None
+        if not isinstance(body, dict):
+            raise ValueError("The body must be an object.")
+        return body
+
+    def _reply(self, code, payload):
+        self._send(code, json.dumps(payload, default=str).encode(),
+                   "application/json")
+
+    def _send(self, code, data, content_type):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self, reactor, method, parts, query, body):
+        if method == "GET" and parts == ["reactors"]:
+            return {name: other.info()
+                    for name, other in control.load().items()}
+        if method == "GET" and parts == ["status"]:
+            if "after" in query:
+                reactor.run.wait(int(query["after"]), timeout=float(query.get("wait", 1.)))
+            return reactor.status()
+        if method == "GET" and parts == ["telemetry"]:
+            cursor = query.get("cursor")
+            cursor = tuple(map(int, cursor.split(","))) if cursor else None
+            channels = query.get("channels")
+            reset, rows, cursor = reactor.telemetry.since(
+                cursor, channels.split(",") if channels else None)
+            return {"reset": reset, "rows": rows, "cursor": cursor}
+        if method == "GET" and parts == ["queue"]:
+            return reactor.queue_status()
+        if method == "POST" and parts == ["run"]:
+            return {"started": reactor.start(_field(body, "recipe"),
+                                             body.get("params", {}),
+                                             body.get("owner"),
+                                             bool(body.get("profile")),
+                                             bool(body.get("record")))}
+        if method == "POST" and parts == ["stop"]:
+            return {"latency": reactor.stop()}
+        if method == "POST" and parts == ["idle"]:
+            reactor.idle()
+            return {}
+        if method == "POST" and parts == ["plasma"]:
+            return reactor.set_plasma(_field(body, "power"))
+        if method == "POST" and parts == ["metrics", "render"]:
+            kind = body.get("kind", "rerun")
+            if kind not in render_times:
+                raise ValueError(f"Unknown render kind ({kind}).")
+            seconds = float(_field(body, "seconds"))
+            render_times[kind].observe(seconds)
+            reactor.span("UI", f"render ({kind})", perf_counter() - seconds)
+            return {}
+        if method == "POST" and parts == ["queue"]:
+            return {"id": reactor.enqueue(_field(body, "recipe"),
+                                          body.get("params", {}))}
+        if method == "POST" and parts == ["queue", "settings"]:
+            reactor.queue.set(paused=body.get("paused"),
+                              handoff=body.get("handoff"))
+            if body.get("paused") is False:
+                reactor.runner.wake()
+            elif body.get("paused"):
+                reactor.runner.pause()
+            return {}
+        if method == "POST" and parts == ["queue", "clear"]:
+            reactor.queue.clear()
+            return {}
+        if method == "POST" and len(parts) == 3 and parts[0] == "queue":
+            if parts[2] == "move":
+                reactor.queue.move(parts[1], int(_field(body, "offset")))
+                return {}
+            if parts[2] == "cancel":
+                reactor.runner.cancel(parts[1])
+                return {}
+        raise KeyError(self.path)
+
+    def _trace(self, reactor, query):
+        """Stream the Chrome trace of a run, see ressources.tracing"""
+        logname = query.get("log") or reactor.run.snapshot().get("logname")
+        if not logname:
+            raise KeyError("trace")
+        # Only the logs of the reactor can be read
+        path = os.path.join(reactor.logs, os.path.basename(logname))
+        path = os.path.splitext(path)[0] + ".trace"
+        if not os.path.exists(path + ".json"):
+            raise KeyError(os.path.basename(path))
+        cycles = parse_cycles(query.get("cycles"))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        try:
+            export(path, _Text(self.wfile), cycles)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _stream(self, reactor):
+        """Send the run state, then each new one, as JSON lines"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        run = reactor.run
+        version, state = run.version, run.snapshot()
+        line = json.dumps(state, default=str)
+        try:
+            while True:
+                self.wfile.write(f"{line}\n".encode())
+                self.wfile.flush()
+                latest, state = run.wait(version, timeout=KEEPALIVE)
+                line = json.dumps(state, default=str) if latest != version else ""
+                version = latest
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def serve(address=daemon_address):
+    """
+    Start the queue runners and serve the API until interrupted, then leave
+    the reactors in a safe state
+    """
+    server = ThreadingHTTPServer(address, Handler)
+    server.daemon_threads = True
+    for reactor in control.load().values():
+        reactor.runner.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for reactor in control.load().values():
+            reactor.preemption.stop()
+
+
+if __name__ == '__main__':  # running sample
+    parser = argparse.ArgumentParser(description="Headless daemon owning "
+                                     "the reactors, with a local control API")
+    parser.add_argument("--host", default=daemon_address[0])
+    parser.add_argument("--port", type=int, default=daemon_address[1])
+    args = parser.parse_args()
+    serve((args.host, args.port))
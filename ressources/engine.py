@@ -0,0 +1,220 @@
+"""Recipe engine: drives a compiled recipe on a backend (devices or dry run)."""
+
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from ressources.timeline import ACTUATORS, bits
+
+# Bitmask of each actuator
+_BIT = {name: 1 << bit for bit, name in enumerate(ACTUATORS)}
+
+
+@lru_cache(maxsize=1024)
+def changes(before, after):
+    """
+    Actuator changes between two states (bitmasks), closings first.
+
+    :return: tuple of (on, actuator name)
+    """
+    return tuple(sorted((after >> bit & 1, name)
+                        for bit, name in enumerate(ACTUATORS)
+                        if (before ^ after) >> bit & 1))
+
+
+class Backend:
+    """
+    What the engine drives. This base class does nothing and does not wait:
+    subclasses implement the methods they need.
+    """
+
+    def now(self):
+        """Current time in s, for the step overheads."""
+        return time.monotonic()
+
+    def actuate(self, changes):
+        """Apply changes as returned by changes(), all at once."""
+
+    def plasma(self, power):
+        """Set the plasma power before the first step."""
+
+    def cycle(self, loops):
+        """
+        Called when entering a new iteration of a loop.
+
+        :param loops: tuple of (iteration, count) of the enclosing loops
+        """
+
+    def cycle_done(self, iteration, count):
+        """Called when an iteration of the main loop is done."""
+
+    def step(self, step, labels):
+        """Called when a step starts, after its actuation."""
+
+    def prepare(self, changes):
+        """
+        Called at the start of a step with the changes of the next one, to
+        get them ready during the current step. Must not block.
+        """
+
+    def wait(self, step, position):
+        """
+        Wait for the duration of a step.
+
+        :param position: time in s of the step start in the schedule
+        :return: False to stop the run
+        """
+        return True
+
+    def step_done(self, step, elapsed):
+        """Called when a step is done, `elapsed` s after its start."""
+
+
+def drive(recipe, backend):
+    """
+    Run a compiled recipe: actuate the changes between consecutive steps,
+    wait for each step, and end in the start state without plasma.
+
+    :return: True if the recipe went to its end
+    """
+    state, shown, cycle, position = recipe.start_state, None, (), 0.
+    if recipe.plasma is not None:
+        backend.plasma(recipe.plasma)
+    completed = True
+    steps = recipe.iter_steps()
+    upcoming = next(steps, None)
+    while upcoming is not None:
+        step, loops = upcoming
+        upcoming = next(steps, None)
+        if loops[:1] != cycle:
+            if cycle:
+                backend.cycle_done(*cycle[0])
+            cycle = loops[:1]
+        if loops != shown:
+            if loops:
+                backend.cycle(loops)
+            shown = loops
+        began = backend.now()
+        backend.actuate(changes(state, step.state))
+        state = step.state
+        backend.step(step, recipe.labels)
+        if upcoming is not None:
+            backend.prepare(changes(state, upcoming[0].state))
+        if not backend.wait(step, position):
+            completed = False
+            break
+        position += step.duration
+        backend.step_done(step, backend.now() - began)
+    if cycle and completed:
+        backend.cycle_done(*cycle[0])
+    backend.actuate(changes(state, recipe.start_state & ~bits(["RF"])))
+    return completed
+
+
+class DryRun(Backend):
+    """
+    No-op backend on a virtual clock, recording what the engine does:
+    the actuations as (time in s, actuator, on), the steps run as
+    (label index, start, duration), the final state, and the end of each
+    iteration of the main loop as (actuation count, step count, time).
+    """
+
+    def __init__(self, recipe, overhead=0.):
+        """
+        :param overhead: time in s added to each step, e.g. the per-step
+        overhead of an eta.OverheadModel
+        """
+        self.overhead = overhead
+        self.t = 0.
+        self.actions = []
+        self.steps = []
+        self.cycles = []
+        self.power = None
+        self.state = recipe.start_state
+
+    def now(self):
+        return self.t
+
+    def actuate(self, changes):
+        for on, name in changes:
+            self.actions.append((self.t, name, on == 1))
+            self.state ^= _BIT[name]
+
+    def plasma(self, power):
+        self.power = power
+
+    def cycle_done(self, iteration, count):
+        self.cycles.append((len(self.actions), len(self.steps), self.t))
+
+    def wait(self, step, position):
+        self.steps.append((step.index, self.t, step.duration))
+        self.t += step.duration + self.overhead
+        return True
+
+
+ACTION = np.dtype([("t", float), ("actuator", "U8"), ("on", bool)])
+STEP = np.dtype([("label", int), ("start", float), ("duration", float)])
+
+
+class Trace:
+    """
+    Result of a dry run: actions and steps are structured arrays with the
+    fields of ACTION and STEP, state is the final state (dict actuator ->
+    on), duration the total duration in s.
+    """
+
+    def __init__(self, actions, steps, state, power, duration, labels):
+        self.actions = actions
+        self.steps = steps
+        self.state = state
+        self.power = power
+        self.duration = duration
+        self.labels = labels
+
+
+def _repeat(segment, times, period, field):
+    """Copies of a segment following it, each shifted by `period`."""
+    repeated = np.tile(segment, times)
+    repeated[field] += np.repeat(np.arange(1, times + 1) * period,
+                                 len(segment))
+    return repeated
+
+
+def dry_run(recipe, overhead=0.):
+    """
+    Run a compiled recipe on a DryRun backend, on a virtual clock.
+
+    The iterations of the main loop after the first one all start in the
+    same state, so they drive the devices the same way: the engine runs a
+    copy of the recipe with 3 iterations only, and the second one stands
+    for all the middle ones. A 100,000-cycle recipe is thus traced in a few
+    ms, still through drive().
+
+    :return: Trace
+    """
+    cycles = recipe.cycles
+    short = recipe.with_cycles(3) if cycles > 3 else recipe
+    if short.steps == recipe.steps:
+        # Main loop without any step (e.g. a supercycle of 0 subcycles):
+        # nothing to scale, and no iteration end to scale from
+        short = recipe
+    backend = DryRun(short, overhead)
+    drive(short, backend)
+    actions = np.array(backend.actions, dtype=ACTION)
+    steps = np.array(backend.steps, dtype=STEP)
+    duration = backend.t
+    if short is not recipe:
+        (a0, s0, t0), (a1, s1, t1) = backend.cycles[:2]
+        period, extra = t1 - t0, cycles - 3
+        actions = np.concatenate((actions[:a1],
+                                  _repeat(actions[a0:a1], extra, period, "t"),
+                                  actions[a1:]))
+        steps = np.concatenate((steps[:s1],
+                                _repeat(steps[s0:s1], extra, period, "start"),
+                                steps[s1:]))
+        actions["t"][a1 + extra * (a1 - a0):] += extra * period
+        steps["start"][s1 + extra * (s1 - s0):] += extra * period
+        duration += extra * period
+    state = {name: bool(backend.state & bit) for name, bit in _BIT.items()}
+    return Trace(actions, steps, state, backend.power, duration, recipe.labels)
@@ -0,0 +1,179 @@
+"""Duration estimates of the recipes, accounting for the step overheads."""
+
+import os
+import re
+
+import numpy as np
+
+# Log keys of the features of a run, written at its start
+FEATURES = ("planned", "n_steps", "n_cycles")
+
+_DURATION = re.compile(r"(?:(\d+) days?, )?(\d+):(\d+):(\d+(?:\.\d+)?)$")
+
+
+def parse_duration(text):
+    """Seconds of a str(timedelta), e.g. '1 day, 2:03:04.5'."""
+    match = _DURATION.match(text.strip())
+    if match is None:
+        raise ValueError(f"Invalid duration ({text}).")
+    days, hours, minutes, seconds = match.groups()
+    return (int(days or 0) * 86400 + int(hours) * 3600 + int(minutes) * 60 +
+            float(seconds))
+
+
+def read_log(path):
+    """Return the dict of the key/value lines of a log file."""
+    fields = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split(None, 1)
+            if len(parts) == 2:
+                fields[parts[0]] = parts[1].strip()
+    return fields
+
+
+def read_runs(folder="Logs"):
+    """
+    Features and measured duration of the past runs that ended normally.
+
+    :return: list of (recipe, planned, steps, cycles, duration)
+    """
+    runs = []
+    if not os.path.isdir(folder):
+        return runs
+    for file in sorted(os.listdir(folder)):
+        if not file.endswith(".txt"):
+            continue
+        try:
+            fields = read_log(os.path.join(folder, file))
+            if fields.get("ending") != "normal":
+                continue
+            runs.append((fields["recipe"],
+                         *(float(fields[key]) for key in FEATURES),
+                         parse_duration(fields["duration"])))
+        except (KeyError, ValueError, OSError):
+            continue  # Logs written before the features were recorded
+    return runs
+
+
+class OverheadModel:
+    """
+    duration = planned + per_step * steps + per_cycle * cycles + per_run
+
+    The coefficients are fitted by least squares on the past runs.
+    """
+
+    def __init__(self, per_step=0., per_cycle=0., per_run=0., runs=0):
+        self.per_step = per_step
+        self.per_cycle = per_cycle
+        self.per_run = per_run
+        self.runs = runs
+
+    @classmethod
+    def fit(cls, runs):
+        """
+        :param runs: list of (planned, steps, cycles, duration)
+        """
+        if not runs:
+            return cls()
+        data = np.array(runs, dtype=float)
+        features = np.column_stack((data[:, 1], data[:, 2],
+                                    np.ones(len(data))))
+        overhead = data[:, 3] - data[:, 0]
+        coefficients = np.linalg.lstsq(features, overhead, rcond=None)[0]
+        return cls(*np.maximum(coefficients, 0.), runs=len(data))
+
+    def predict(self, planned, steps, cycles):
+        """Expected duration in s of a run."""
+        return (planned + self.per_step * steps + self.per_cycle * cycles +
+                self.per_run)
+
+
+class OverheadModels:
+    """
+    Overhead models learned from the logs of a folder, one per recipe when
+    it has enough runs, and one for all of them. The logs are only read
+    again when files were added to the folder.
+    """
+
+    def __init__(self, folder="Logs", min_runs=5):
+        self.folder = folder
+        self.min_runs = min_runs
+        self._listing = None
+        self._models = {}
+        self._all = OverheadModel()
+
+    def _refresh(self):
+        listing = (sorted(os.listdir(self.folder))
+                   if os.path.isdir(self.folder) else [])
+        if listing == self._listing:
+            return
+        self._listing = listing
+        runs = read_runs(self.folder)
+        by_recipe = {}
+        for recipe, *run in runs:
+            by_recipe.setdefault(recipe, []).append(run)
+        self._all = OverheadModel.fit([run for _, *run in runs])
+        self._models = {recipe: OverheadModel.fit(recipe_runs)
+                        for recipe, recipe_runs in by_recipe.items()
+                        if len(recipe_runs) >= self.min_runs}
+
+    def get(self, recipe):
+        """Return the model of a recipe (by name)."""
+        self._refresh()
+        return self._models.get(recipe, self._all)
+
+    def expected(self, recipe):
+        """Expected duration in s of a compiled recipe, overheads included."""
+        return self.get(recipe.name).predict(recipe.total, recipe.steps,
+                                             recipe.cycles)
+
+
+class RemainingTime:
+    """
+    Remaining time of a running recipe. The overhead of each step is
+    measured and averaged with exponential weights, starting from the
+    overhead predicted by the model. The overheads of the cycles and of the
+    run, outside the steps, are those of the model: at the start of the
+    run, the remaining time is the one predicted by the model.
+    """
+
+    def __init__(self, planned, steps, per_step=0., alpha=0.2, cycles=0,
+                 per_cycle=0., per_run=0.):
+        """
+        :param planned: planned duration of the run, without overheads
+        :param steps: number of steps of the run
+        :param per_step: initial estimate of the overhead of a step
+        :param alpha: weight of the last measured overhead
+        :param cycles: number of cycles of the run
+        :param per_cycle: overhead of a cycle
+        :param per_run: overhead of the run, counted until its end
+        """
+        self.planned = planned
+        self.steps = steps
+        self.overhead = per_step
+        self.alpha = alpha
+        self.cycles = cycles
+        self.per_cycle = per_cycle
+        self.per_run = per_run
+
+    @classmethod
+    def of(cls, model, recipe, alpha=0.2):
+        """Remaining time of a compiled recipe, from an OverheadModel"""
+        return cls(recipe.total, recipe.steps, model.per_step, alpha,
+                   recipe.cycles, model.per_cycle, model.per_run)
+
+    def step_done(self, planned, actual):
+        """Record a step lasting `actual` s for `planned` s scheduled."""
+        self.planned -= planned
+        self.steps -= 1
+        self.overhead += self.alpha * (actual - planned - self.overhead)
+
+    def cycle_done(self):
+        """Record the end of a cycle."""
+        self.cycles = max(self.cycles - 1, 0)
+
+    @property
+    def remaining(self):
+        return max(0., self.planned + self.overhead * self.steps +
+                   self.per_cycle * self.cycles + self.per_run)
@@ -0,0 +1,85 @@
+"""Arbitration of an I2C bus shared by the relay hats of several reactors."""
+
+import threading
+from time import perf_counter
+
+from ressources.metrics import histogram
+
+
+class SharedBus:
+    """
+    I2C bus shared by the reactors.
+
+    Every write goes through the bus lock, held for that single transaction
+    only (a few hundred µs at 100 kHz): a transition of a reactor waits at
+    most for the transaction in progress of another one, never for a whole
+    transition of it. The lock also keeps another thread from changing the
+    slave address between the address selection and the data of a write.
+    """
+
+    def __init__(self, number, device=None):
+        """
+        :param number: number of the bus (1 for /dev/i2c-1)
+        :param device: object writing to the bus as smbus.SMBus does,
+        smbus.SMBus(number) opened on first use if None
+        """
+        self.number = number
+        self._bus = device
+        self._lock = threading.Lock()
+        self._stats = {"count": 0, "wait_total": 0., "wait_max": 0.}
+        self._latency = histogram("aldpi_i2c_write_seconds",
+                                  "Duration of the I2C writes, bus wait "
+                                  "included.", bus=number)
+        self._wait = histogram("aldpi_i2c_wait_seconds",
+                               "Time the I2C writes waited for the bus.",
+                               bus=number)
+
+    def write_byte_data(self, address, register, value):
+        """Write a byte to a register of a device, as smbus.SMBus does."""
+        queued = perf_counter()
+        with self._lock:
+            wait = perf_counter() - queued
+            if self._bus is None:
+                import smbus
+                self._bus = smbus.SMBus(self.number)
+            self._bus.write_byte_data(address, register, value)
+            self._stats["count"] += 1
+            self._stats["wait_total"] += wait
+            self._stats["wait_max"] = max(self._stats["wait_max"], wait)
+        self._latency.observe(perf_counter() - queued)
+        self._wait.observe(wait)
+
+    def metrics(self):
+        """
+        Return the number of writes and the mean and max time in ms they
+        waited for the bus.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        count = stats["count"]
+        return {"count": count,
+                "wait_mean": 1000 * stats["wait_total"] / count if count else 0.,
+                "wait_max": 1000 * stats["wait_max"]}
+
+
+_buses = {}
+_buses_lock = threading.Lock()
+
+
+def shared_bus(number):
+    """
+    Return the arbiter of an I2C bus, created on first use.
+
+    Hats on a same bus share its arbiter.
+    """
+    with _buses_lock:
+        if number not in _buses:
+            _buses[number] = SharedBus(number)
+        return _buses[number]
+
+
+def metrics():
+    """Return the metrics of all the I2C buses."""
+    with _buses_lock:
+        buses = dict(_buses)
+    return {number: bus.metrics() for number, bus in buses.items()}
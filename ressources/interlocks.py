@@ -0,0 +1,167 @@
+"""
+Interlocks of the recipes, verified on their compiled timeline before they
+run: exclusive precursors, minimum purge between them, RF only with a gas
+flowing and maximum continuous RF time (see config.interlocks).
+
+The rules are interval operations on the NumPy arrays of the timeline,
+without Python loop over the steps, and the repeated cycles are only
+evaluated once: a 100,000-cycle recipe is verified in a few ms. The daemon
+refuses to start or queue a recipe breaking them.
+"""
+
+import numpy as np
+
+import ressources.config as config
+from ressources.timeline import Timeline, bits
+
+# Tolerance in s of the time limits, for the rounding of the step times
+EPSILON = 1e-6
+
+
+def rules(recipe):
+    """Interlocks of a compiled recipe: the configured ones, as it relaxes them"""
+    return dict(config.interlocks, **recipe.interlocks)
+
+
+def bounded(recipe):
+    """
+    Timeline of a recipe between its start state, from the start of its
+    wait, and its end state, after its last step (RF off)
+    """
+    timeline = recipe.timeline()
+    wait = max(recipe.wait, 0)
+    end = recipe.start_state & ~bits(["RF"])
+    return Timeline(
+        start=np.concatenate(([-wait], timeline.start, [timeline.total])),
+        duration=np.concatenate(([wait], timeline.duration, [0.])),
+        state=np.concatenate(([recipe.start_state], timeline.state,
+                              [end])).astype(timeline.state.dtype),
+        label=np.concatenate(([-1], timeline.label, [-1])),
+        cycle=np.concatenate(([0], timeline.cycle, [timeline.cycles - 1])),
+        labels=timeline.labels)
+
+
+class _Cycles:
+    """
+    Scale of the timeline of a recipe whose main loop was shortened to 3
+    iterations: the middle one stands for all the middle ones of the recipe
+    (they all start in the same state), so its steps count cycles - 2 times
+    and the periods spanning it are (cycles - 3) cycle times longer.
+    """
+
+    def __init__(self, timeline, cycles):
+        self.timeline = timeline
+        self.times = np.append(timeline.start, timeline.total)
+        self.weight = np.ones(len(timeline), int)
+        # First step of the middle iteration and first step after it
+        self.middle, self.extra = (-1, len(timeline) + 1), 0.
+        if cycles > 3:
+            first, after = np.searchsorted(timeline.cycle[1:-1], [1, 2]) + 1
+            self.weight[first:after] = cycles - 2
+            self.middle = (first, after)
+            self.extra = (cycles - 3) * (self.times[after] - self.times[first])
+
+    def lengths(self, first, after):
+        """
+        Durations in the recipe of the periods from the steps `first` to the
+        steps `after` (excluded)
+        """
+        spanning = (first <= self.middle[0]) & (after >= self.middle[1])
+        return self.times[after] - self.times[first] + self.extra * spanning
+
+    def where(self, steps):
+        """Where a rule is broken: first of an array of step indices"""
+        timeline, first = self.timeline, int(steps[0])
+        if first == 0:
+            step = "in the start state"
+        elif first == len(timeline) - 1:
+            step = "in the end state"
+        else:
+            start = self.times[first] + (self.extra if first >= self.middle[1]
+                                         else 0.)
+            step = (f"at {start:.3f} s "
+                    f"({timeline.labels[timeline.label[first]]})")
+        count = int(self.weight[steps].sum())
+        return step + (f", {count} times" if count > 1 else "")
+
+
+def exclusive(cycles, pairs, names):
+    """Steps where two exclusive precursors are open together"""
+    timeline, errors = cycles.timeline, []
+    for a, b in pairs:
+        steps = np.flatnonzero(timeline.on(a) & timeline.on(b))
+        if len(steps):
+            errors.append(f"{names.get(a, a)} and {names.get(b, b)} are open "
+                          f"together {cycles.where(steps)}")
+    return errors
+
+
+def purge(cycles, pairs, minimum, names):
+    """
+    Pulses of a precursor following another exclusive one too closely. The
+    pairs open together at some point are reported by exclusive() only:
+    their purges are meaningless, and depend on how the pulses overlap.
+    """
+    timeline, errors = cycles.timeline, []
+    for a, b in pairs:
+        if np.any(timeline.on(a) & timeline.on(b)):
+            continue
+        first_a, after_a = timeline.edges(a)
+        first_b, after_b = timeline.edges(b)
+        first = np.concatenate((first_a, first_b))
+        order = np.argsort(first, kind="stable")
+        first, after = first[order], np.concatenate((after_a, after_b))[order]
+        owner = np.concatenate((np.zeros(len(first_a), bool),
+                                np.ones(len(first_b), bool)))[order]
+        gap = cycles.lengths(after[:-1], first[1:])
+        short = np.flatnonzero((owner[1:] != owner[:-1]) &
+                               (after[:-1] <= first[1:]) &
+                               (gap < minimum - EPSILON))
+        if len(short):
+            errors.append(f"{names.get(a, a)} and {names.get(b, b)} are "
+                          f"purged {gap[short].min():.3g} s (< {minimum:g} s) "
+                          f"{cycles.where(first[short + 1])}")
+    return errors
+
+
+def rf_gases(cycles, gases, names):
+    """Steps where the RF is on without any of `gases` flowing"""
+    timeline = cycles.timeline
+    flowing = np.zeros(len(timeline), bool)
+    for gas in gases:
+        flowing |= timeline.on(gas)
+    steps = np.flatnonzero(timeline.on("RF") & ~flowing)
+    if not len(steps):
+        return []
+    return [f"RF on without {' or '.join(names.get(gas, gas) for gas in gases)}"
+            f" flowing {cycles.where(steps)}"]
+
+
+def max_rf(cycles, maximum):
+    """Periods of RF on longer than `maximum` s"""
+    first, after = cycles.timeline.edges("RF")
+    lengths = cycles.lengths(first, after)
+    long = np.flatnonzero(lengths > maximum + EPSILON)
+    if not len(long):
+        return []
+    return [f"RF on for {lengths[long].max():.6g} s in a row "
+            f"(> {maximum:g} s) {cycles.where(first[long])}"]
+
+
+def verify(recipe, names=None):
+    """
+    Check a compiled recipe against its interlocks. As in engine.dry_run(),
+    the rules are evaluated on a copy of the recipe with 3 iterations of its
+    main loop, standing for all of them.
+
+    :param names: dict actuator -> name in the messages (e.g. its gas)
+    :return: list of the broken interlocks, as messages
+    """
+    names, checked = names or {}, rules(recipe)
+    short = recipe.with_cycles(3) if recipe.cycles > 3 else recipe
+    cycles = _Cycles(bounded(short), recipe.cycles)
+    pairs = checked["exclusive"]
+    return (exclusive(cycles, pairs, names) +
+            purge(cycles, pairs, checked["min_purge"], names) +
+            rf_gases(cycles, checked["rf_gases"], names) +
+            max_rf(cycles, checked["max_rf"]))
@@ -0,0 +1,239 @@
+"""Rate-limited live status display with a countdown run by the browser."""
+
+import json
+import time
+
+import pandas as pd
+import streamlit.components.v1 as components
+
+_COUNTDOWN = """
+{style}
+<div><h2>Total: <span class='highlight blue' id='tot'>--:--:--</span></h2></div>
+<div><h2>Current step: <span class='highlight blue' id='step'>--:--:---</span></h2></div>
+<script>
+const steps = {steps};
+const cycles = {cycles};
+const offset = {offset};
+const period = steps.reduce((a, b) => a + b, 0);
+const total = period * cycles;
+const loaded = performance.now();
+const pad = (n, w) => String(Math.floor(n)).padStart(w, "0");
+function tick() {{
+    const t = Math.min(offset + (performance.now() - loaded) / 1000, total);
+    const tot = Math.ceil(total - t);
+    document.getElementById("tot").textContent = pad(tot / 3600, 2) + ":" +
+        pad(tot % 3600 / 60, 2) + ":" + pad(tot % 60, 2);
+    let rem = 0;
+    if (period > 0 && t < total) {{
+        let pos = t % period;
+        for (const d of steps) {{
+            if (pos < d) {{ rem = d - pos; break; }}
+            pos -= d;
+        }}
+    }}
+    document.getElementById("step").textContent = pad(rem / 60, 2) + ":" +
+        pad(rem % 60, 2) + ":" + pad(rem % 1 * 1000, 3);
+    if (t < total) setTimeout(tick, 47);
+}}
+tick();
+</script>
+"""
+
+
+class Field:
+    """
+    Placeholder proxy only sending a value when it changed, and not more
+    often than the rate allowed by its LiveStatus.
+    """
+
+    def __init__(self, status, placeholder):
+        self._status = status
+        self.placeholder = placeholder
+        self._sent = None  # Last (method, args, kwargs) sent to the browser
+        self._pending = None  # Latest update not sent yet because of the rate
+        self._last = -float("inf")  # Monotonic time of the last sending
+
+    def _set(self, method, *args, **kwargs):
+        update = (method, args, kwargs)
+        if update == self._sent:
+            self._pending = None
+            return
+        self._pending = update
+        if time.monotonic() - self._last >= self._status.min_interval:
+            self.flush()
+
+    def flush(self):
+        """Send the pending update, if any."""
+        if self._pending is None:
+            return
+        method, args, kwargs = self._pending
+        getattr(self.placeholder, method)(*args, **kwargs)
+        self._sent, self._pending = self._pending, None
+        self._last = time.monotonic()
+
+    def due(self):
+        """Return when the pending update can be sent (None if nothing is)."""
+        if self._pending is None:
+            return None
+        return self._last + self._status.min_interval
+
+    def write(self, *args, **kwargs):
+        self._set("write", *args, **kwargs)
+
+    def markdown(self, *args, **kwargs):
+        self._set("markdown", *args, **kwargs)
+
+    def progress(self, *args, **kwargs):
+        self._set("progress", *args, **kwargs)
+
+
+class LiveChart:
+    """
+    Line chart of some channels of a timeseries.TimeSeries, updated by
+    appending the new buckets instead of re-sending the whole history.
+    """
+
+    def __init__(self, placeholder, series, labels):
+        """
+        :param placeholder: placeholder of the chart, e.g. st.empty()
+        :param series: timeseries.TimeSeries to display
+        :param labels: dict channel -> label of the line in the chart
+        """
+        self.placeholder = placeholder
+        self.series = series
+        self.labels = labels
+        self._chart = None
+        self._cursor = None
+
+    def update(self):
+        """Send the buckets completed since the last update."""
+        reset, rows, self._cursor = self.series.since(self._cursor,
+                                                      list(self.labels))
+        if not rows:
+            return
+        data = pd.DataFrame([values for _, values in rows],
+                            index=[t / 60 for t, _ in rows])
+        data = data.rename(columns=self.labels)
+        data.index.name = "Time (min)"
+        if reset or self._chart is None:
+            self._chart = self.placeholder.line_chart(data)
+        else:
+            self._chart.add_rows(data)
+
+
+class LiveStatus:
+    """
+    Live status of a running recipe.
+
+    The step schedule is sent once to the browser, which runs the countdown
+    by itself. The server only updates the fields that changed, at most
+    every `min_interval` seconds, and re-syncs the countdown when the
+    recipe drifts from the schedule by more than `resync` seconds.
+    """
+
+    def __init__(self, min_interval=0.5, resync=1.0, style=""):
+        """
+        :param min_interval: minimum time in seconds between two updates of
+        a same field
+        :param resync: tolerated drift in seconds of the browser countdown
+        :param style: css inserted in the countdown component
+        """
+        self.min_interval = min_interval
+        self.resync = resync
+        self.style = style
+        self.fields = []
+        self._tickers = []  # [interval, function, next due time]
+        self._countdown = None
+        self._schedule = None
+        self._pos = 0.  # Position in the schedule, in s
+        self._rendered = 0.  # Monotonic time of the countdown rendering
+        self._offset = 0.  # Schedule position sent with the rendering
+
+    def field(self, placeholder):
+        """Wrap a placeholder (e.g. st.empty()) into a rate-limited Field."""
+        field = Field(self, placeholder)
+        self.fields.append(field)
+        return field
+
+    def add_ticker(self, interval, func):
+        """Call a function every `interval` seconds while waiting for a step."""
+        self._tickers.append([interval, func, 0.])
+
+    def bind_countdown(self, placeholder):
+        """Set the placeholder where the browser countdown is rendered."""
+        self._countdown = placeholder
+
+    @property
+    def scheduled(self):
+        return self._schedule is not None
+
+    @property
+    def position(self):
+        """Position in the schedule at the start of the current step, in s."""
+        return self._pos
+
+    def start(self, steps, cycles=1, offset=0.):
+        """
+        Send the schedule of the recipe to the browser.
+
+        :param steps: durations in s of the steps of one cycle
+        :param cycles: number of repetitions of the cycle
+        :param offset: time already elapsed in the schedule, in s
+        """
+        self._schedule = ([float(step) for step in steps], int(cycles))
+        self._pos = offset
+        self._render(offset)
+
+    def _render(self, offset):
+        if self._countdown is None:
+            return
+        steps, cycles = self._schedule
+        body = _COUNTDOWN.format(style=self.style, steps=json.dumps(steps),
+                                 cycles=cycles, offset=offset)
+        with self._countdown.container():
+            components.html(body, height=150)
+        self._offset = offset
+        self._rendered = time.monotonic()
+
+    def flush(self):
+        """Send all the pending updates."""
+        for field in self.fields:
+            field.flush()
+
+    def tick(self):
+        """Call the tickers that are due."""
+        now = time.monotonic()
+        for ticker in self._tickers:
+            if ticker[2] <= now:
+                ticker[1]()
+                ticker[2] = now + ticker[0]
+
+    def wait(self, duration):
+        """
+        Wait for the duration of the current step.
+
+        Pending updates are sent as soon as the rate allows it, and the
+        browser countdown is re-synced first if it drifted.
+        """
+        now = time.monotonic()
+        if self._schedule is not None:
+            shown = self._offset + now - self._rendered
+            if abs(shown - self._pos) > self.resync:
+                self._render(self._pos)
+        deadline = now + duration
+        while True:
+            dues = [due for due in (field.due() for field in self.fields)
+                    if due is not None]
+            dues += [ticker[2] for ticker in self._tickers]
+            if not dues or min(dues) >= deadline:
+                break
+            time.sleep(max(0., min(dues) - time.monotonic()))
+            now = time.monotonic()
+            for field in self.fields:
+                # Only the fields that are due: a ticker may wake us earlier
+                due = field.due()
+                if due is not None and due <= now:
+                    field.flush()
+            self.tick()
+        time.sleep(max(0., deadline - time.monotonic()))
+        self._pos += duration
@@ -0,0 +1,221 @@
+"""
+Metrics of the daemon in the Prometheus text format, served on
+GET /metrics (see ressources.daemon).
+
+Counters and histograms are cheap enough for the hot path: each thread
+writes its own shard of a metric without taking any lock, and the shards
+are only summed when the metrics are scraped. Gauges are read when scraped.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds of the buckets of the histograms, in s
+LATENCY = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1., 2.5)
+OVERRUN = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1., 2., 5.)
+RENDER = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10.)
+
+
+class _Sharded:
+    """
+    Values written by each thread in its own shard: a shard has a single
+    writer, so no lock is needed to update it. The shards of the threads
+    that ended are folded into a single one when collected.
+    """
+
+    def __init__(self, size):
+        """
+        :param size: number of values of a shard
+        """
+        self._size = size
+        self._local = threading.local()
+        self._shards = []  # (thread, shard)
+        self._retired = [0] * size
+        # Only taken by the first write of a thread, and by the collection
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = [0] * self._size
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _collect(self):
+        with self._lock:
+            total = list(self._retired)
+            alive = []
+            for thread, shard in self._shards:
+                # A thread that ended does not write in its shard anymore
+                ended = not thread.is_alive()
+                for i, value in enumerate(shard):
+                    total[i] += value
+                    if ended:
+                        self._retired[i] += value
+                if not ended:
+                    alive.append((thread, shard))
+            self._shards = alive
+        return total
+
+
+class Counter(_Sharded):
+    """Monotonic counter."""
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount=1):
+        self._shard()[0] += amount
+
+    def value(self):
+        return self._collect()[0]
+
+
+class Histogram(_Sharded):
+    """Histogram with fixed buckets, in the Prometheus way (le bounds)."""
+
+    def __init__(self, bounds=LATENCY):
+        """
+        :param bounds: sorted upper bounds of the buckets, +Inf excluded
+        """
+        self.bounds = tuple(bounds)
+        # One value per bucket, +Inf included, then the sum and the count
+        super().__init__(len(self.bounds) + 3)
+
+    def observe(self, value):
+        shard = self._shard()
+        shard[bisect_left(self.bounds, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    def value(self):
+        """
+        :return: tuple (list of (bound, cumulative count), sum, count)
+        """
+        values = self._collect()
+        buckets, total = [], 0
+        for bound, count in zip(self.bounds + (float("inf"),), values[:-2]):
+            total += count
+            buckets.append((bound, total))
+        return buckets, values[-2], values[-1]
+
+
+class _Read:
+    """Value read from a function when the metrics are scraped."""
+
+    def __init__(self, read):
+        self.read = read
+
+    def value(self):
+        return self.read()
+
+
+_families = {}  # Name -> {"kind", "help", "metrics": {labels: metric}}
+_families_lock = threading.Lock()
+
+
+def _key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _register(kind, name, help, labels, make):
+    key = _key(labels)
+    with _families_lock:
+        family = _families.setdefault(name, {"kind": kind, "help": help,
+                                             "metrics": {}})
+        if family["kind"] != kind:
+            raise ValueError(f"Metric {name} is a {family['kind']}.")
+        if key not in family["metrics"]:
+            family["metrics"][key] = make()
+        return family["metrics"][key]
+
+
+def counter(name, help, **labels):
+    """Return the counter of a name and labels, created on first use."""
+    return _register("counter", name, help, labels, Counter)
+
+
+def histogram(name, help, buckets=LATENCY, **labels):
+    """Return the histogram of a name and labels, created on first use."""
+    return _register("histogram", name, help, labels,
+                     lambda: Histogram(buckets))
+
+
+def gauge(name, help, read, **labels):
+    """
+    Register a gauge read from a function (returning None when there is no
+    value) when the metrics are scraped. It replaces the function of a gauge
+    of the same name and labels.
+    """
+    with _families_lock:
+        if name in _families:
+            _families[name]["metrics"].pop(_key(labels), None)
+    _register("gauge", name, help, labels, lambda: _Read(read))
+
+
+def _labels(key, **extra):
+    pairs = list(key) + [(name, value) for name, value in extra.items()]
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", r"\\").replace('"', r'\"')
+               .replace("\n", r"\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"'
+                          for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition():
+    """Return all the metrics in the Prometheus text format (version 0.0.4)."""
+    with _families_lock:
+        families = {name: (family["kind"], family["help"],
+                           dict(family["metrics"]))
+                    for name, family in _families.items()}
+    lines = []
+    for name, (kind, help, metrics) in sorted(families.items()):
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for key, metric in sorted(metrics.items()):
+            value = metric.value()
+            if kind != "histogram":
+                if value is not None:
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+                continue
+            buckets, total, count = value
+            lines += [f"{name}_bucket{_labels(key, le=_number(bound))} {n}"
+                      for bound, n in buckets]
+            lines += [f"{name}_sum{_labels(key)} {_number(total)}",
+                      f"{name}_count{_labels(key)} {count}"]
+    return "\n".join(lines) + "\n"
+
+
+# # # # # # # # # # # # # # # # # # # # # # # #
+# Process
+# # # # # # # # # # # # # # # # # # # # # # # #
+
+def _resident_memory():
+    """Resident set size of the process in bytes, None if unknown"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+_register("counter", "process_cpu_seconds_total",
+          "Total user and system CPU time spent in seconds.", {},
+          lambda: _Read(lambda: sum(os.times()[:2])))
+gauge("process_resident_memory_bytes", "Resident memory size in bytes.",
+      _resident_memory)
+_started = time.time()
+gauge("process_start_time_seconds",
+      "Start time of the process since unix epoch in seconds.",
+      lambda: _started)
@@ -7,6 +7,8 @@ import serial.serialutil
 class MKS:
     """Basic functionalities to communicate over RS232 with MKS controller."""
 
+    port_class = serial.Serial  # Serial port, replaced to record or replay
+
     ##########################################################################
     # Initialization
     ##########################################################################
@@ -14,11 +16,13 @@ class MKS:
                  host_baudrate=None, 
                  host_bytesize=None, 
                  host_parity=None,
-                 host_stopbits=None):
+                 host_stopbits=None,
+                 host_timeout=None):
         """
         Connect to MKS device.
 
         :param host_port: device port address
+        :param host_timeout: read timeout in seconds (None: wait forever)
         """
         self.host_port = host_port
 
@@ -43,6 +47,8 @@ class MKS:
         else:
             self.stopbits = host_stopbits
 
+        self.timeout = host_timeout
+
 
     ##########################################################################
     # Connection Handling
@@ -54,13 +60,14 @@ class MKS:
 
         :return: True if successful, False in case of error
         """
-        self._socket = serial.Serial()
+        self._socket = self.port_class()
         try:
             self._socket.setPort(self.host_port)
             self._socket.baudrate = self.baudrate
             self._socket.bytesize = self.bytesize
             self._socket.parity = self.parity
             self._socket.stopbits = self.stopbits
+            self._socket.timeout = self.timeout
             self._socket.open()
         except serial.serialutil.SerialException:
             return False
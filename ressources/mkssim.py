@@ -0,0 +1,200 @@
+"""Local simulator of the MKS 647C controller over a pseudo-terminal."""
+
+import math
+import os
+import select
+import threading
+import time
+import tty
+
+
+class MKSSimulator:
+    """
+    Answer the ASCII commands used by `mksserial.MKS` on a pty.
+
+    The slave side of the pty (`self.port`) can be given to `MKS` like a
+    real serial device, e.g. `MKS(sim.port)`.
+    """
+
+    # Full scale (in SCCM) of the range codes, same table as in the driver
+    sccm = {0: 1.000, 1: 2.000, 2: 5.000, 3: 10.00, 4: 20.00, 5: 50.00,
+            6: 100.0, 7: 200.0, 8: 500.0, 9: 1000, 10: 2000, 11: 5000,
+            12: 10000, 13: 20000, 14: 50000, 15: 100000, 16: 200000,
+            17: 400000, 18: 500000, 38: 30000, 39: 300000}
+
+    ##########################################################################
+    # Initialization
+    ##########################################################################
+    def __init__(self, latency=0.0, tau=1.0, channels=4, range_code=6,
+                 corr_factor=100):
+        """
+        Create the simulated controller.
+
+        :param latency: delay in seconds before each answer is written
+        :param tau: time constant in seconds of the first-order flow response
+        :param channels: number of flow channels
+        :param range_code: initial range code of every channel (6: 100 SCCM)
+        :param corr_factor: initial correction factor of every channel (in %)
+        """
+        self.latency = latency
+        self.tau = tau
+        self.main_valve = False
+        self.channels = {}
+        for channel in range(1, channels + 1):
+            self.channels[channel] = {"on": False,
+                                      "setpoint": 0,  # in permil
+                                      "flow": 0.,  # in permil
+                                      "range": range_code,
+                                      "corr": corr_factor,
+                                      "updated": time.monotonic()}
+        self.port = None
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    ##########################################################################
+    # Pseudo-terminal handling
+    ##########################################################################
+
+    def start(self):
+        """
+        Open the pty and start answering in a background thread.
+
+        :return: path of the slave device to open with the driver
+        """
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True,
+                                        name="mkssim")
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        """Stop answering and close the pty."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _serve(self):
+        buffer = b""
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                buffer += os.read(self._master, 1024)
+            except OSError:
+                continue
+            # The driver terminates every command with "\r\n"
+            while b"\r" in buffer or b"\n" in buffer:
+                cut = min(i for i in (buffer.find(b"\r"), buffer.find(b"\n"))
+                          if i >= 0)
+                line, buffer = buffer[:cut], buffer[cut + 1:]
+                line = line.decode("ascii", "replace").strip()
+                if not line:
+                    continue
+                answer = self.handle(line)
+                if answer is not None:
+                    if self.latency > 0:
+                        time.sleep(self.latency)
+                    os.write(self._master, f"{answer}\r\n".encode())
+
+    ##########################################################################
+    # Controller model
+    ##########################################################################
+
+    def _update(self, channel):
+        """Advance the first-order flow response of a channel to now."""
+        state = self.channels[channel]
+        now = time.monotonic()
+        target = state["setpoint"] if (state["on"] and self.main_valve) else 0
+        if self.tau > 0:
+            decay = math.exp(-(now - state["updated"]) / self.tau)
+        else:
+            decay = 0.
+        state["flow"] = target + (state["flow"] - target) * decay
+        state["updated"] = now
+
+    def _update_all(self):
+        for channel in self.channels:
+            self._update(channel)
+
+    def handle(self, line):
+        """
+        Apply one command line and return the answer (None if there is none).
+
+        :param line: command without its line terminator, e.g. "FS 1 500"
+        """
+        words = line.split()
+        command = words[0].upper()
+        try:
+            channel = int(words[1])
+        except (IndexError, ValueError):
+            return None
+        with self._lock:
+            if command in ("ON", "OF"):
+                # Settle the flows with the previous valve state first
+                self._update_all()
+                if channel == 0:
+                    self.main_valve = command == "ON"
+                elif channel in self.channels:
+                    self.channels[channel]["on"] = command == "ON"
+                return None
+            if channel not in self.channels:
+                return None
+            state = self.channels[channel]
+            value = words[2] if len(words) > 2 else None
+            if command == "FL":
+                self._update(channel)
+                return f"{int(round(state['flow']))}"
+            keys = {"GC": "corr", "RA": "range", "FS": "setpoint"}
+            if command not in keys:
+                return None
+            key = keys[command]
+            if value is None or value.upper() == "R":
+                return f"{state[key]}"
+            self._update(channel)
+            state[key] = int(float(value))
+            return None
+
+    def flow_sccm(self, channel):
+        """Return the current simulated flow of a channel in SCCM."""
+        with self._lock:
+            self._update(channel)
+            state = self.channels[channel]
+            full_scale = self.sccm[state["range"]] * state["corr"] / 100.0
+            return state["flow"] / 1000 * full_scale
+
+
+if __name__ == '__main__':  # running sample
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--latency", type=float, default=0.0,
+                            help="answer delay in seconds")
+    arg_parser.add_argument("--tau", type=float, default=1.0,
+                            help="flow time constant in seconds")
+    args = arg_parser.parse_args()
+    sim = MKSSimulator(latency=args.latency, tau=args.tau)
+    print(f"Simulated MKS 647C on {sim.start()} (Ctrl-C to quit)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sim.stop()
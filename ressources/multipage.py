@@ -1,40 +1,59 @@
 """
-This file is the framework for generating multiple Streamlit applications 
-through an object oriented framework. 
+This file is the framework for generating multiple Streamlit applications
+through an object oriented framework.
 """
 
-# Import necessary libraries 
+# Import necessary libraries
+import importlib
 import streamlit as st
 
-# Define the multipage class to manage the multiple apps in our program 
-class MultiPage: 
+# Page functions already imported, shared by all sessions and reruns
+_loaded = {}
+
+
+# Define the multipage class to manage the multiple apps in our program
+class MultiPage:
     """Framework for combining multiple streamlit applications."""
 
     def __init__(self) -> None:
         """Constructor class to generate a list which will store all our applications as an instance variable."""
-        self.pages = []
-    
-    def add_page(self, title, func) -> None: 
+        self.pages = {}
+        self.groups = {}
+
+    def add_page(self, title, page, group=None, func="app") -> None:
         """Class Method to Add pages to the project
         Args:
-            title ([str]): The title of page which we are adding to the list of apps 
-            
-            func: Python function to render this page in Streamlit
+            title ([str]): The title of page which we are adding to the list of apps
+
+            page: Module path of the page (e.g. "ressources.pageALD"), only
+            imported when the page is first selected, or Python function to
+            render this page in Streamlit
+
+            group ([str]): Optional group of the page in the sidebar
+
+            func ([str]): Name of the function rendering the page in its module
         """
 
-        self.pages.append({
-          
-                "title": title, 
-                "function": func
-            })
+        self.pages[title] = (page, func)
+        self.groups.setdefault(group, []).append(title)
+
+    def _load(self, title):
+        """Return the function rendering a page, importing its module once"""
+        page, func = self.pages[title]
+        if callable(page):
+            return page
+        key = (page, func)
+        if key not in _loaded:
+            _loaded[key] = getattr(importlib.import_module(page), func)
+        return _loaded[key]
 
     def run(self):
-        # Drodown to select the page to run  
-        page = st.sidebar.selectbox(
-            'Select Recipe', 
-            self.pages, 
-            format_func=lambda page: page['title']
-        )
-
-        # run the app function 
-        page['function']()
\ No newline at end of file
+        # Dropdowns to select the group, if any, and the page to run
+        titles = list(self.pages)
+        if len(self.groups) > 1:
+            group = st.sidebar.selectbox('Select Category', list(self.groups))
+            titles = self.groups[group]
+        title = st.sidebar.selectbox('Select Recipe', titles)
+
+        # run the app function
+        self._load(title)()
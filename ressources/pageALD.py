@@ -6,7 +6,7 @@ from ressources.setup import *
 
 def app():
     framework()
-    initialize(wait=-1)
+    initialize()
     
     st.sidebar.write("## Recipe Parameters")
     layout = st.sidebar.columns([1, 1])
@@ -29,7 +29,9 @@ def app():
     cutCarrier = st.sidebar.checkbox(
         f"Cut carrier flow during {Prec2} pulse?", value=True, key="cutCarrier")
 
-    print_tot_time((t1+p1+(t2+p2)*N2)*N)
+    params = dict(t1=t1, p1=p1, t2=t2, p2=p2, N=N, N2=N2,
+                  prec1=prec1, prec2=prec2, cutCarrier=cutCarrier)
+    plan("ALD", **params)
 
     # # # # # # # # # # # # # # # # # # # # # # # #
     # STOP button
@@ -39,19 +41,16 @@ def app():
 
     STOP = layout[0].button("STOP PROCESS")
     if STOP:
-        end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-        if len(st.session_state['logname']) > 0:
-            duration = f"{parser.parse(end_time)-parser.parse(st.session_state['start_time'])}"
-            write_to_log(st.session_state['logname'], end=end_time, 
-                        duration=duration,
-                        ending = "forced")
-        end_recipe()
+        stop_recipe()
 
     # # # # # # # # # # # # # # # # # # # # # # # #
     # GO button
     # # # # # # # # # # # # # # # # # # # # # # # #
     GObutton = layout[1].button('GO')
     if GObutton:
-        ALD(t1=t1, p1=p1, t2=t2, p2=p2, N=N, N2=N2, 
-            prec1=prec1, prec2=prec2, cutCarrier=cutCarrier)
+        run_recipe("ALD", **params)
+    if st.sidebar.button("Add to queue"):
+        enqueue("ALD", **params)
+    if st.sidebar.button("Dry run"):
+        print_dry_run("ALD", **params)
 
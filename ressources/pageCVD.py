@@ -6,7 +6,7 @@ from ressources.setup import *
 
 def app():
     framework()
-    initialize(wait=-1)
+    initialize()
     
     st.sidebar.write("## Recipe Parameters")
     layout = st.sidebar.columns([1, 1])
@@ -16,7 +16,8 @@ def app():
                         step=1., value=120., key="t1")
     sendCarrier = st.sidebar.checkbox(
         f"Send carrier only during {Prec1} pulse?", value=True, key="sendCarrier")
-    print_tot_time(t1)
+    params = dict(t1=t1, prec1=prec1, sendCarrier=sendCarrier)
+    plan("CVD", **params)
     
     # # # # # # # # # # # # # # # # # # # # # # # #
     # STOP button
@@ -26,19 +27,16 @@ def app():
 
     STOP = layout[0].button("STOP PROCESS")
     if STOP:
-        end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-        if len(st.session_state['logname']) > 0:
-            duration = f"{parser.parse(end_time)-parser.parse(st.session_state['start_time'])}"
-            write_to_log(st.session_state['logname'], end=end_time,
-                         duration=duration,
-                         ending="forced")
-        end_recipe()
+        stop_recipe()
 
     # # # # # # # # # # # # # # # # # # # # # # # #
     # GO button
     # # # # # # # # # # # # # # # # # # # # # # # #
     GObutton = layout[1].button('GO')
     if GObutton:
-        CVD(t1=t1, p1=p1, t2=t2, p2=p2, N=N, N2=N2,
-            prec1=prec1, sendCarrier=sendCarrier)
+        run_recipe("CVD", **params)
+    if st.sidebar.button("Add to queue"):
+        enqueue("CVD", **params)
+    if st.sidebar.button("Dry run"):
+        print_dry_run("CVD", **params)
 
@@ -18,7 +18,8 @@ def app():
                         value=default["plasma"],
                         key="plasma")
 
-    print_tot_time(t2)
+    params = dict(t2=t2, plasma=plasma, prec2=prec2)
+    plan("PlasmaClean", **params)
 
     set_plasma(plasma)
 
@@ -31,19 +32,16 @@ def app():
 
     STOP = layout[0].button("STOP PROCESS")
     if STOP:
-        end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-        if len(st.session_state['logname']) > 0:
-            duration = f"{parser.parse(end_time)-parser.parse(st.session_state['start_time'])}"
-            write_to_log(st.session_state['logname'], end=end_time,
-                         duration=duration,
-                         ending="forced")
-        end_recipe()
+        stop_recipe()
 
     # # # # # # # # # # # # # # # # # # # # # # # #
     # GO button
     # # # # # # # # # # # # # # # # # # # # # # # #
     GObutton = layout[1].button('GO')
     if GObutton:
-        Plasma_clean(t1=t1, p1=p1, t2=t2, p2=p2, N=N, N2=N2,
-                     plasma=plasma, prec2=prec2)
+        run_recipe("PlasmaClean", **params)
+    if st.sidebar.button("Add to queue"):
+        enqueue("PlasmaClean", **params)
+    if st.sidebar.button("Dry run"):
+        print_dry_run("PlasmaClean", **params)
 
@@ -6,7 +6,7 @@ from ressources.setup import *
 
 def app():
     framework()
-    initialize(wait=-1)
+    initialize()
     
     st.sidebar.write("## Recipe Parameters")
     wait = st.sidebar.number_input("Waiting time befor starting:", min_value=0,
@@ -31,7 +31,9 @@ def app():
     plasma = layout[0].number_input("Plasma power (W):", min_value=0, max_value=600,
                                     step=1, value=default["plasma"], key="plasma")
 
-    print_tot_time((t1+p1+(t2+p2)*N2)*N)
+    params = dict(t1=t1, p1=p1, t2=t2, p2=p2, N=N, N2=N2, plasma=plasma,
+                  prec1=prec1, wait=wait)
+    plan("PulsedPECVD", **params)
     set_plasma(plasma)
 
     # # # # # # # # # # # # # # # # # # # # # # # #
@@ -42,19 +44,16 @@ def app():
 
     STOP = layout[0].button("STOP PROCESS")
     if STOP:
-        end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-        if len(st.session_state['logname']) > 0:
-            duration = f"{parser.parse(end_time)-parser.parse(st.session_state['start_time'])}"
-            write_to_log(st.session_state['logname'], end=end_time,
-                         duration=duration,
-                         ending="forced")
-        end_recipe()
+        stop_recipe()
 
     # # # # # # # # # # # # # # # # # # # # # # # #
     # GO button
     # # # # # # # # # # # # # # # # # # # # # # # #
     GObutton = layout[1].button('GO')
     if GObutton:
-        PulsedPECVD(t1=t1, p1=p1, t2=t2, p2=p2, N=N, N2=N2,
-                    plasma=plasma, prec1=prec1, wait=wait)
+        run_recipe("PulsedPECVD", **params)
+    if st.sidebar.button("Add to queue"):
+        enqueue("PulsedPECVD", **params)
+    if st.sidebar.button("Dry run"):
+        print_dry_run("PulsedPECVD", **params)
 
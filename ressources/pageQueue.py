@@ -0,0 +1,62 @@
+import streamlit as st
+from datetime import datetime
+from ressources.setup import *
+from ressources.recipequeue import PENDING, RUNNING
+
+
+def _time(t):
+    return datetime.fromtimestamp(t).strftime("%a %H:%M")
+
+
+def app():
+    st.write("# Recipe queue")
+
+    queue = daemon().queue()
+    st.sidebar.write("## Queue")
+    handoff = st.sidebar.number_input("Time between two recipes (s):",
+                                      min_value=0., step=10.,
+                                      value=float(queue["handoff"]), key="handoff")
+    if handoff != queue["handoff"]:
+        daemon().set_queue(handoff=handoff)
+    layout = st.sidebar.columns([1, 1])
+    if queue["paused"]:
+        if layout[0].button("Start queue"):
+            daemon().set_queue(paused=False)
+            st.experimental_rerun()
+    elif layout[0].button("Pause queue"):
+        daemon().set_queue(paused=True)
+        st.experimental_rerun()
+    if layout[1].button("Clear finished"):
+        daemon().clear_queue()
+        st.experimental_rerun()
+    st.sidebar.button("Refresh")
+
+    plan = queue["plan"]
+    if plan:
+        st.write(f"### {'Paused' if queue['paused'] else 'Running'} – " +
+                 f"expected end: {_time(max(end for _, end in plan.values()))}")
+    else:
+        st.write("### The queue is empty")
+
+    for entry in queue["entries"]:
+        c1, c2, c3, c4, c5, c6 = st.columns((2, 4, 2, 1, 1, 1))
+        c1.write(f"**{entry['recipe']}**")
+        c2.write(", ".join(f"{key}={value}"
+                           for key, value in entry["params"].items()))
+        if entry["id"] in plan:
+            start, end = plan[entry["id"]]
+            c3.write(f"{entry['status']}: {_time(start)} → {_time(end)}")
+        else:
+            c3.write(entry["status"] + (f" ({entry['error']})"
+                                        if entry.get("error") else ""))
+        if entry["status"] == PENDING:
+            if c4.button("↑", key=f"up{entry['id']}"):
+                daemon().move(entry["id"], -1)
+                st.experimental_rerun()
+            if c5.button("↓", key=f"down{entry['id']}"):
+                daemon().move(entry["id"], 1)
+                st.experimental_rerun()
+        if entry["status"] in (PENDING, RUNNING):
+            if c6.button("✕", key=f"cancel{entry['id']}"):
+                daemon().cancel(entry["id"])
+                st.experimental_rerun()
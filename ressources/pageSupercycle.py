@@ -0,0 +1,61 @@
+import streamlit as st
+from ressources.setup import *
+
+
+def app():
+    framework()
+    initialize()
+    st.sidebar.write("## Recipe Parameters")
+    layout = st.sidebar.columns([1, 1])
+
+    prec1 = layout[0].text_input("Precursor 1:", Prec1, key="prec1")
+    t1 = layout[0].number_input("Pulse "+prec1+" (ms):", min_value=0,
+                            step=1, value=default["t1"], key="t1")
+    t1 = t1/1000
+    p1 = layout[0].number_input("Purge "+prec1+" (s):", min_value=0.,
+                            step=1., value=default["p1"], key="p1")
+    M1 = layout[0].number_input("N repeat "+prec1+":", min_value=0,
+                            step=1, value=3, key="M1")
+    prec3 = layout[1].text_input("Precursor 3:", Prec3, key="prec3")
+    t3 = layout[1].number_input("Pulse "+prec3+" (ms):", min_value=0,
+                            step=1, value=default["t1"], key="t3")
+    t3 = t3/1000
+    p3 = layout[1].number_input("Purge "+prec3+" (s):", min_value=0.,
+                            step=1., value=default["p1"], key="p3")
+    M2 = layout[1].number_input("N repeat "+prec3+":", min_value=0,
+                            step=1, value=1, key="M2")
+    prec2 = layout[0].text_input("Co-reactant:", Prec2, key="prec2")
+    t2 = layout[0].number_input("Pulse "+prec2+" (s):", min_value=0.,
+                        step=1., value=default["t2"], key="t2")
+    p2 = layout[1].number_input("Purge "+prec2+" (s):", min_value=0.,
+                        step=1., value=default["p2"], key="p2")
+    N = layout[0].number_input("N Supercycles:", min_value=0,
+                            step=1, value=default["N"], key="N")
+    cutCarrier = st.sidebar.checkbox(
+        f"Cut carrier flow during {Prec2} pulse?", value=True, key="cutCarrier")
+
+    params = dict(t1=t1, p1=p1, t3=t3, p3=p3, t2=t2, p2=p2, M1=M1, M2=M2, N=N,
+                  prec1=prec1, prec2=prec2, prec3=prec3, cutCarrier=cutCarrier)
+    plan("Supercycle", **params)
+
+    # # # # # # # # # # # # # # # # # # # # # # # #
+    # STOP button
+    # # # # # # # # # # # # # # # # # # # # # # # #
+
+    layout = st.sidebar.columns([1, 1])
+
+    STOP = layout[0].button("STOP PROCESS")
+    if STOP:
+        stop_recipe()
+
+    # # # # # # # # # # # # # # # # # # # # # # # #
+    # GO button
+    # # # # # # # # # # # # # # # # # # # # # # # #
+    GObutton = layout[1].button('GO')
+    if GObutton:
+        run_recipe("Supercycle", **params)
+    if st.sidebar.button("Add to queue"):
+        enqueue("Supercycle", **params)
+    if st.sidebar.button("Dry run"):
+        print_dry_run("Supercycle", **params)
+
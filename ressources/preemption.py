@@ -0,0 +1,79 @@
+"""Preemption of the running recipe: STOP from any client, with a bounded latency."""
+
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class Preemption:
+    """
+    Stop requests of the recipe runs.
+
+    A run waits on the event given by arm() instead of sleeping. stop()
+    sets the event and puts the reactor in a safe state itself, from the
+    thread of the request, without waiting for the run to notice. The
+    actuations of the run go through actuating(), which holds the same lock
+    and is skipped once the run is stopped: a transition in progress is
+    finished before the safe state, and no valve is opened after it. The
+    stop latency is thus bounded by one transition plus the safe state.
+    """
+
+    def __init__(self, safe_state, bound=0.05):
+        """
+        :param safe_state: function putting the reactor in a safe state
+        :param bound: target stop latency in s, to flag slower stops
+        """
+        self.safe_state = safe_state
+        self.bound = bound
+        self.latency = None  # Stop latency of the current run, in s
+        self._event = threading.Event()
+        self._lock = threading.RLock()
+
+    def arm(self, event=None):
+        """
+        Start following a new run.
+
+        :param event: threading.Event to set on stop requests, a new one
+        if None
+        :return: the event the run must wait on
+        """
+        with self._lock:
+            self._event = threading.Event() if event is None else event
+            self.latency = None
+            return self._event
+
+    def stop(self):
+        """
+        Stop the current run (if any) and put the reactor in a safe state.
+
+        :return: stop latency in s, from the request to the safe state
+        """
+        start = perf_counter()
+        with self._lock:
+            self._event.set()
+            self.safe_state()
+            self.latency = perf_counter() - start
+        return self.latency
+
+    def stop_latency(self):
+        """
+        Stop latency of the current run in s, None if it was not stopped by
+        stop(). Waits for a stop in progress to be done.
+        """
+        with self._lock:
+            return self.latency
+
+    @property
+    def late(self):
+        """Whether the last stop took longer than the bound."""
+        return self.latency is not None and self.latency > self.bound
+
+    @contextmanager
+    def actuating(self, event):
+        """
+        Context of an actuation of a run, giving whether it may actuate.
+
+        Usage: with preemption.actuating(stop) as allowed: ...
+        """
+        with self._lock:
+            yield not event.is_set()
@@ -0,0 +1,141 @@
+"""
+Sampling profiler of the threads of a run, switched on per run.
+
+A background thread samples the stacks of the selected threads at a fixed
+rate: the profiled code is not instrumented, and nothing runs at all when
+profiling is off. The samples are saved next to the log of the run as a
+summary of the top functions (.profile.txt) and as collapsed stacks
+(.folded, for flamegraph.pl or https://www.speedscope.app).
+
+The pages of the app run in another process: they are profiled with
+cProfile by the session that started the run, see save_cprofile().
+"""
+
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+# Samples whose innermost frame is in these modules are threads waiting
+# (on a lock, a queue or a socket), not running
+IDLE = ("threading.py", "queue.py", "selectors.py", "socket.py")
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return (f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+            f"{code.co_firstlineno})")
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of some threads of the process from a background
+    thread.
+    """
+
+    def __init__(self, select, interval=0.005):
+        """
+        :param select: function telling, from a threading.Thread, whether
+        the thread is profiled
+        :param interval: sampling period in s
+        """
+        self.select = select
+        self.interval = interval
+        self.stacks = Counter()  # (thread name, frames...) -> samples
+        self.samples = 0
+        self.idle = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True,
+                                        name="profiler")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            threads = {thread.ident: thread for thread in threading.enumerate()
+                       if thread is not self._thread and self.select(thread)}
+            for ident, frame in sys._current_frames().items():
+                thread = threads.get(ident)
+                if thread is None:
+                    continue
+                self.samples += 1
+                if os.path.basename(frame.f_code.co_filename) in IDLE:
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.stacks[(thread.name, *reversed(stack))] += 1
+
+    def top(self, n=20):
+        """
+        Functions with the most samples.
+
+        :return: list of (function, self samples, cumulative samples),
+        by decreasing cumulative samples
+        """
+        own, cumulative = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack[1:]):
+                cumulative[function] += count
+        return [(function, own[function], count)
+                for function, count in cumulative.most_common(n)]
+
+    def summary(self, n=20):
+        """Text summary of the top functions and of the profiled threads"""
+        busy = self.samples - self.idle
+        lines = [f"{self.samples} samples every {self.interval*1000:g} ms, "
+                 f"{busy} busy ({100*busy/self.samples if self.samples else 0:.1f} %)",
+                 "", "Busy samples per thread:"]
+        threads = Counter()
+        for stack, count in self.stacks.items():
+            threads[stack[0]] += count
+        lines += [f"{count:8d}  {name}" for name, count in threads.most_common()]
+        lines += ["", f"{'self':>8}  {'cumul.':>8}  function"]
+        lines += [f"{own:8d}  {cumulative:8d}  {function}"
+                  for function, own, cumulative in self.top(n)]
+        return "\n".join(lines) + "\n"
+
+    def save(self, stem):
+        """
+        Write the summary to stem.profile.txt and the collapsed stacks to
+        stem.folded
+
+        :return: path of the summary
+        """
+        with open(stem + ".folded", "w") as folded:
+            for stack, count in self.stacks.items():
+                folded.write(";".join(stack) + f" {count}\n")
+        with open(stem + ".profile.txt", "w") as summary:
+            summary.write(f"Profile of {os.path.basename(stem)} "
+                          f"({time.strftime('%Y-%m-%d %H:%M:%S')})\n\n")
+            summary.write(self.summary())
+        return stem + ".profile.txt"
+
+
+def save_cprofile(profile, stem, n=20):
+    """
+    Save a deterministic profile (cProfile.Profile) to stem.prof, for pstats
+    or snakeviz, with the summary of its top functions in stem.profile.txt
+
+    :return: path of the summary
+    """
+    profile.dump_stats(stem + ".prof")
+    with open(stem + ".profile.txt", "w") as summary:
+        stats = pstats.Stats(profile, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(n)
+    return stem + ".profile.txt"
@@ -0,0 +1,256 @@
+"""Persistent queue of recipes, run back-to-back by a background thread."""
+
+import json
+import os
+import threading
+import time
+from tempfile import mkstemp
+from uuid import uuid4
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+
+class RecipeQueue:
+    """
+    List of recipe runs saved in a JSON file, rewritten atomically on every
+    change so that the queue survives a restart of the app.
+
+    An entry is a dict with the keys id, recipe (name of the recipe file),
+    params, status, added, started and ended (times in s since the epoch).
+    """
+
+    def __init__(self, path="Logs/queue.json", handoff=60.):
+        """
+        :param path: file where the queue is saved
+        :param handoff: default time in s spent in the safe state between
+        two entries
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self.entries = []
+        self.paused = True
+        self.handoff = handoff
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path) as f:
+            data = json.load(f)
+        self.entries = data.get("entries", [])
+        self.handoff = data.get("handoff", self.handoff)
+        self.paused = data.get("paused", True)
+        # A run cut by a restart is not resumed, and nothing restarts
+        # unattended after it
+        for entry in self.entries:
+            if entry["status"] == RUNNING:
+                entry["status"] = INTERRUPTED
+                self.paused = True
+
+    def _save(self):
+        folder = os.path.dirname(self.path) or "."
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = mkstemp(dir=folder, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"entries": self.entries, "handoff": self.handoff,
+                       "paused": self.paused}, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def _find(self, entry_id):
+        for entry in self.entries:
+            if entry["id"] == entry_id:
+                return entry
+        raise KeyError(entry_id)
+
+    def snapshot(self):
+        """Return a copy of the entries."""
+        with self._lock:
+            return [dict(entry) for entry in self.entries]
+
+    def add(self, recipe, params):
+        """
+        Append a recipe run to the queue.
+
+        :return: id of the new entry
+        """
+        with self._lock:
+            entry = {"id": uuid4().hex[:8], "recipe": recipe,
+                     "params": dict(params), "status": PENDING,
+                     "added": time.time(), "started": None, "ended": None}
+            self.entries.append(entry)
+            self._save()
+            return entry["id"]
+
+    def move(self, entry_id, offset):
+        """Move a pending entry by `offset` places among the pending ones."""
+        with self._lock:
+            pending = [e for e in self.entries if e["status"] == PENDING]
+            entry = self._find(entry_id)
+            if entry not in pending:
+                return
+            target = pending[max(0, min(len(pending) - 1,
+                                        pending.index(entry) + offset))]
+            if target is entry:
+                return
+            self.entries.remove(entry)
+            index = self.entries.index(target)
+            self.entries.insert(index + (offset > 0), entry)
+            self._save()
+
+    def cancel(self, entry_id):
+        """
+        Cancel a pending entry (a running one is cancelled by the runner).
+
+        :return: previous status of the entry
+        """
+        with self._lock:
+            entry = self._find(entry_id)
+            status = entry["status"]
+            if status == PENDING:
+                entry["status"] = CANCELLED
+                self._save()
+            return status
+
+    def clear(self):
+        """Forget the entries that are not pending nor running."""
+        with self._lock:
+            self.entries = [e for e in self.entries
+                            if e["status"] in (PENDING, RUNNING)]
+            self._save()
+
+    def set(self, paused=None, handoff=None):
+        """Pause/resume the queue or change the handoff time."""
+        with self._lock:
+            if paused is not None:
+                self.paused = paused
+            if handoff is not None:
+                self.handoff = handoff
+            self._save()
+
+    def next(self):
+        """Return the first pending entry, None if there is none."""
+        with self._lock:
+            for entry in self.entries:
+                if entry["status"] == PENDING:
+                    return dict(entry)
+            return None
+
+    def mark(self, entry_id, status, **fields):
+        """Change the status of an entry, and possibly other fields."""
+        with self._lock:
+            entry = self._find(entry_id)
+            entry.update(fields, status=status)
+            self._save()
+
+    def eta(self, duration, now=None):
+        """
+        Expected start and end times of the running and pending entries.
+
+        :param duration: function returning the expected duration in s of
+        an entry, e.g. from its compiled recipe
+        :return: list of (entry, start, end), in the running order
+        """
+        now = time.time() if now is None else now
+        plan, t = [], now
+        for entry in self.snapshot():
+            if entry["status"] == RUNNING:
+                end = max(now, entry["started"] + duration(entry))
+                plan.append((entry, entry["started"], end))
+                t = end + self.handoff
+            elif entry["status"] == PENDING:
+                start = t
+                t = start + duration(entry)
+                plan.append((entry, start, t))
+                t += self.handoff
+        return plan
+
+
+class QueueRunner:
+    """
+    Background thread running the pending entries of a queue one after the
+    other, with the reactor put in a safe state for the handoff time
+    between two entries.
+    """
+
+    def __init__(self, queue, execute, safe_state, lock):
+        """
+        :param queue: RecipeQueue to drain
+        :param execute: function(entry, stop) running an entry; stop is a
+        threading.Event set to cancel the run. Returns True if the run went
+        to its end.
+        :param safe_state: function putting the reactor in a safe state
+        :param lock: lock held during a run, shared with the interactive runs
+        """
+        self.queue = queue
+        self.execute = execute
+        self.safe_state = safe_state
+        self.lock = lock
+        self.current = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        # Set by pause(), ends the handoff in progress
+        self._pause = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background thread, if not already started."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._drain, daemon=True,
+                                        name="recipe-queue")
+        self._thread.start()
+
+    def wake(self):
+        """Look for pending entries now (after an add or a resume)."""
+        self._wake.set()
+
+    def pause(self):
+        """Pause the queue, without waiting for the end of the handoff."""
+        self.queue.set(paused=True)
+        self._pause.set()
+
+    def cancel(self, entry_id):
+        """Cancel an entry, stopping it if it is running."""
+        if self.queue.cancel(entry_id) == RUNNING and self.current == entry_id:
+            self._stop.set()
+
+    def _drain(self):
+        while True:
+            self._wake.wait(1.)
+            self._wake.clear()
+            while not self.queue.paused:
+                self._pause.clear()
+                entry = self.queue.next()
+                if entry is None or not self.lock.acquire(timeout=1.):
+                    break
+                try:
+                    self._run(entry)
+                finally:
+                    self.lock.release()
+                # Handoff in the safe state before the next entry, cut short
+                # by a pause
+                self._pause.wait(self.queue.handoff)
+
+    def _run(self, entry):
+        self.current = entry["id"]
+        self._stop.clear()
+        self.queue.mark(entry["id"], RUNNING, started=time.time())
+        status, error = CANCELLED, None
+        try:
+            if self.execute(entry, self._stop):
+                status = DONE
+        except Exception as exception:
+            status, error = FAILED, str(exception)
+        finally:
+            self.safe_state()
+            self.current = None
+        fields = {"ended": time.time()}
+        if error is not None:
+            fields["error"] = error
+            self.queue.set(paused=True)
+        self.queue.mark(entry["id"], status, **fields)
@@ -0,0 +1,408 @@
+"""Declarative recipes: parsing, validation and compilation of recipe files."""
+
+import copy
+import json
+import os
+import string
+from collections import namedtuple
+from functools import lru_cache
+
+from ressources.timeline import ACTUATORS, bits, from_tree
+
+# Directory of the recipe files, one <name>.json per recipe
+RECIPES_DIR = os.path.join(os.path.dirname(__file__), "recipes")
+
+# Compiled nodes of a recipe sequence
+Step = namedtuple("Step", "index duration state")  # index in the labels
+Loop = namedtuple("Loop", "count body")
+
+_KEYS = {"name", "description", "parameters", "log", "start", "plasma",
+         "title", "sequence", "interlocks"}
+
+
+class _Formatter(string.Formatter):
+    """str.format with an extra "ms" format spec: seconds -> milliseconds"""
+
+    def format_field(self, value, format_spec):
+        if format_spec == "ms":
+            return str(int(value * 1000))
+        return super().format_field(value, format_spec)
+
+
+_formatter = _Formatter()
+
+
+##########################################################################
+# Parsing and validation
+##########################################################################
+
+def _check_value(value, params, kind, where):
+    """Check a number (or the name of a parameter holding one)."""
+    if isinstance(value, str):
+        if value not in params:
+            raise ValueError(f"{where}: unknown parameter ({value}).")
+        value = params[value]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{where}: {kind} must be a number.")
+
+
+def _check_actuators(entries, params, where):
+    if not isinstance(entries, list):
+        raise ValueError(f"{where}: 'on' must be a list.")
+    for entry in entries:
+        if isinstance(entry, dict):
+            unknown = set(entry) - {"actuator", "if", "unless"}
+            if unknown or len(entry) != 2 or "actuator" not in entry:
+                raise ValueError(f"{where}: invalid conditional actuator "
+                                 f"({entry}).")
+            condition = entry.get("if", entry.get("unless"))
+            if condition not in params:
+                raise ValueError(f"{where}: unknown parameter ({condition}).")
+            entry = entry["actuator"]
+        if entry not in ACTUATORS:
+            raise ValueError(f"{where}: unknown actuator ({entry}).")
+
+
+def _check_interlocks(interlocks, params):
+    """Check the interlocks relaxed by a recipe (see config.interlocks)."""
+    if not isinstance(interlocks, dict):
+        raise ValueError("'interlocks' must be an object.")
+    unknown = set(interlocks) - {"exclusive", "min_purge", "rf_gases", "max_rf"}
+    if unknown:
+        raise ValueError(f"interlocks: unknown rules "
+                         f"({', '.join(sorted(unknown))}).")
+    pairs = interlocks.get("exclusive", [])
+    if not isinstance(pairs, list) or not all(
+            isinstance(pair, list) and len(pair) == 2 for pair in pairs):
+        raise ValueError("interlocks: 'exclusive' must be a list of pairs.")
+    for pair in pairs:
+        _check_actuators(pair, {}, "interlocks.exclusive")
+    _check_actuators(interlocks.get("rf_gases", []), {}, "interlocks.rf_gases")
+    for key in ("min_purge", "max_rf"):
+        if key in interlocks:
+            _check_value(interlocks[key], params, key, "interlocks")
+
+
+def _check_sequence(sequence, params, where, labels):
+    if not isinstance(sequence, list) or not sequence:
+        raise ValueError(f"{where}: a sequence must be a non-empty list.")
+    for position, node in enumerate(sequence):
+        here = f"{where}[{position}]"
+        if not isinstance(node, dict):
+            raise ValueError(f"{here}: steps and loops must be objects.")
+        if "repeat" in node:
+            if set(node) != {"repeat", "sequence"}:
+                raise ValueError(f"{here}: a loop has 'repeat' and "
+                                 f"'sequence' only.")
+            _check_value(node["repeat"], params, "repeat", here)
+            _check_sequence(node["sequence"], params, here + ".sequence",
+                            labels)
+        else:
+            if set(node) != {"label", "duration", "on"}:
+                raise ValueError(f"{here}: a step has 'label', 'duration' "
+                                 f"and 'on' only.")
+            _check_value(node["duration"], params, "duration", here)
+            _check_actuators(node["on"], params, here)
+            labels.append(node["label"])
+
+
+@lru_cache(maxsize=32)
+def parse(content):
+    """
+    Parse and validate the content of a recipe file.
+
+    :param content: text of the recipe file (the cache key)
+    :return: dict of the recipe, not to be modified
+    """
+    try:
+        spec = json.loads(content)
+    except json.JSONDecodeError as error:
+        raise ValueError(f"Invalid recipe file: {error}") from None
+    if not isinstance(spec, dict):
+        raise ValueError("A recipe must be an object.")
+    unknown = set(spec) - _KEYS
+    if unknown:
+        raise ValueError(f"Unknown recipe keys ({', '.join(sorted(unknown))}).")
+    for key in ("name", "parameters", "sequence"):
+        if key not in spec:
+            raise ValueError(f"Missing recipe key ({key}).")
+    params = spec["parameters"]
+    if not isinstance(params, dict):
+        raise ValueError("'parameters' must be an object.")
+    for key in spec.get("log", []):
+        if key not in params and key != "time_per_cycle":
+            raise ValueError(f"log: unknown parameter ({key}).")
+    start = spec.get("start", {})
+    if set(start) - {"on", "wait"}:
+        raise ValueError("'start' has 'on' and 'wait' only.")
+    _check_actuators(start.get("on", []), params, "start")
+    _check_value(start.get("wait", -1), params, "wait", "start")
+    if "plasma" in spec:
+        _check_value(spec["plasma"], params, "plasma", "plasma")
+    _check_interlocks(spec.get("interlocks", {}), params)
+    labels = []
+    _check_sequence(spec["sequence"], params, "sequence", labels)
+    for label in labels + [spec.get("title", "")]:
+        try:
+            _formatter.format(label, **params)
+        except (KeyError, ValueError, IndexError) as error:
+            raise ValueError(f"Invalid label ({label}): {error}") from None
+    return spec
+
+
+##########################################################################
+# Compilation
+##########################################################################
+
+class CompiledRecipe:
+    """
+    Recipe with resolved parameters, ready to be run or analysed.
+
+    The sequence is a tree of Step and Loop nodes. It is walked lazily by
+    iter_steps() and expanded with NumPy by timeline(), so loops are never
+    unrolled into Python lists.
+    """
+
+    def __init__(self, spec, params, file=None):
+        self.name = spec["name"]
+        self.file = file  # Name of the recipe file, see compile_recipe()
+        self.params = params
+        self.labels = []
+        self.tree = self._compile(spec["sequence"])
+        start = spec.get("start", {})
+        self.start_state = self._state(start.get("on", []))
+        self.wait = self._value(start.get("wait", -1))
+        plasma = spec.get("plasma")
+        self.plasma = None if plasma is None else self._value(plasma)
+        title = spec.get("title")
+        self.title = None if title is None else _formatter.format(title,
+                                                                   **params)
+        self.log = {key: params[key] for key in spec.get("log", [])
+                    if key != "time_per_cycle"}
+        self.log_cycle_time = "time_per_cycle" in spec.get("log", [])
+        # Interlocks relaxed by the recipe, see ressources.interlocks
+        self.interlocks = dict(spec.get("interlocks", {}))
+        for key in ("min_purge", "max_rf"):
+            if key in self.interlocks:
+                self.interlocks[key] = float(self._value(self.interlocks[key]))
+        self._timeline = None
+
+    def _value(self, value):
+        return self.params[value] if isinstance(value, str) else value
+
+    def _state(self, entries):
+        on = []
+        for entry in entries:
+            if isinstance(entry, dict):
+                if "if" in entry and not self.params[entry["if"]]:
+                    continue
+                if "unless" in entry and self.params[entry["unless"]]:
+                    continue
+                entry = entry["actuator"]
+            on.append(entry)
+        return bits(on)
+
+    def _compile(self, sequence):
+        nodes = []
+        for node in sequence:
+            if "repeat" in node:
+                count = self._value(node["repeat"])
+                if not float(count).is_integer():
+                    raise ValueError(f"Non-integer repeat ({node['repeat']}).")
+                count = int(count)
+                if count < 0:
+                    raise ValueError(f"Negative repeat ({node['repeat']}).")
+                nodes.append(Loop(count, self._compile(node["sequence"])))
+            else:
+                duration = float(self._value(node["duration"]))
+                if duration < 0:
+                    raise ValueError(f"Negative duration ({node['label']}).")
+                self.labels.append(_formatter.format(node["label"],
+                                                     **self.params))
+                nodes.append(Step(len(self.labels) - 1, duration,
+                                  self._state(node["on"])))
+        return tuple(nodes)
+
+    @property
+    def main_loop(self):
+        """First top-level loop, whose iterations are the cycles."""
+        for node in self.tree:
+            if isinstance(node, Loop):
+                return node
+        return None
+
+    @property
+    def cycles(self):
+        loop = self.main_loop
+        return loop.count if loop is not None else 1
+
+    @property
+    def total(self):
+        """Total duration in s, computed from the loop structure."""
+        return _duration(self.tree)
+
+    @property
+    def steps(self):
+        """Number of steps run, computed from the loop structure."""
+        return _count(self.tree)
+
+    @property
+    def cycle_time(self):
+        return self.total / self.cycles if self.cycles else 0.
+
+    def dose(self):
+        """
+        Exposure to each actuator, computed from the loop structure without
+        walking the iterations: consecutive steps with an actuator on make
+        one pulse.
+
+        :return: dict actuator -> {"time": time on in s, "pulses": number}
+        """
+        time, pulses, _ = _dose(self.tree, self.start_state)
+        return {actuator: {"time": time[bit], "pulses": pulses[bit]}
+                for bit, actuator in enumerate(ACTUATORS)}
+
+    def with_cycles(self, cycles):
+        """Copy of the recipe with its main loop repeated `cycles` times."""
+        main = self.main_loop
+        recipe = copy.copy(self)
+        recipe.tree = tuple(Loop(cycles, node.body) if node is main else node
+                            for node in self.tree)
+        recipe._timeline = None
+        return recipe
+
+    def iter_steps(self):
+        """
+        Walk the sequence lazily.
+
+        :return: generator of (Step, loops) where loops is a tuple of
+        (iteration, count) of the enclosing loops, outermost first
+        """
+        return _walk(self.tree, ())
+
+    def schedule(self):
+        """
+        Step durations of one cycle and number of cycles, for the
+        countdown of the browser.
+        """
+        loop = self.main_loop
+        if len(self.tree) == 1 and loop is not None:
+            return from_tree(loop.body).duration.tolist(), loop.count
+        return self.timeline().duration.tolist(), 1
+
+    def timeline(self):
+        """Flat NumPy timeline of the whole recipe (computed once)."""
+        if self._timeline is None:
+            self._timeline = from_tree(self.tree, self.labels)
+        return self._timeline
+
+
+def _duration(nodes):
+    total = 0.
+    for node in nodes:
+        if isinstance(node, Loop):
+            total += node.count * _duration(node.body)
+        else:
+            total += node.duration
+    return total
+
+
+def _count(nodes):
+    return sum(node.count * _count(node.body) if isinstance(node, Loop) else 1
+               for node in nodes)
+
+
+def _dose(nodes, state):
+    """
+    Time on and number of rising edges of each actuator bit over a sequence
+    entered in a given state. A loop costs two evaluations of its body: the
+    first iteration and the following ones, entered in the state the body
+    ends in.
+
+    :return: tuple (time list, pulses list, exit state)
+    """
+    time, pulses = [0.] * len(ACTUATORS), [0] * len(ACTUATORS)
+    for node in nodes:
+        if isinstance(node, Loop):
+            if not node.count:
+                continue
+            first = _dose(node.body, state)
+            state = first[2]
+            runs = [(first, 1)]
+            if node.count > 1:
+                runs.append((_dose(node.body, state), node.count - 1))
+            for (t, p, _), n in runs:
+                for bit in range(len(ACTUATORS)):
+                    time[bit] += n * t[bit]
+                    pulses[bit] += n * p[bit]
+        else:
+            for bit in range(len(ACTUATORS)):
+                if node.state >> bit & 1:
+                    time[bit] += node.duration
+                    pulses[bit] += not state >> bit & 1
+            state = node.state
+    return time, pulses, state
+
+
+def _walk(nodes, loops):
+    for node in nodes:
+        if isinstance(node, Loop):
+            for iteration in range(node.count):
+                yield from _walk(node.body, loops + ((iteration, node.count),))
+        else:
+            yield node, loops
+
+
+def _check_override(name, key, value, default):
+    """Check that a parameter keeps the type of its default value."""
+    if isinstance(default, bool):
+        valid = isinstance(value, bool)
+    elif isinstance(default, (int, float)):
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    else:
+        valid = isinstance(value, type(default))
+    if not valid:
+        raise ValueError(f"Invalid value for {key} of {name} ({value!r}).")
+
+
+@lru_cache(maxsize=64)
+def _compile(name, content, params):
+    spec = parse(content)
+    return CompiledRecipe(spec, dict(params), file=name)
+
+
+def read(name):
+    """Return the content of the file of a recipe."""
+    path = os.path.join(RECIPES_DIR, f"{name}.json")
+    if not os.path.isfile(path):
+        raise ValueError(f"Unknown recipe ({name}).")
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def available():
+    """Return the names of the recipe files."""
+    return sorted(os.path.splitext(file)[0] for file in os.listdir(RECIPES_DIR)
+                  if file.endswith(".json"))
+
+
+def compile_recipe(name, **params):
+    """
+    Compile a recipe file with some of its parameters overridden.
+
+    The parsed file and the compiled recipe are cached, keyed by the file
+    content and the parameters.
+
+    :param name: name of the recipe file, without extension
+    :return: CompiledRecipe
+    """
+    content = read(name)
+    defaults = parse(content)["parameters"]
+    unknown = set(params) - set(defaults)
+    if unknown:
+        raise ValueError(f"Unknown parameters for {name} "
+                         f"({', '.join(sorted(unknown))}).")
+    for key, value in params.items():
+        _check_override(name, key, value, defaults[key])
+    values = dict(defaults, **params)
+    return _compile(name, content, tuple(sorted(values.items())))
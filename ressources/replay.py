@@ -0,0 +1,499 @@
+"""
+Record and replay of the device traffic of the runs, to check changes of
+the executor, the drivers or the logging for timing regressions with real
+traffic patterns.
+
+A run started with record (python -m ressources.cli run --record ...) saves
+in a .replay.jsonl file next to its log the bytes exchanged with the serial
+devices, the I2C writes to the relays and the transitions of the recipe,
+with their times and durations. The replay runs the same recipe through the
+current engine and drivers against simulated devices, which answer the
+recorded bytes after the recorded delays, and compares the timing of each
+transition with the recording:
+
+    python -m ressources.replay Logs/2022-01-01-10:00:00_ALD.replay.jsonl \
+        [--cycles 5] [--tolerance 5] [-o diff.csv]
+
+The replay only builds a reactor of its own, with the settings of the
+recording: it can run next to the daemon without touching its devices.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import tempfile
+import threading
+import time
+from collections import deque, Counter
+from functools import partial
+from time import perf_counter
+
+from ressources.config import DEVICE_BUS
+from ressources.serialio import SETPOINT
+
+# Events buffered before the writer thread is woken up
+CHUNK = 256
+# Longest time in s the events stay buffered
+PERIOD = 1.
+
+
+class DeviceRecorder:
+    """
+    Recorder of the device traffic of a run of a reactor. The drivers of its
+    serial ports and its I2C bus are wrapped until the recorder is closed.
+
+    The device and executor threads only queue their events: a writer
+    thread of the recorder serializes them and writes them to the file.
+    """
+
+    def __init__(self, path, reactor, recipe):
+        """
+        :param path: .replay.jsonl file of the run
+        :param reactor: control.Reactor running the recipe
+        :param recipe: compiled recipe of the run
+        """
+        self.path = path
+        self.reactor = reactor
+        self._file = open(path, "w")
+        self._events = deque()
+        self._lock = threading.Lock()  # Writes to the file only
+        self._origin = perf_counter()
+        self._wake = threading.Event()
+        self._closing = False
+        self._file.write(json.dumps({
+            "kind": "header", "reactor": reactor.name, "start": time.time(),
+            "recipe": recipe.name, "file": recipe.file,
+            "params": recipe.params,
+            "settings": {"gases": reactor.gases, "relays": reactor.relays,
+                         "mfc_channels": reactor.mfc_channels,
+                         **{name: ctrl.port for name, ctrl in _ports(reactor)}}
+            }) + "\n")
+        reactor.bus = RecordingBus(reactor.bus, self)
+        # Port classes of the drivers, simulated ones during a replay
+        self._port_classes = {}
+        for name, ctrl in _ports(reactor):
+            self._port_classes[name] = ctrl.driver.port_class
+            ctrl.driver.port_class = partial(RecordingPort,
+                                             ctrl.driver.port_class,
+                                             self, ctrl.port)
+            ctrl.io.call(ctrl.wrap, self, priority=SETPOINT)
+        self._writer = threading.Thread(target=self._write_loop, daemon=True,
+                                        name=f"recorder-{reactor.name}")
+        self._writer.start()
+
+    def record(self, kind, start, **event):
+        """
+        Record an event started at perf_counter() `start`, from any thread
+        """
+        self._events.append((kind, start - self._origin, event))
+        if len(self._events) >= CHUNK and not self._wake.is_set():
+            self._wake.set()
+
+    def _write_loop(self):
+        while not self._closing:
+            self._wake.wait(PERIOD)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write the recorded events to the file"""
+        with self._lock:
+            if self._file is None:
+                return
+            events = [self._events.popleft()
+                      for _ in range(len(self._events))]
+            if events:
+                self._file.write("\n".join(
+                    json.dumps(dict(kind=kind, t=t, **event))
+                    for kind, t, event in events) + "\n")
+                self._file.flush()
+
+    def close(self):
+        """Give the devices back to the reactor and close the file"""
+        if isinstance(self.reactor.bus, RecordingBus):
+            self.reactor.bus = self.reactor.bus.bus
+        for name, ctrl in _ports(self.reactor):
+            if name in self._port_classes:
+                ctrl.driver.port_class = self._port_classes.pop(name)
+            ctrl.io.call(ctrl.unwrap, priority=SETPOINT)
+        self._closing = True
+        self._wake.set()
+        self._writer.join()
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class _Port:
+    """Serial driver of a reactor, with its port and its scheduler."""
+
+    def __init__(self, driver, port, io):
+        self.driver = driver
+        self.port = port
+        self.io = io
+
+    def wrap(self, recorder):
+        """Record the traffic of the connection, if it is already open"""
+        if self.driver.isopen():
+            self.driver._socket = RecordingPort(lambda: self.driver._socket,
+                                                recorder, self.port)
+
+    def unwrap(self):
+        socket = getattr(self.driver, "_socket", None)
+        if isinstance(socket, RecordingPort):
+            socket.record()
+            self.driver._socket = socket._port
+
+
+def _ports(reactor):
+    """(name of the setting, _Port) of the serial devices of a reactor"""
+    ports = []
+    if reactor.citoctrl is not None:
+        ports.append(("cito_address", _Port(reactor.citoctrl,
+                                            reactor.citoctrl.host_addr,
+                                            reactor.citoio)))
+    if reactor.mksctrl is not None:
+        ports.append(("mks_address", _Port(reactor.mksctrl,
+                                           reactor.mksctrl.host_port,
+                                           reactor.mksio)))
+    return ports
+
+
+class RecordingPort:
+    """
+    Serial port recording its exchanges: the bytes written, the bytes read
+    until the next write, and the time from the write to the last byte read.
+    """
+
+    def __init__(self, port_class, recorder, name):
+        """
+        :param port_class: function returning the recorded port
+        :param name: port of the device in the recording
+        """
+        # The settings of the port go to the recorded one
+        self.__dict__.update(_port=port_class(), _recorder=recorder,
+                             _name=name, _exchange=None)
+
+    def __getattr__(self, name):
+        return getattr(self._port, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._port, name, value)
+
+    def write(self, data):
+        self.record()
+        self.__dict__["_exchange"] = (perf_counter(), bytes(data), [], [0.])
+        return self._port.write(data)
+
+    def _received(self, data):
+        if self._exchange is not None and data:
+            start, _, rx, latency = self._exchange
+            rx.append(data)
+            latency[0] = perf_counter() - start
+        return data
+
+    def read(self, size=1):
+        return self._received(self._port.read(size))
+
+    def readline(self, *args):
+        return self._received(self._port.readline(*args))
+
+    def close(self):
+        self.record()
+        return self._port.close()
+
+    def record(self):
+        """Record the exchange in progress, if any"""
+        if self._exchange is not None:
+            start, tx, rx, latency = self._exchange
+            self._recorder.record("serial", start, port=self._name,
+                                  tx=tx.hex(), rx=b"".join(rx).hex(),
+                                  latency=latency[0])
+            self.__dict__["_exchange"] = None
+
+
+class RecordingBus:
+    """I2C bus recording the writes of a reactor."""
+
+    def __init__(self, bus, recorder):
+        self.bus = bus
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.bus, name)
+
+    def write_byte_data(self, address, register, value):
+        start = perf_counter()
+        self.bus.write_byte_data(address, register, value)
+        self.recorder.record("i2c", start, address=address, register=register,
+                             value=value, duration=perf_counter() - start)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # #
+# Simulated devices
+# # # # # # # # # # # # # # # # # # # # # # # #
+
+def load(path):
+    """
+    Read a recording.
+
+    :return: tuple (header, list of events by kind)
+    """
+    events = {"serial": [], "i2c": [], "transition": []}
+    with open(path) as file:
+        header = json.loads(next(file))
+        for line in file:
+            event = json.loads(line)
+            events[event["kind"]].append(event)
+    return header, events
+
+
+class SimulatedDevices:
+    """
+    Answers of the devices of a recording: a command gets the answer
+    recorded for the same bytes on the same port, in the recorded order.
+    Commands sent more often than recorded get their last answer again;
+    unknown commands get no answer.
+    """
+
+    def __init__(self, events):
+        """
+        :param events: events of the recording, see load()
+        """
+        self._answers = {}  # (port, tx) -> deque of (rx, latency)
+        for event in events["serial"]:
+            self._answers.setdefault((event["port"], event["tx"]), deque()).append(
+                (bytes.fromhex(event["rx"]), event["latency"]))
+        self._last = {}
+        # Durations of the writes of each relay
+        self._writes = {}
+        for event in events["i2c"]:
+            self._writes.setdefault((event["address"], event["register"]),
+                                    deque()).append(event["duration"])
+        self.unmatched = Counter()  # Port -> commands without answer
+        self.repeated = Counter()  # Port -> commands answered again
+        self._lock = threading.Lock()
+
+    def answer(self, port, tx):
+        """:return: tuple (answer, delay in s)"""
+        key = (port, tx.hex())
+        with self._lock:
+            answers = self._answers.get(key)
+            if answers:
+                self._last[key] = answers.popleft()
+            elif key in self._last:
+                self.repeated[port] += 1
+            else:
+                self.unmatched[port] += 1
+                return b"", 0.
+            return self._last[key]
+
+    def write_byte_data(self, address, register, value):
+        """Relay write lasting the recorded duration, as smbus.SMBus does"""
+        with self._lock:
+            durations = self._writes.get((address, register))
+            if durations is None:
+                self.unmatched[f"i2c {address:#x}"] += 1
+                return
+            duration = durations.popleft() if len(durations) > 1 else durations[0]
+        time.sleep(duration)
+
+
+class SimulatedPort:
+    """Serial port of a simulated device, as serial.Serial."""
+
+    def __init__(self, devices):
+        self._devices = devices
+        self.port = None
+        self.baudrate = self.bytesize = self.parity = self.stopbits = None
+        self.timeout = None
+        self.is_open = False
+        self._rx, self._ready = b"", 0.
+
+    def setPort(self, port):
+        self.port = port
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._rx, delay = self._devices.answer(self.port, data)
+        self._ready = perf_counter() + delay
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        return len(self._rx) if perf_counter() >= self._ready else 0
+
+    def _wait(self):
+        delay = self._ready - perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        elif not self._rx and self.timeout:
+            time.sleep(self.timeout)  # No answer
+
+    def read(self, size=1):
+        self._wait()
+        data, self._rx = self._rx[:size], self._rx[size:]
+        return data
+
+    def readline(self):
+        self._wait()
+        end = self._rx.find(b"\n") + 1 or len(self._rx)
+        data, self._rx = self._rx[:end], self._rx[end:]
+        return data
+
+
+# # # # # # # # # # # # # # # # # # # # # # # #
+# Replay
+# # # # # # # # # # # # # # # # # # # # # # # #
+
+def replay(path, cycles=None, logs=None):
+    """
+    Run the recipe of a recording through the current engine and drivers,
+    on simulated devices answering its traffic. The recipe starts right
+    away, whatever its start delay.
+
+    :param cycles: number of cycles replayed, all of them if None
+    :param logs: folder of the log and of the recording of the replay, a
+    temporary one if None
+    :return: tuple (path of the recording of the replay, SimulatedDevices)
+    """
+    from ressources.control import Reactor
+    from ressources.i2cbus import SharedBus
+    from ressources.recipes import compile_recipe
+
+    header, events = load(path)
+    settings = header["settings"]
+    devices = SimulatedDevices(events)
+    reactor = Reactor("replay", settings["gases"],
+                      {gas: tuple(relay)
+                       for gas, relay in settings["relays"].items()},
+                      settings.get("cito_address"), settings.get("mks_address"),
+                      settings["mfc_channels"],
+                      logs=logs or tempfile.mkdtemp(prefix="aldpi-replay-"),
+                      block="aldpi_status_replay")
+    reactor.bus = SharedBus(DEVICE_BUS, device=devices)
+    for _, ctrl in _ports(reactor):
+        ctrl.driver.port_class = partial(SimulatedPort, devices)
+    recipe = compile_recipe(header["file"], **header["params"])
+    recipe = recipe.with_cycles(cycles or recipe.cycles)  # Copy of the cached one
+    recipe.wait = -1
+    try:
+        reactor.execute(recipe, "replay", threading.Event(), record=True)
+    finally:
+        reactor.poller.stop(wait=True)
+        reactor.status_block.close()
+    return reactor.run.snapshot()["logname"][:-len(".txt")] + ".replay.jsonl", devices
+
+
+def _changes(changes):
+    return ", ".join(f"{name} {'ON' if on else 'OFF'}"
+                     for on, name in changes) or "no change"
+
+
+def diff(recorded, replayed):
+    """
+    Timing of the transitions of a replay against the recording.
+
+    :param recorded: transition events of the recording, see load()
+    :param replayed: transition events of the replay
+    :return: list of dicts with the index and changes of each transition,
+    its start in both runs and their difference (the drift of the replay),
+    the difference of the interval since the previous transition and the
+    duration of the actuation in both runs, times in ms
+    """
+    rows = []
+    previous = None
+    for index, (old, new) in enumerate(zip(recorded, replayed)):
+        changes = _changes(new["changes"])
+        if old["changes"] != new["changes"]:
+            changes += f" (recorded: {_changes(old['changes'])})"
+        drift = 1000 * (new["t"] - old["t"])
+        rows.append({"index": index, "changes": changes,
+                     "recorded": 1000 * old["t"], "replayed": 1000 * new["t"],
+                     "drift": drift,
+                     "interval": drift - previous if previous is not None else 0.,
+                     "recorded_duration": 1000 * old["duration"],
+                     "replayed_duration": 1000 * new["duration"]})
+        previous = drift
+    return rows
+
+
+def summary(rows, recorded, devices=None):
+    """Text summary of a diff"""
+    lines = [f"{len(rows)} transitions compared, out of {len(recorded)} "
+             "recorded"]
+    if rows:
+        changed = sum("(recorded:" in row["changes"] for row in rows)
+        lines += [
+            f"Drift at the end: {rows[-1]['drift']:+.3f} ms, "
+            f"max {max(abs(row['drift']) for row in rows):.3f} ms",
+            f"Interval difference: max "
+            f"{max(abs(row['interval']) for row in rows):.3f} ms",
+            f"Actuation duration: mean "
+            f"{sum(row['recorded_duration'] for row in rows)/len(rows):.3f} ms "
+            f"recorded, "
+            f"{sum(row['replayed_duration'] for row in rows)/len(rows):.3f} ms "
+            "replayed"]
+        if changed:
+            lines.append(f"{changed} transitions with other changes than "
+                         "recorded")
+    if devices is not None:
+        for port, count in devices.unmatched.items():
+            lines.append(f"{count} commands not in the recording on {port}")
+        for port, count in devices.repeated.items():
+            lines.append(f"{count} commands sent more often than recorded on "
+                         f"{port}")
+    return "\n".join(lines) + "\n"
+
+
+def regressions(rows, tolerance):
+    """Transitions whose interval or duration differs by over `tolerance` ms"""
+    return [row for row in rows
+            if abs(row["interval"]) > tolerance or
+            row["replayed_duration"] - row["recorded_duration"] > tolerance]
+
+
+if __name__ == '__main__':  # running sample
+    parser = argparse.ArgumentParser(description="Replay a recorded run on "
+                                     "simulated devices and compare its "
+                                     "timing")
+    parser.add_argument("recording", help=".replay.jsonl file next to the log "
+                        "of the run")
+    parser.add_argument("--cycles", type=int, help="number of cycles replayed")
+    parser.add_argument("--tolerance", type=float, default=5.,
+                        help="regression threshold on the interval and "
+                        "duration of the transitions, in ms")
+    parser.add_argument("-o", "--output", help="CSV file of the diff")
+    args = parser.parse_args()
+    path, devices = replay(args.recording, args.cycles)
+    recorded = load(args.recording)[1]["transition"]
+    rows = diff(recorded, load(path)[1]["transition"])
+    if args.output:
+        with open(args.output, "w", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=list(rows[0]) if rows
+                                    else ["index"])
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        print(f"{'#':>5}  {'recorded':>11}  {'drift':>9}  {'interval':>9}  "
+              f"{'duration':>17}  changes")
+        for row in rows:
+            print(f"{row['index']:5d}  {row['recorded']:11.3f}  "
+                  f"{row['drift']:+9.3f}  {row['interval']:+9.3f}  "
+                  f"{row['recorded_duration']:7.3f} -> "
+                  f"{row['replayed_duration']:7.3f}  {row['changes']}")
+    print(summary(rows, recorded, devices), end="")
+    late = regressions(rows, args.tolerance)
+    if late:
+        print(f"{len(late)} transitions over the tolerance of "
+              f"{args.tolerance:g} ms")
+    sys.exit(1 if late else 0)
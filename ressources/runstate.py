@@ -0,0 +1,72 @@
+"""State of the running recipe of a reactor, shared by all the sessions."""
+
+import threading
+
+
+class RunState:
+    """
+    Live state of the current run, published by the recipe and read by any
+    number of observers.
+
+    Every update replaces the snapshot by a new dict, so readers get a
+    consistent view without copying and without blocking the recipe.
+    """
+
+    def __init__(self):
+        self._snapshot = {"running": False, "ended": True}
+        self._version = 0
+        self._changed = threading.Condition()
+        self._sinks = []
+
+    def subscribe(self, sink):
+        """
+        Register a function called with each new snapshot, from the thread
+        publishing it, in the order of the snapshots. It must be quick, and
+        may publish in turn.
+        """
+        self._sinks.append(sink)
+
+    def _replace(self, update):
+        """
+        Replace the snapshot by update(snapshot). The publishers are
+        serialized, so that none of them overwrites the fields of another.
+        """
+        with self._changed:  # Reentrant: sinks may publish
+            snapshot = self._snapshot = update(self._snapshot)
+            self._version += 1
+            self._changed.notify_all()
+            for sink in self._sinks:
+                sink(snapshot)
+
+    def begin(self, **fields):
+        """Start a new run, discarding the state of the previous one."""
+        self._replace(lambda _: dict(fields, running=True, ended=False))
+
+    def publish(self, **fields):
+        """Update some fields of the current run."""
+        self._replace(lambda snapshot: dict(snapshot, **fields))
+
+    def end(self, **fields):
+        """Mark the run as properly ended (normal or forced ending)."""
+        self.publish(running=False, ended=True, **fields)
+
+    def snapshot(self):
+        """Return the current snapshot. It must not be modified."""
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._version
+
+    def wait(self, version, timeout=None):
+        """
+        Wait until the state differs from a known version.
+
+        :param version: last version seen by the caller
+        :param timeout: maximum waiting time in seconds
+        :return: tuple (version, snapshot), unchanged on timeout
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._version != version, timeout)
+            return self._version, self._snapshot
+
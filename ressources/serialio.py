@@ -0,0 +1,162 @@
+"""Per-port serial I/O scheduler with priority lanes."""
+
+import itertools
+import queue
+import threading
+from concurrent.futures import Future
+from time import perf_counter
+
+from ressources.metrics import counter, histogram, gauge
+
+# Priority lanes, lowest value is served first
+SAFETY = 0  # Safety and RF on/off commands
+SETPOINT = 1  # Step-critical setpoints
+TELEMETRY = 2  # Readbacks and monitoring
+LANES = {SAFETY: "safety", SETPOINT: "setpoint", TELEMETRY: "telemetry"}
+
+
+class PortScheduler:
+    """
+    Single I/O worker for one serial port.
+
+    Every call to a device on the port goes through `submit()` (or `call()`)
+    and is executed by the worker thread, one at a time, safety lane first.
+    """
+
+    def __init__(self, port):
+        """
+        Start the worker of a port.
+
+        :param port: port address, only used to name the worker
+        """
+        self.port = port
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = {}  # Coalescing key -> queued telemetry future
+        self._depth = {lane: 0 for lane in LANES}
+        self._stats = {lane: {"count": 0, "coalesced": 0,
+                              "wait_total": 0., "wait_max": 0.}
+                       for lane in LANES}
+        # Device round trips and errors, recorded by the worker without lock
+        self._roundtrip = {lane: histogram(
+            "aldpi_serial_roundtrip_seconds", "Duration of the device calls "
+            "on the serial ports, queue wait excluded.", port=port, lane=name)
+            for lane, name in LANES.items()}
+        self._errors = {lane: counter(
+            "aldpi_serial_errors_total", "Device calls on the serial ports "
+            "that raised an error.", port=port, lane=name)
+            for lane, name in LANES.items()}
+        for lane, name in LANES.items():
+            gauge("aldpi_serial_queue_depth", "Requests queued on the serial "
+                  "ports.", lambda lane=lane: self._depth[lane],
+                  port=port, lane=name)
+        self._thread = threading.Thread(target=self._work, daemon=True,
+                                        name=f"serialio {port}")
+        self._thread.start()
+
+    def submit(self, func, *args, priority=TELEMETRY, key=None, **kwargs):
+        """
+        Queue a call to be executed by the worker of the port.
+
+        :param func: function doing the I/O
+        :param priority: lane of the request (SAFETY, SETPOINT or TELEMETRY)
+        :param key: for telemetry requests, identical keys still waiting in
+        the queue are coalesced into a single request
+        :return: concurrent.futures.Future holding the result of func
+        """
+        if priority not in LANES:
+            raise ValueError(f"Unknown priority lane ({priority}).")
+        with self._lock:
+            if priority == TELEMETRY and key is not None:
+                future = self._pending.get(key)
+                if future is not None:
+                    self._stats[priority]["coalesced"] += 1
+                    return future
+            future = Future()
+            if priority == TELEMETRY and key is not None:
+                self._pending[key] = future
+            self._depth[priority] += 1
+        self._queue.put((priority, next(self._sequence),
+                         (future, func, args, kwargs, key, perf_counter())))
+        return future
+
+    def call(self, func, *args, priority=TELEMETRY, key=None, timeout=None,
+             **kwargs):
+        """Queue a call and wait for its result."""
+        return self.submit(func, *args, priority=priority, key=key,
+                           **kwargs).result(timeout)
+
+    def _work(self):
+        while True:
+            priority, _, job = self._queue.get()
+            future, func, args, kwargs, key, submitted = job
+            wait = perf_counter() - submitted
+            with self._lock:
+                if key is not None and self._pending.get(key) is future:
+                    del self._pending[key]
+                self._depth[priority] -= 1
+                stats = self._stats[priority]
+                stats["count"] += 1
+                stats["wait_total"] += wait
+                stats["wait_max"] = max(stats["wait_max"], wait)
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as error:
+                self._roundtrip[priority].observe(perf_counter() - started)
+                self._errors[priority].inc()
+                future.set_exception(error)
+            else:
+                self._roundtrip[priority].observe(perf_counter() - started)
+                future.set_result(result)
+
+    def depth(self):
+        """Return the number of queued requests per lane."""
+        with self._lock:
+            return {LANES[lane]: n for lane, n in self._depth.items()}
+
+    def metrics(self):
+        """
+        Return queue depth and wait-time statistics per lane.
+
+        :return: dict lane name -> depth, count, coalesced, errors, mean and
+        max wait in seconds
+        """
+        with self._lock:
+            metrics = {}
+            for lane, stats in self._stats.items():
+                count = stats["count"]
+                metrics[LANES[lane]] = {
+                    "depth": self._depth[lane],
+                    "count": count,
+                    "coalesced": stats["coalesced"],
+                    "errors": self._errors[lane].value(),
+                    "wait_mean": stats["wait_total"] / count if count else 0.,
+                    "wait_max": stats["wait_max"]}
+            return metrics
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def scheduler(port):
+    """
+    Return the scheduler of a port, created on first use.
+
+    Devices sharing a port share its scheduler.
+    """
+    with _schedulers_lock:
+        if port not in _schedulers:
+            _schedulers[port] = PortScheduler(port)
+        return _schedulers[port]
+
+
+def metrics():
+    """Return the metrics of all the port schedulers."""
+    with _schedulers_lock:
+        ports = dict(_schedulers)
+    return {port: sched.metrics() for port, sched in ports.items()}
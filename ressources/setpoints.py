@@ -0,0 +1,89 @@
+"""Write-on-change cache of the parameters written to a device."""
+
+import threading
+from time import monotonic
+
+
+class SetpointCache:
+    """
+    Cached view of the setpoints written to a device and of its readbacks.
+
+    A setpoint is only sent to the device when its value changes, and
+    readbacks are served from the last telemetry snapshot while it is
+    recent enough.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._setpoints = {}  # name -> last value successfully written
+        self._snapshot = {}  # name -> (value, monotonic time of the reading)
+
+    def write(self, name, value, writer, *args, force=False):
+        """
+        Write a setpoint if it differs from the cached one.
+
+        :param name: name of the parameter
+        :param value: value to write
+        :param writer: function doing the write, called as writer(*args), and
+        returning True if the write succeeded
+        :param force: write even if the value did not change
+        :return: True if the device holds the value, False if the write failed
+        """
+        with self._lock:
+            if not force and self._setpoints.get(name) == value:
+                return True
+        if not writer(*args):
+            self.invalidate(name)
+            return False
+        with self._lock:
+            self._setpoints[name] = value
+            # The previous readback does not reflect the new setpoint anymore
+            self._snapshot.pop(name, None)
+        return True
+
+    def setpoint(self, name):
+        """Return the last value successfully written, None if unknown."""
+        with self._lock:
+            return self._setpoints.get(name)
+
+    def invalidate(self, name=None):
+        """Forget a cached setpoint (all of them if name is None)."""
+        with self._lock:
+            if name is None:
+                self._setpoints.clear()
+                self._snapshot.clear()
+            else:
+                self._setpoints.pop(name, None)
+                self._snapshot.pop(name, None)
+
+    def update(self, name, value):
+        """Store a telemetry reading in the snapshot."""
+        with self._lock:
+            self._snapshot[name] = (value, monotonic())
+
+    def readback(self, name, reader, *args, max_age=None):
+        """
+        Return a reading, from the snapshot if it is recent enough.
+
+        :param name: name of the parameter
+        :param reader: function reading the value from the device, called as
+        reader(*args) when the snapshot can't be used
+        :param max_age: maximum age in seconds of the snapshot, None to accept
+        any cached reading
+        """
+        with self._lock:
+            cached = self._snapshot.get(name)
+        if cached is not None:
+            value, stamp = cached
+            if max_age is None or monotonic() - stamp <= max_age:
+                return value
+        value = reader(*args)
+        self.update(name, value)
+        return value
+
+    def snapshot(self):
+        """Return a copy of the telemetry snapshot as name -> (value, age)."""
+        now = monotonic()
+        with self._lock:
+            return {name: (value, now - stamp)
+                    for name, (value, stamp) in self._snapshot.items()}
@@ -1,246 +1,330 @@
 import streamlit as st
+import pandas as pd
 import time
+import cProfile
+from functools import lru_cache
+from uuid import uuid4
 from datetime import datetime, timedelta
-from dateutil import parser
-import smbus
-import ressources.citobase as cb
-from tempfile import mkstemp
-from shutil import move, copymode
+from ressources.config import *
+from ressources.client import Client, RemoteSeries
+from ressources.livestatus import LiveStatus, LiveChart
+from ressources.timeline import gantt
+from ressources.engine import dry_run
+from ressources.interlocks import verify
+from ressources.recipes import compile_recipe
+from ressources.eta import OverheadModels
+from ressources.profiling import save_cprofile
 import os
 
-st.set_page_config(
-    page_title="ALD – CVD Process",
-    page_icon=":hammer_and_pick:",
-    layout="wide",
-    initial_sidebar_state="expanded",
-    menu_items={
-        'Get Help': 'https://lmi.cnrs.fr/author/colin-bousige/',
-        'Report a bug': "https://lmi.cnrs.fr/author/colin-bousige/",
-        'About': """
-        ## ALD – CVD Process
-        Version date 2021-10-27.
-
-        This app was made by [Colin Bousige](https://lmi.cnrs.fr/author/colin-bousige/). Contact me for support, requests, or to signal a bug.
-        """
-    }
-)
+# The reactors are owned by the daemon (python -m ressources.daemon): the
+# app is one of its clients, and only talks to the devices through its API.
 
-# # # # # # # # # # # # # # # # # # # # # # # #
-# Define default variables
-# # # # # # # # # # # # # # # # # # # # # # # #
+# Maximum number of updates per second of each field of the live status
+# (the countdowns themselves run in the browser)
+ui_rate = 2
 
-# Relays from the hat are commanded with I2C
-DEVICE_BUS = 1
-bus = smbus.SMBus(DEVICE_BUS)
-
-# Default precursor names
-Prec1 = "TEB"
-Prec2 = "H2"
-Carrier = "Ar"
-
-# Default recipe values
-default = {"t1": 15, # in ms
-           "p1": 40., # in s
-           "t2": 10., # in s
-           "p2": 40., # in s
-           "N": 100, # in s
-           "N2": 1, # in s
-           "plasma": 30} # in Watts
-t1 = default["t1"]
-p1 = default["p1"]
-t2 = default["t2"]
-p2 = default["p2"]
-N = default["N"]
-N2 = default["N2"]
-plasma = default["plasma"]
-
-# Relays attribution
-# Hat adress, relay number
-relays = {
-    Prec1: (0x10, 1),
-    Prec2: (0x10, 2),
-    Carrier: (0x10, 3)
-}
-
-# IP Address of the Cito Plus RF generator, connected by Ethernet
-# cito_address = "169.254.1.1"
-# citoctrl = cb.CitoBase(host_mode = 0, host_addr = cito_address) # 0 for Ethernet
-
-# Address of the Cito Plus RF generator, connected by RS232->USB
-cito_address = "/dev/ttyUSB0"
-citoctrl = cb.CitoBase(host_mode = 1, host_addr = cito_address)
-
-# For writing into the log at the end of the recipe, 
-# whether it's a normal or forced ending
-if 'logname' not in st.session_state:
-    st.session_state['logname'] = ''
-if 'start_time' not in st.session_state:
-    st.session_state['start_time'] = ''
-if 'cycle_time' not in st.session_state:
-    st.session_state['cycle_time'] = ''
-
-
-def turn_ON(gas):
-    """
-    Open relay from the hat with I2C command
-    """
-    DEVICE_ADDR, rel = relays[gas]
-    if gas != Carrier:
-        bus.write_byte_data(DEVICE_ADDR, rel, 0xFF)
-    else:
-        bus.write_byte_data(DEVICE_ADDR, rel, 0x00) # Carrier Normally Open
+# One client per reactor, each session working on the reactor it selected
+clients = {name: Client(daemon_address, name) for name in reactors}
+# Telemetry of the runs, read from the daemon by the charts
+telemetries = {name: RemoteSeries(client) for name, client in clients.items()}
 
+# Overheads of the steps, learned from the logs of the past runs
+overheads = {name: OverheadModels(settings["logs"])
+             for name, settings in reactors.items()}
 
-def turn_OFF(gas):
-    """
-    Close relay from the hat with I2C command
-    """
-    DEVICE_ADDR, rel = relays[gas]
-    if gas != Carrier:
-        bus.write_byte_data(DEVICE_ADDR, rel, 0x00)
-    else:
-        bus.write_byte_data(DEVICE_ADDR, rel, 0xFF) # Carrier Normally Open
+# Cost of the cold start (first run of the app in the process) and of the
+# last rerun, in seconds
+render_times = {"cold": None, "rerun": None}
 
 
-def set_plasma(plasma, logname=None):
+def configure_page():
     """
-    Open the connection to the RF generator and setup the plasma power
+    Per-run setup of the page, to be called first on every run of the app
     """
-    if citoctrl.open():
-        citoctrl.set_power_setpoint_watts(plasma)  # set the rf power
-        st.success("Connection with RF generator OK.")
-        st.info(f"Setpoint: {plasma} W - Value: {citoctrl.get_power_setpoint_watts()[1]} W")
-        if logname is not None:
-            write_to_log(logname, plasma_active="Yes")
-    else:
-        st.error("Can't open connection to the RF generator.")
-        if logname is not None:
-            write_to_log(logname, plasma_active="No")
-        return(False)
+    st.set_page_config(
+        page_title="ALD – CVD Process",
+        page_icon=":hammer_and_pick:",
+        layout="wide",
+        initial_sidebar_state="expanded",
+        menu_items={
+            'Get Help': 'https://lmi.cnrs.fr/author/colin-bousige/',
+            'Report a bug': "https://lmi.cnrs.fr/author/colin-bousige/",
+            'About': """
+            ## ALD – CVD Process
+            Version date 2021-10-27.
 
+            This app was made by [Colin Bousige](https://lmi.cnrs.fr/author/colin-bousige/). Contact me for support, requests, or to signal a bug.
+            """
+        }
+    )
+    # To tell the session running a recipe from the ones observing it
+    if 'session_id' not in st.session_state:
+        st.session_state['session_id'] = uuid4().hex
+    st.sidebar.checkbox("Profile the next run", key="profile",
+                        help="Profile of the daemon and of this page, saved "
+                        "next to the log of the run")
+    if len(reactors) > 1:
+        st.sidebar.selectbox("Reactor", list(reactors), key="reactor")
+    elif 'reactor' not in st.session_state:
+        st.session_state['reactor'] = next(iter(reactors))
 
-# def set_mks():
-#     """
-#     Open the connection to the MKS controller
-#     """
-#     if mksctrl.open():
-#         st.success("Connection with MKS controller OK.")
-#     else:
-#         st.error("Can't open connection to the MKS controller.")
 
-
-def HV_ON():
+def reactor():
     """
-    Turn HV on
+    Name of the reactor selected by the session
     """
-    if citoctrl.open():
-        citoctrl.set_rf_on()
+    return st.session_state.get('reactor', next(iter(reactors)))
 
 
-def HV_OFF():
+def daemon():
     """
-    Turn HV off
+    Client of the daemon for the reactor selected by the session
     """
-    if citoctrl.open():
-        citoctrl.set_rf_off()  # turn off the rf
+    return clients[reactor()]
 
 
-def initialize(pr1=False, pr2=False, car=True, wait=-1):
+def record_render(start):
     """
-    Make sure the relays are closed
+    Record and print the time spent running the app since start
+    (a time.perf_counter() value)
     """
-    turn_ON(Prec1) if pr1 else turn_OFF(Prec1)
-    turn_ON(Prec2) if pr2 else turn_OFF(Prec2)
-    turn_ON(Carrier) if car else turn_OFF(Carrier)
-    if wait>0:
-        print_step(1,["Starting recipe in..."])
-        countdown(wait, wait)
+    elapsed = time.perf_counter() - start
+    kind = "cold" if render_times["cold"] is None else "rerun"
+    render_times[kind] = elapsed
+    try:
+        daemon().report_render(elapsed, kind)
+    except (ConnectionError, ValueError):
+        pass  # The metrics are not worth an error on the page
+    rerun = render_times["rerun"]
+    st.sidebar.caption(
+        f"Cold start: {1000*render_times['cold']:.0f} ms" +
+        (f" – Last rerun: {1000*rerun:.0f} ms" if rerun is not None else ""))
 
 
-def append_to_file(logfile="log.txt", text=""):
+# # # # # # # # # # # # # # # # # # # # # # # #
+# Reactor, through the daemon
+# # # # # # # # # # # # # # # # # # # # # # # #
+
+def initialize():
     """
-    Function to easily append text to a logfile
+    Make sure the relays are closed when no recipe runs. Only the relays
+    whose state differs from the last written one are written.
     """
-    with open(logfile, 'a') as fd:
-        fd.write(f'{text}\n')
+    daemon().idle()
 
 
-def replacement(filepath, pattern, replacement):
+def set_plasma(plasma):
     """
-    Function to replace a pattern in a file
+    Setup the plasma power, only talking to the RF generator if it changed
     """
-    # Creating a temp file
-    fd, abspath = mkstemp()
-    with os.fdopen(fd, 'w') as file1:
-        with open(filepath, 'r') as file0:
-            for line in file0:
-                file1.write(line.replace(pattern, replacement))
-    copymode(filepath, abspath)
-    os.remove(filepath)
-    move(abspath, filepath)
+    print_plasma(daemon().set_plasma(plasma))
 
 
-def update_cycle(logname, i, N):
+def print_plasma(result):
     """
-    Function to write the current cycle number in the logfile
+    Print the connection to the RF generator and the setpoint read back, as
+    returned by control.set_plasma()
     """
-    if i == 0:
-        write_to_log(logname, cycles_done=f"{i+1}/{N}")
+    if result["connected"]:
+        st.success("Connection with RF generator OK.")
+        st.info(f"Setpoint: {result['setpoint']} W - Value: {result['readback']} W")
     else:
-        replacement(logname,
-                    f"cycles_done      {i}/{N}",
-                    f"cycles_done      {i+1}/{N}")
+        st.error("Can't open connection to the RF generator.")
+
+
+# def set_mks():
+#     """
+#     Open the connection to the MKS controller
+#     """
+#     if mksctrl.open():
+#         st.success("Connection with MKS controller OK.")
+#     else:
+#         st.error("Can't open connection to the MKS controller.")
 
 
-def write_to_log(logname, **kwargs):
+
+def run_recipe(name, **params):
     """
-    Function to easily create and update a logfile
+    Start a recipe file of ressources/recipes/ from the page, with some of its
+    parameters overridden, e.g. run_recipe("ALD", t1=0.02, N=50).
+    The recipe runs in the daemon, watched by all the sessions.
     """
-    os.makedirs(os.path.dirname(logname), exist_ok=True)
-    toprint = {str(key): str(value) for key, value in kwargs.items()}
-    append_to_file(logname, text='\n'.join('{:15}  {}'.format(
-        key, value) for key, value in toprint.items()))
+    try:
+        started = daemon().run(name, params,
+                               owner=st.session_state['session_id'],
+                               profile=st.session_state.get('profile', False))
+    except ValueError as error:
+        st.error(error)
+        return
+    if not started:
+        st.error("The reactor is busy with another recipe.")
+        return
+    st.experimental_rerun()
 
 
-def end_recipe():
+def stop_recipe():
     """
-    Ending procedure for recipes
+    Forced ending of the current recipe, from the STOP button of any session.
+    The daemon puts the reactor in a safe state right away and pauses the
+    queue.
     """
-    turn_OFF(Prec1)
-    turn_OFF(Prec2)
-    turn_ON(Carrier)
-    if citoctrl.open():
-        HV_OFF()
-        citoctrl.close()
+    daemon().stop()
     st.experimental_rerun()
 
 
+def enqueue(name, **params):
+    """
+    Add a recipe run to the queue, from a recipe page
+    """
+    try:
+        daemon().enqueue(name, params)
+    except ValueError as error:
+        st.sidebar.error(error)
+        return
+    st.sidebar.success(f"{name} added to the queue.")
+
+
+def observing():
+    """
+    Whether a recipe is running: the runs go on in the daemon, and all the
+    sessions (including the one that started it) watch them. The page stops
+    here if the daemon is not running.
+    """
+    try:
+        return daemon().status()["run"]["running"]
+    except ConnectionError as error:
+        st.error(f"{error} Start it with: python -m ressources.daemon")
+        st.stop()
+
+
+def report_update(start):
+    """
+    Report the time spent showing a new run state since start (a
+    time.perf_counter() value), recorded in the trace of the run
+    """
+    try:
+        daemon().report_render(time.perf_counter() - start, "update")
+    except (ConnectionError, ValueError):
+        pass
+
+
+def watch_run(start=None):
+    """
+    View of the running recipe, with its STOP button.
+    Renders the run state of the daemon until the run stops. The page ends
+    with a rerun: its render time (since start, a time.perf_counter() value)
+    and the time of each update are reported from the loop, while the run
+    is traced.
+    """
+    framework()
+    st.sidebar.write("## Run in progress")
+    status = daemon().status()
+    version, state = status["version"], status["run"]
+    st.sidebar.write(f"{state.get('recipe')} started at {state.get('start_time')}")
+    if st.sidebar.button("STOP PROCESS", key="stop_watched"):
+        stop_recipe()
+    schedule, rf = None, None
+    if state.get("title"):
+        remcycletext.write(state["title"])
+    owned = state.get("owner") == st.session_state['session_id']
+    profile = cProfile.Profile() if owned and state.get("profile") else None
+    if profile is not None:
+        # Rendering of the run by the session that started it, saved next to
+        # the log of the run with the profile of the daemon
+        profile.enable()
+    try:
+        while state["running"]:
+            shown = time.perf_counter()
+            if state.get("rf") and rf is None:
+                rf = state["rf"]
+                with st.sidebar:
+                    print_plasma(rf)
+            if state.get("loops"):
+                print_cycle(state["loops"])
+            if state.get("steps"):
+                print_step(state["step"], state["steps"])
+            if state.get("eta"):
+                print_end_time(state["eta"])
+            if state.get("schedule") and state["schedule"] != schedule:
+                schedule = state["schedule"]
+                remtottimetext.write("# Remaining Time:\n")
+                live.start(*schedule,
+                           offset=state["position"] + time.time() - state["at"])
+            live.flush()
+            update_charts()
+            if start is not None:
+                record_render(start)  # Up to the first run state shown
+                start = None
+            else:
+                report_update(shown)
+            version, state = daemon().wait(version, timeout=1.)
+    finally:
+        if profile is not None:
+            profile.disable()
+            if state.get("logname"):
+                save_cprofile(profile,
+                              os.path.splitext(state["logname"])[0] + ".ui")
+    if start is not None:
+        record_render(start)  # Run ended before its first state was shown
+    if state.get("ending") == "normal" and owned:
+        st.balloons()
+        time.sleep(2)
+    st.experimental_rerun()
+
+
+def update_charts():
+    """
+    Send the new telemetry buckets to the charts of the page
+    """
+    for chart in charts:
+        chart.update()
+
+
 def framework():
     """
     Defines the style and the positions of the printing areas
     """
     global c1, c2, remcycletext, remcycle, remcyclebar, step_print
     global remtottimetext, remtottime, remtime, final_time_text, final_time
+    global live
+    live = LiveStatus(min_interval=1/ui_rate, style=_style())
     c1, c2 = st.columns((1, 1))
-    remcycletext = c1.empty()
-    remcycle = c1.empty()
-    remcyclebar = c1.empty()
-    step_print = c1.empty()
-    remtottimetext = c2.empty()
+    remcycletext = live.field(c1.empty())
+    remcycle = live.field(c1.empty())
+    remcyclebar = live.field(c1.empty())
+    step_print = live.field(c1.empty())
+    remtottimetext = live.field(c2.empty())
     remtottime = c2.empty()
     remtime = c2.empty()
-    final_time_text = c2.empty()
-    final_time = c2.empty()
-    with open("ressources/style.css") as f:
-        st.markdown('<style>{}</style>'.format(f.read()),
-                    unsafe_allow_html=True)
+    final_time_text = live.field(c2.empty())
+    final_time = live.field(c2.empty())
+    live.bind_countdown(remtottime)
+    global charts
+    telemetry = telemetries[reactor()]
+    mfc_channels = reactors[reactor()]["mfc_channels"]
+    charts = [
+        LiveChart(st.empty(), telemetry, {"forward": "Forward power (W)",
+                                          "reflected": "Reflected power (W)"}),
+        LiveChart(st.empty(), telemetry, {f"flow{channel}": f"{gas} (sccm)"
+                                          for gas, channel in mfc_channels.items()}),
+        LiveChart(st.empty(), telemetry, {"step": "Step"})]
+    live.add_ticker(telemetry_period, update_charts)
+    st.markdown(_style(), unsafe_allow_html=True)
+
+
+@lru_cache(maxsize=None)
+def _style():
+    """
+    Read the style sheet once per process
+    """
+    with open(os.path.join(os.path.dirname(__file__), "style.css")) as f:
+        return '<style>{}</style>'.format(f.read())
 
 
 def print_tot_time(tot):
     """
     Print total estimated time and estimated ending time
     """
-    finaltime = datetime.now() + timedelta(seconds=tot)
     remcycletext.write("# Total Time:\n")
     tot = int(tot)
     totmins, totsecs = divmod(tot, 60)
@@ -249,39 +333,101 @@ def print_tot_time(tot):
     remcycle.markdown(
         "<div><h2><span class='highlight green'>"+tottimer+"</h2></span></div>",
         unsafe_allow_html=True)
+    print_end_time(time.time() + tot)
+
+
+def print_end_time(end):
+    """
+    Print the estimated ending time (a time.time() value)
+    """
     final_time_text.write("# Ending Time:\n")
     final_time.markdown(
-        "<div><h2><span class='highlight red'>"+finaltime.strftime("%H:%M") +
+        "<div><h2><span class='highlight red'>" +
+        datetime.fromtimestamp(end).strftime("%H:%M:%S") +
         "</h2></span></div>", unsafe_allow_html=True)
 
 
-def countdown(t, tot):
+def plan(name, **params):
     """
-    Print time countdown and total remaining time
+    Print the total time of a recipe, the interlocks it breaks and preview
+    its timeline, before GO.
+    Return the compiled recipe, None if its parameters are invalid.
     """
-    remtottimetext.write("# Remaining Time:\n")
-    tot = int(tot)
-    while t>0:
-        if t >= 1:
-            mins, rest = divmod(t, 60)
-            secs, mil = divmod(rest, 1)
-            timer = '{:02d}:{:02d}:{:03d}'.format(int(mins), int(secs), int(mil*1000))
-            remtime.markdown(
-                f"<div><h2>Current step: <span class='highlight blue'>{timer}</h2></span></div>",
-                unsafe_allow_html=True)
-            totmins, totsecs = divmod(tot, 60)
-            tothours, totmins = divmod(totmins, 60)
-            tottimer = '{:02d}:{:02d}:{:02d}'.format(
-                tothours, totmins, totsecs)
-            remtottime.markdown(
-                f"<div><h2>Total: <span class='highlight blue'>{tottimer}</h2></span></div>",
-                unsafe_allow_html=True)
-            time.sleep(1)
-            t -= 1
-            tot -= 1
-        else:
-            time.sleep(t)
-            t -= 1
+    try:
+        recipe = compile_recipe(name, **params)
+    except ValueError as error:
+        st.error(error)
+        return None
+    print_tot_time(overheads[reactor()].expected(recipe))
+    for broken in verify(recipe, actuator_names(recipe)):
+        st.error(f"Interlock: {broken}. The reactor will refuse to run it.")
+    preview(recipe)
+    return recipe
+
+
+def actuator_names(recipe):
+    """
+    Name displayed for each actuator of a compiled recipe, from the gases of
+    the selected reactor
+    """
+    gases = reactors[reactor()]["gases"]
+    names = {actuator: recipe.params.get(actuator.lower(), gas)
+             for actuator, gas in gases.items() if actuator != "Carrier"}
+    return dict(names, Carrier=gases.get("Carrier", "Carrier"), RF="RF")
+
+
+def preview(recipe):
+    """
+    Gantt chart of the valves and RF timeline of a compiled recipe
+    """
+    with st.expander("Timeline preview"):
+        names = actuator_names(recipe)
+        st.altair_chart(gantt(recipe.timeline(), names), use_container_width=True)
+        st.caption(" – ".join(f"{names[actuator]}: {dose['pulses']} pulses, "
+                              f"{dose['time']:.3g} s"
+                              for actuator, dose in recipe.dose().items()
+                              if actuator != "RF" and dose['pulses']))
+
+
+def simulate(name, **params):
+    """
+    Dry run of a recipe file: the recipe engine runs it without any device,
+    on a virtual clock. Return the engine.Trace of the run.
+    """
+    return dry_run(compile_recipe(name, **params))
+
+
+def print_dry_run(name, **params):
+    """
+    Run a recipe dry and print its actuations, steps and final state
+    """
+    start = time.perf_counter()
+    try:
+        trace = simulate(name, **params)
+    except ValueError as error:
+        st.error(f"Dry run failed: {error}")
+        return
+    elapsed = time.perf_counter() - start
+    names = actuator_names(compile_recipe(name, **params))
+    with st.expander("Dry run", expanded=True):
+        st.write(f"{len(trace.actions)} actuations and {len(trace.steps)} steps "
+                 f"over {timedelta(seconds=round(trace.duration))}, "
+                 f"simulated in {1000*elapsed:.0f} ms.")
+        st.write("Final state: " + ", ".join(
+            f"{names[actuator]} {'on' if on else 'off'}"
+            for actuator, on in trace.state.items()))
+        labels = [f"{i+1}. {label}" for i, label in enumerate(trace.labels)]
+        steps = pd.DataFrame({"step": [labels[i] for i in trace.steps["label"]],
+                              "duration (s)": trace.steps["duration"]})
+        st.dataframe(steps.groupby("step", sort=False)["duration (s)"]
+                          .agg(["count", "sum"]))
+        shown = trace.actions[:1000]
+        st.dataframe(pd.DataFrame({
+            "time (s)": shown["t"],
+            "actuator": [names[actuator] for actuator in shown["actuator"]],
+            "on": shown["on"]}))
+        if len(trace.actions) > len(shown):
+            st.caption(f"First {len(shown)} actuations shown.")
 
 
 def print_step(n, steps):
@@ -297,357 +443,20 @@ def print_step(n, steps):
     step_print.markdown(annotated_steps, unsafe_allow_html=True)
 
 
-# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # 
-#  RECIPE DEFINITIONS
-# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # 
-
-def ALD(t1=0.015, p1=40, t2=10, p2=40, N=100, N2=1, plasma=1, 
-        recipe="ALD", prec1="TEB", Carrier="Ar", prec2="H2", cutCarrier=True):
-    """
-    Definition of ALD recipe
-    """
-    initialize(wait=10)
-    start_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.session_state['start_time'] = start_time
-    st.session_state['logname'] = f"Logs/{start_time}_{recipe}.txt"
-    tot = (t1+p1+(t2+p2)*N2)*N
-    st.session_state['cycle_time'] = tot/N
-    write_to_log(st.session_state['logname'], recipe=recipe, start=start_time,
-                   t1=t1, p1=p1, t2=t2, p2=p2, N=N, N2=N2, time_per_cycle=timedelta(seconds=st.session_state['cycle_time']))
-    steps = [f"Pulse {prec1} – {int(t1*1000)} ms",
-             f"Purge {prec1} – {p1} s",
-             f"Pulse {prec2} – {t2} s",
-             f"Purge {prec2} – {p2} s"
-            ]
-    for i in range(N):
-        remcycletext.write("# Cycle number:\n")
-        remcycle.markdown("<div><h2><span class='highlight green'>" +
-                            str(i+1)+" / "+str(N)+"</h2></span></div>",
-                            unsafe_allow_html=True)
-        remcyclebar.progress(int((i+1)/N*100))
-        turn_ON(Prec1)
-        print_step(1, steps)
-        countdown(t1, tot)
-        tot = tot-t1
-        turn_OFF(Prec1)
-        print_step(2, steps)
-        countdown(p1, tot)
-        tot = tot-p1
-        for j in range(N2):
-            if N2 > 1:
-                remcycle.markdown("<div><h2><span class='highlight green'>" +
-                                    str(i+1)+" / "+str(N)+"</span> – " +
-                                    str(j+1)+" / "+str(N2)+"</h2></div>",
-                                    unsafe_allow_html=True)
-            if cutCarrier:
-                turn_OFF(Carrier)
-            turn_ON(Prec2)
-            print_step(3, steps)
-            countdown(t2, tot)
-            tot = tot-t2
-            turn_OFF(Prec2)
-            if cutCarrier:
-                turn_ON(Carrier)
-            print_step(4, steps)
-            countdown(p2, tot)
-            tot = tot-p2
-        update_cycle(st.session_state['logname'], i, N)
-    end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.balloons()
-    time.sleep(2)
-    write_to_log(st.session_state['logname'], end=end_time,
-                    duration=f"{parser.parse(end_time)-parser.parse(start_time)}",
-                    ending="normal")
-    end_recipe()
-
-
-def Purge(t1=0.015, p1=40, t2=10, p2=40, N=100, N2=1, plasma=1, 
-          recipe="Purge", prec1="TEB", Carrier="Ar", prec2="H2"):
-    """
-    Definition of a Precursor 1 Purge
-    """
-    initialize(wait=0)
-    steps = [f"Pulse {prec1} – {t1} s"]
-    start_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.session_state['start_time'] = start_time
-    st.session_state['logname'] = f"Logs/{start_time}_{recipe}.txt"
-    tot = t1
-    st.session_state['cycle_time'] = tot
-    write_to_log(st.session_state['logname'], recipe=recipe, start=start_time,
-                 t1=t1)
-    turn_ON(Prec1)
-    print_step(1, steps)
-    countdown(t1, t1)
-    turn_OFF(Prec1)
-    end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.balloons()
-    time.sleep(2)
-    write_to_log(st.session_state['logname'], end=end_time,
-                 duration=f"{parser.parse(end_time)-parser.parse(start_time)}",
-                 ending="normal")
-    end_recipe()
-
-
-def PulsedCVD(t1=0.015, p1=40, t2=10, p2=40, N=100, N2=1, plasma=1, 
-              recipe="Pulsed CVD", prec1="TEB", Carrier="Ar", prec2="H2", 
-              sendCarrier=True):
-    """
-    Definition of pulsed CVD recipe
-    """
-    initialize(pr2=True, car=False, wait=30) if sendCarrier else initialize(pr2=True, wait=30)
-    start_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.session_state['start_time'] = start_time
-    st.session_state['logname'] = f"Logs/{start_time}_{recipe}.txt"
-    tot = (t1+p1)*N
-    st.session_state['cycle_time'] = tot/N
-    write_to_log(st.session_state['logname'], recipe=recipe, start=start_time,
-                t1=t1, p1=p1, N=N, time_per_cycle=timedelta(seconds=st.session_state['cycle_time']))
-    steps = [f"Pulse {prec1} – {int(t1*1000)} ms",
-            f"Purge {prec1} – {p1} s",
-            ]
-    for i in range(N):
-        remcycletext.write("# Cycle number:\n")
-        remcycle.markdown("<div><h2><span class='highlight green'>" +
-                            str(i+1)+" / "+str(N)+"</h2></span></div>",
-                            unsafe_allow_html=True)
-        remcyclebar.progress(int((i+1)/N*100))
-        turn_ON(Carrier)
-        turn_ON(Prec1)
-        print_step(1, steps)
-        countdown(t1, tot)
-        tot = tot-t1
-        turn_OFF(Prec1)
-        if sendCarrier:
-            turn_OFF(Carrier)
-        print_step(2, steps)
-        countdown(p1, tot)
-        tot = tot-p1
-        update_cycle(st.session_state['logname'], i, N)
-    end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.balloons()
-    time.sleep(2)
-    write_to_log(st.session_state['logname'], end=end_time,
-                    duration=f"{parser.parse(end_time)-parser.parse(start_time)}",
-                    ending="normal")
-    end_recipe()
-
-
-def PECVD(t1=0.015, p1=40, t2=10, p2=40, N=100, N2=1, plasma=1, 
-          recipe="PECVD", prec1="TEB", Carrier="Ar", prec2="H2",
-          sendCarrier=True):
-    """
-    Definition of PECVD recipe
-    """
-    initialize(pr2=True, car=False, wait=30) if sendCarrier else initialize(pr2=True, wait=30)
-    start_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.session_state['start_time'] = start_time
-    st.session_state['logname'] = f"Logs/{start_time}_{recipe}.txt"
-    tot = t1
-    st.session_state['cycle_time'] = tot
-    write_to_log(st.session_state['logname'], recipe=recipe, start=start_time,
-                 t1=t1, plasma=plasma,
-                 time_per_cycle=timedelta(seconds=st.session_state['cycle_time']))
-    set_plasma(plasma, st.session_state['logname'])
-    steps = [f"Pulse {prec1} – {t1} s"]
-    remcycletext.write(f"# Pulsing {prec1}...\n")
-    turn_ON(Carrier)
-    turn_ON(Prec1)
-    HV_ON()
-    print_step(1, steps)
-    countdown(t1, tot)
-    turn_OFF(Prec1)
-    if sendCarrier:
-        turn_OFF(Carrier)
-    HV_OFF()
-    end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.balloons()
-    time.sleep(2)
-    write_to_log(st.session_state['logname'], end=end_time,
-                 duration=f"{parser.parse(end_time)-parser.parse(start_time)}",
-                 ending="normal")
-    end_recipe()
-
-
-def PulsedPECVD(t1=0.015, p1=40, t2=10, p2=40, N=100, N2=1, plasma=1, 
-                recipe="Pulsed PECVD", prec1="TEB", Carrier="Ar", prec2="H2",
-                wait=30):
-    """
-    Definition of pulsed PECVD recipe
-    """
-    initialize(pr2=True, car=False, wait=wait)
-    start_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.session_state['start_time'] = start_time
-    st.session_state['logname'] = f"Logs/{start_time}_{recipe}.txt"
-    tot = (t1+p1+(t2+p2)*N2)*N
-    st.session_state['cycle_time'] = tot/N
-    write_to_log(st.session_state['logname'], recipe=recipe, start=start_time,
-                 t1=t1, p1=p1, t2=t2, p2=p2, N=N, N2=N2, plasma=plasma,
-                 time_per_cycle=timedelta(seconds=st.session_state['cycle_time']))
-    set_plasma(plasma, st.session_state['logname'])
-    steps = [f"Pulse {prec1} - {int(t1*1000)} ms",
-             f"Purge {prec1} - {p1} s",
-             f"Plasma – {t2} s",
-             f"Purge – {p2} s"
-             ]
-    for i in range(N):
-        remcycletext.write("# Cycle number:\n")
+def print_cycle(loops):
+    """
+    Print the cycle number, followed by the iterations of the nested loops
+    repeated more than once
+    """
+    (i, N), inner = loops[0], [loop for loop in loops[1:] if loop[1] > 1]
+    remcycletext.write("# Cycle number:\n")
+    if inner:
         remcycle.markdown("<div><h2><span class='highlight green'>" +
-                          str(i+1)+" / "+str(N)+"</h2></span></div>",
-                          unsafe_allow_html=True)
-        remcyclebar.progress(int((i+1)/N*100))
-        turn_ON(Carrier); turn_ON(Prec1)
-        print_step(1, steps)
-        countdown(t1, tot)
-        tot = tot-t1
-        turn_OFF(Prec1); turn_OFF(Carrier)
-        print_step(2, steps)
-        countdown(p1, tot)
-        tot = tot-p1
-        for j in range(N2):
-            if N2 > 1:
-                remcycle.markdown("<div><h2><span class='highlight green'>" +
-                                  str(i+1)+" / "+str(N)+"</span> – " +
-                                  str(j+1)+" / "+str(N2)+"</h2></div>",
-                                  unsafe_allow_html=True)
-            HV_ON()
-            print_step(3, steps)
-            countdown(t2, tot)
-            tot = tot-t2
-            HV_OFF()
-            print_step(4, steps)
-            countdown(p2, tot)
-            tot = tot-p2
-        update_cycle(st.session_state['logname'], i, N)
-    end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.balloons()
-    time.sleep(2)
-    write_to_log(st.session_state['logname'], end=end_time,
-                 duration=f"{parser.parse(end_time)-parser.parse(start_time)}",
-                 ending="normal")
-    end_recipe()
-
-
-def Plasma_clean(t1=0.015, p1=40, t2=10, p2=40, N=100, N2=1, plasma=1, 
-                 recipe="Plasma cleaning", prec1="TEB", Carrier="Ar", prec2="H2"):
-    """
-    Definition of a Plasma cleaning
-    """
-    initialize()
-    steps = [f"Pulse {prec2} – {t2} s"]
-    start_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.session_state['start_time'] = start_time
-    st.session_state['logname'] = f"Logs/{start_time}_{recipe}.txt"
-    tot = t2
-    st.session_state['cycle_time'] = tot
-    write_to_log(st.session_state['logname'], recipe=recipe, start=start_time,
-                 t2=t2, plasma=plasma)
-    set_plasma(plasma, st.session_state['logname'])
-    turn_ON(Prec2)
-    HV_ON()
-    print_step(1, steps)
-    countdown(t2, t2)
-    turn_OFF(Prec2)
-    HV_OFF()
-    end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.balloons()
-    time.sleep(2)
-    write_to_log(st.session_state['logname'], end=end_time,
-                 duration=f"{parser.parse(end_time)-parser.parse(start_time)}",
-                 ending="normal")
-    end_recipe()
-
-
-def PEALD(t1=0.015, p1=40, t2=10, p2=40, N=100, N2=1, plasma=1, 
-          recipe="PEALD", prec1="TEB", Carrier="Ar", prec2="H2", cutCarrier=True):
-    """
-    Definition of PEALD recipe
-    """
-    initialize(wait=10)
-    start_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.session_state['start_time'] = start_time
-    st.session_state['logname'] = f"Logs/{start_time}_{recipe}.txt"
-    tot = (t1+p1+(t2+p2)*N2)*N
-    st.session_state['cycle_time'] = tot/N
-    write_to_log(st.session_state['logname'], recipe=recipe, start=start_time,
-                 t1=t1, p1=p1, t2=t2, p2=p2, N=N, N2=N2, plasma=plasma,
-                 time_per_cycle=timedelta(seconds=st.session_state['cycle_time']))
-    set_plasma(plasma, st.session_state['logname'])
-    steps = [f"Pulse {prec1} – {int(t1*1000)} ms",
-             f"Purge {prec1} – {p1} s",
-             f"Pulse {prec2} + Plasma – {t2} s",
-             f"Purge {prec2} – {p2} s"
-             ]
-    for i in range(N):
-        remcycletext.write("# Cycle number:\n")
+                          f"{i+1} / {N}</span> – " +
+                          " – ".join(f"{j+1} / {n}" for j, n in inner) +
+                          "</h2></div>", unsafe_allow_html=True)
+    else:
         remcycle.markdown("<div><h2><span class='highlight green'>" +
-                          str(i+1)+" / "+str(N)+"</h2></span></div>",
+                          f"{i+1} / {N}</h2></span></div>",
                           unsafe_allow_html=True)
-        remcyclebar.progress(int((i+1)/N*100))
-        turn_ON(Prec1)
-        print_step(1, steps)
-        countdown(t1, tot)
-        tot = tot-t1
-        turn_OFF(Prec1)
-        print_step(2, steps)
-        countdown(p1, tot)
-        tot = tot-p1
-        for j in range(N2):
-            if N2 > 1:
-                remcycle.markdown("<div><h2><span class='highlight green'>" +
-                                  str(i+1)+" / "+str(N)+"</span> – " +
-                                  str(j+1)+" / "+str(N2)+"</h2></div>",
-                                  unsafe_allow_html=True)
-            turn_ON(Prec2)
-            if cutCarrier:
-                turn_OFF(Carrier)
-            HV_ON()
-            print_step(3, steps)
-            countdown(t2, tot)
-            tot = tot-t2
-            turn_OFF(Prec2)
-            HV_OFF()
-            if cutCarrier:
-                turn_ON(Carrier)
-            print_step(4, steps)
-            countdown(p2, tot)
-            tot = tot-p2
-        update_cycle(st.session_state['logname'], i, N)
-    end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.balloons()
-    time.sleep(2)
-    write_to_log(st.session_state['logname'], end=end_time,
-                 duration=f"{parser.parse(end_time)-parser.parse(start_time)}",
-                 ending="normal")
-    end_recipe()
-
-
-def CVD(t1=0.015, p1=40, t2=10, p2=40, N=100, N2=1, plasma=1, recipe="CVD", 
-        prec1="TEB", Carrier="Ar", prec2="H2",
-        sendCarrier=True):
-    """
-    Definition of CVD recipe
-    """
-    initialize(pr2=True, car=False, wait=30) if sendCarrier else initialize(pr2=True, wait=30)
-    start_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.session_state['start_time'] = start_time
-    st.session_state['logname'] = f"Logs/{start_time}_{recipe}.txt"
-    tot = t1
-    st.session_state['cycle_time'] = tot
-    write_to_log(st.session_state['logname'], recipe=recipe, start=start_time,
-                 t1=t1, time_per_cycle=timedelta(seconds=st.session_state['cycle_time']))
-    steps = [f"Pulse {prec1} – {t1} s"]
-    remcycletext.write(f"# Pulsing {prec1}...\n")
-    turn_ON(Carrier)
-    turn_ON(Prec1)
-    print_step(1, steps)
-    countdown(t1, tot)
-    turn_OFF(Prec1)
-    if sendCarrier:
-        turn_OFF(Carrier)
-    end_time = datetime.now().strftime(f"%Y-%m-%d-%H:%M:%S")
-    st.balloons()
-    time.sleep(2)
-    write_to_log(st.session_state['logname'], end=end_time,
-                 duration=f"{parser.parse(end_time)-parser.parse(start_time)}",
-                 ending="normal")
-    end_recipe()
+    remcyclebar.progress(int((i+1)/N*100))
@@ -0,0 +1,234 @@
+"""Fixed-layout shared-memory status block for cross-process live monitoring."""
+
+import struct
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from multiprocessing import shared_memory, resource_tracker
+
+# Names of the telemetry slots, in their order in the block
+TELEMETRY = ("forward", "reflected", "load", "setpoint",
+             "flow1", "flow2", "flow3", "flow4")
+
+# Layout of the block, after the sequence counter:
+# recipe name, start time (epoch), cycle, number of cycles, sub-cycle,
+# number of sub-cycles, step, step deadline (epoch), relay bitmask (bit n-1
+# for relay n), RF state, telemetry values, time of the last update (epoch)
+_SEQUENCE = struct.Struct("<Q")
+_BODY = struct.Struct("<32sdIIIIIdIB3x" + "d" * len(TELEMETRY) + "d")
+SIZE = _SEQUENCE.size + _BODY.size
+
+_DEFAULTS = {"recipe": "", "started": 0., "cycle": 0, "cycles": 0,
+             "subcycle": 0, "subcycles": 0, "step": 0, "deadline": 0.,
+             "relays": 0, "rf": False, "updated": 0.}
+
+
+class StatusBlock:
+    """
+    Status of the executor in a shared-memory block.
+
+    There is a single writer (a thread of the executor process) and any
+    number of local readers. Consistency is ensured by a sequence counter
+    (seqlock): it is odd while the block is being written, and readers retry
+    until they read the same even value before and after reading the body,
+    so readers never block the writer.
+
+    The threads of the executor do not write the block themselves: update()
+    queues their fields without lock, and the writer thread writes them,
+    those queued meanwhile at once.
+    """
+
+    def __init__(self, shm, writer):
+        self._shm = shm
+        self._buf = shm.buf
+        self._writer = writer
+        self._sequence = _SEQUENCE.unpack_from(self._buf, 0)[0]
+        self._values = dict(_DEFAULTS)
+        self._values.update({name: float("nan") for name in TELEMETRY})
+        # Updates queued for the writer thread: (fields, telemetry), or an
+        # Event set once the previous ones are written (see flush())
+        self._pending = deque()
+        self._wake = threading.Event()
+        self._closing = False
+        self._thread = None
+        if writer:
+            self._thread = threading.Thread(target=self._write_loop,
+                                            daemon=True,
+                                            name=f"statusblock {shm.name}")
+            self._thread.start()
+
+    ##########################################################################
+    # Creation and attachment
+    ##########################################################################
+
+    @classmethod
+    def create(cls, name="aldpi_status"):
+        """Create the block (replacing a stale one) for the executor."""
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=SIZE)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name, create=True, size=SIZE)
+        block = cls(shm, writer=True)
+        block.update()
+        block.flush()
+        return block
+
+    @classmethod
+    def attach(cls, name="aldpi_status"):
+        """Attach to an existing block as a reader."""
+        shm = shared_memory.SharedMemory(name)
+        # The block belongs to the executor: don't let the resource tracker
+        # of the reader unlink it when the reader exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, writer=False)
+
+    def close(self):
+        """Detach from the block, and destroy it if we are the writer."""
+        if self._thread is not None:
+            self._closing = True
+            self._wake.set()
+            self._thread.join()
+        self._buf = None
+        self._shm.close()
+        if self._writer:
+            self._shm.unlink()
+
+    ##########################################################################
+    # Writing
+    ##########################################################################
+
+    def update(self, telemetry=None, **fields):
+        """
+        Write some fields of the block, from the writer thread: the call
+        only queues them.
+
+        :param telemetry: dict of telemetry values, keys in TELEMETRY
+        :param fields: other fields (recipe, started, cycle, cycles, subcycle,
+        subcycles, step, deadline, relays, rf)
+        """
+        for key in fields:
+            if key not in _DEFAULTS:
+                raise KeyError(f"Unknown status field ({key}).")
+        for key in telemetry or ():
+            if key not in TELEMETRY:
+                raise KeyError(f"Unknown telemetry slot ({key}).")
+        self._pending.append((fields, telemetry))
+        if not self._wake.is_set():  # Lock-free while the writer is busy
+            self._wake.set()
+
+    def flush(self):
+        """Wait until the updates queued so far are written."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        written = threading.Event()
+        self._pending.append(written)
+        self._wake.set()
+        written.wait()
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()  # Before draining: no update is missed
+            written, updates = [], []
+            while self._pending:
+                update = self._pending.popleft()
+                (written if isinstance(update, threading.Event)
+                 else updates).append(update)
+            if updates and not self._write(updates):
+                # An invalid value: the valid updates are written one by one
+                for update in updates:
+                    self._write([update])
+            for event in written:
+                event.set()
+            if self._closing:
+                return
+
+    def _write(self, updates):
+        """Write updates at once, False if one of them has invalid values"""
+        values = dict(self._values)
+        for fields, telemetry in updates:
+            values.update(fields)
+            values.update(telemetry or ())
+        values["updated"] = time.time()
+        try:
+            body = _BODY.pack(values["recipe"].encode()[:32],
+                              values["started"], values["cycle"],
+                              values["cycles"], values["subcycle"],
+                              values["subcycles"], values["step"],
+                              values["deadline"], values["relays"],
+                              bool(values["rf"]),
+                              *(values[name] for name in TELEMETRY),
+                              values["updated"])
+        except (struct.error, AttributeError):
+            if len(updates) == 1:
+                traceback.print_exc()
+            return False
+        self._values = values
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._buf, 0, self._sequence)
+        self._buf[_SEQUENCE.size:SIZE] = body
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._buf, 0, self._sequence)
+        return True
+
+    def update_from_run(self, state):
+        """Write the fields of a run state snapshot (see runstate.RunState)."""
+        self.update(recipe=state.get("recipe") or "",
+                    started=state.get("started", 0.),
+                    cycle=state.get("cycle", 0), cycles=state.get("N", 0),
+                    subcycle=state.get("subcycle", 0),
+                    subcycles=state.get("N2", 0),
+                    step=state.get("step", 0) if state["running"] else 0,
+                    deadline=state.get("deadline", 0.))
+
+    ##########################################################################
+    # Reading
+    ##########################################################################
+
+    def read(self, retries=1000):
+        """
+        Read a consistent copy of the block.
+
+        :return: dict of the fields, with the telemetry in a sub-dict
+        """
+        for _ in range(retries):
+            before = _SEQUENCE.unpack_from(self._buf, 0)[0]
+            if before % 2:
+                continue
+            body = _BODY.unpack_from(self._buf, _SEQUENCE.size)
+            if _SEQUENCE.unpack_from(self._buf, 0)[0] == before:
+                break
+        else:
+            raise TimeoutError("Status block is continuously being written.")
+        (recipe, started, cycle, cycles, subcycle, subcycles, step, deadline,
+         relays, rf), telemetry = body[:10], body[10:-1]
+        return {"sequence": before,
+                "recipe": recipe.rstrip(b"\0").decode(errors="replace"),
+                "started": started, "cycle": cycle, "cycles": cycles,
+                "subcycle": subcycle, "subcycles": subcycles, "step": step,
+                "deadline": deadline, "relays": relays, "rf": bool(rf),
+                "telemetry": dict(zip(TELEMETRY, telemetry)),
+                "updated": body[-1]}
+
+
+if __name__ == '__main__':  # running sample: print the status at 2 Hz
+    # python -m ressources.statusblock [reactor], for a reactor other than the
+    # first one (see control.reactors)
+    block = StatusBlock.attach(f"aldpi_status_{sys.argv[1]}"
+                               if len(sys.argv) > 1 else "aldpi_status")
+    try:
+        while True:
+            status = block.read()
+            remaining = max(0., status["deadline"] - time.time())
+            print(f"{status['recipe']:>12} cycle {status['cycle']}/"
+                  f"{status['cycles']} step {status['step']} "
+                  f"({remaining:6.1f} s left) relays {status['relays']:04b} "
+                  f"RF {'on' if status['rf'] else 'off'}", flush=True)
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        block.close()
@@ -0,0 +1,78 @@
+"""Background polling of the device readings during a run."""
+
+import threading
+import time
+
+
+class TelemetryPoller:
+    """
+    Periodically read the telemetry sources and feed the readings to a
+    TimeSeries and to any number of sinks.
+    """
+
+    def __init__(self, series, period=1.0, name="telemetry"):
+        """
+        :param series: timeseries.TimeSeries receiving the readings
+        :param period: polling period in s
+        :param name: name of the polling thread
+        """
+        self.series = series
+        self.period = period
+        self.name = name
+        self._sources = []
+        self._sinks = []
+        # Each polling thread has its own stop event: a thread stopped and
+        # still ending its polling never misses it on a restart
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_source(self, source):
+        """
+        Register a function returning a dict channel -> value. A source
+        raising an exception is skipped for this polling.
+        """
+        self._sources.append(source)
+
+    def add_sink(self, sink):
+        """Register a function called with the dict of each polling."""
+        self._sinks.append(sink)
+
+    @property
+    def running(self):
+        return (self._thread is not None and self._thread.is_alive() and
+                not self._stop.is_set())
+
+    def start(self):
+        """Start polling in a background thread, if not already polling."""
+        if self.running:
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, args=(self._stop,),
+                                        daemon=True, name=self.name)
+        self._thread.start()
+
+    def stop(self, wait=False):
+        """
+        Stop polling.
+
+        :param wait: wait for the current polling to end
+        """
+        self._stop.set()
+        thread = self._thread
+        if wait and thread not in (None, threading.current_thread()):
+            thread.join()
+
+    def _poll(self, stop):
+        while not stop.is_set():
+            start = time.time()
+            values = {}
+            for source in self._sources:
+                try:
+                    values.update(source())
+                except Exception:
+                    pass
+            if values:
+                self.series.append(start, values)
+                for sink in self._sinks:
+                    sink(values)
+            stop.wait(max(0., self.period - (time.time() - start)))
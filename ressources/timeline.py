@@ -0,0 +1,163 @@
+"""Compiled valve/RF timeline of a recipe, built with NumPy."""
+
+import numpy as np
+
+# Actuators of the reactor, bit n of a step state is the n-th actuator
+ACTUATORS = ("Prec1", "Prec2", "Carrier", "RF", "Prec3")
+
+
+def bits(actuators):
+    """Return the state bitmask of a collection of actuator names."""
+    return sum(1 << ACTUATORS.index(name) for name in actuators)
+
+
+class Timeline:
+    """
+    Flat timeline of a recipe: step i starts at start[i] (in s), lasts
+    duration[i], with the actuators of bitmask state[i] on. label[i] is the
+    index of the step in the list of step labels, cycle[i] its cycle.
+    """
+
+    def __init__(self, start, duration, state, label, cycle, labels):
+        self.start = start
+        self.duration = duration
+        self.state = state
+        self.label = label
+        self.cycle = cycle
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.start)
+
+    @property
+    def total(self):
+        """Total duration in s."""
+        if not len(self):
+            return 0.
+        return float(self.start[-1] + self.duration[-1])
+
+    @property
+    def cycles(self):
+        return int(self.cycle[-1]) + 1 if len(self) else 0
+
+    def on(self, actuator):
+        """Boolean array telling for each step if an actuator is on."""
+        return (self.state >> ACTUATORS.index(actuator)) & 1 == 1
+
+    def edges(self, actuator):
+        """
+        Steps where an actuator turns on and off, consecutive steps merged.
+
+        :return: tuple of arrays (first step on, first step off after it)
+        """
+        on = self.on(actuator).astype(np.int8)
+        edges = np.diff(np.concatenate(([0], on, [0])))
+        return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    def intervals(self, actuator):
+        """
+        Periods during which an actuator is on, consecutive steps merged.
+
+        :return: tuple of arrays (starts, ends, first step index)
+        """
+        first, after = self.edges(actuator)
+        times = np.append(self.start, self.total)
+        return times[first], times[after], first
+
+
+def _expand(nodes):
+    """Durations, states and label indices of a tree of steps and loops."""
+    parts = []
+    for node in nodes:
+        if hasattr(node, "body"):
+            parts.append(tuple(np.tile(a, node.count)
+                               for a in _expand(node.body)))
+        else:
+            parts.append(([node.duration], [node.state], [node.index]))
+    if not parts:
+        return np.zeros(0), np.zeros(0, np.uint8), np.zeros(0, int)
+    return (np.concatenate([p[0] for p in parts]).astype(float),
+            np.concatenate([p[1] for p in parts]).astype(np.uint8),
+            np.concatenate([p[2] for p in parts]).astype(int))
+
+
+def from_tree(nodes, labels=None):
+    """
+    Build the timeline of a tree of steps (index, duration, state) and loops
+    (count, body), as compiled from a recipe file.
+
+    The loops are expanded with np.tile, without Python loop over their
+    iterations. The cycles are the iterations of the first top-level loop;
+    steps before it belong to the first cycle and steps after it to the last.
+    """
+    durations, states, indices, cycles = [], [], [], []
+    cycle, main = 0, True
+    for node in nodes:
+        d, s, i = _expand([node])
+        if main and hasattr(node, "body"):
+            per = len(d) // node.count if node.count else 0
+            cycles.append(np.repeat(np.arange(node.count), per))
+            cycle, main = max(node.count - 1, 0), False
+        else:
+            cycles.append(np.full(len(d), cycle))
+        durations.append(d)
+        states.append(s)
+        indices.append(i)
+    duration = np.concatenate(durations)
+    start = np.concatenate(([0.], np.cumsum(duration)[:-1]))[:len(duration)]
+    return Timeline(start=start, duration=duration,
+                    state=np.concatenate(states), label=np.concatenate(indices),
+                    cycle=np.concatenate(cycles), labels=list(labels or []))
+
+
+def gantt(timeline, names=None, detail=3):
+    """
+    Gantt chart of a timeline, with the repeated cycles collapsed.
+
+    The first `detail` cycles and the last one are drawn in full; the cycles
+    in between are drawn as a single cycle-long band per actuator.
+
+    :param names: dict actuator -> name displayed (e.g. the gas name)
+    :return: zoomable altair chart
+    """
+    import altair as alt
+    import pandas as pd
+
+    names = names or {}
+    cycles = timeline.cycles
+    collapse = cycles > detail + 2
+    if collapse:
+        # Detail until t_a, collapsed cycles until t_b, last cycle after
+        first = np.searchsorted(timeline.cycle, [detail, cycles - 1])
+        t_a, t_b = (float(t) for t in timeline.start[first])
+        period = (t_b - t_a) / (cycles - 1 - detail)
+        shift = t_b - t_a - period
+    rows = []
+    for actuator in ACTUATORS:
+        starts, ends, _ = timeline.intervals(actuator)
+        if not len(starts):
+            continue
+        name = names.get(actuator, actuator)
+        if not collapse:
+            segments = [(starts, ends, 0.)]
+        else:
+            segments = [(np.minimum(starts, t_a), np.minimum(ends, t_a), 0.),
+                         (np.maximum(starts, t_b), np.maximum(ends, t_b), shift)]
+            if np.any((starts < t_b) & (ends > t_a)):
+                rows.append({"actuator": name, "start": t_a,
+                             "end": t_a + period,
+                             "cycles": f"× {cycles - detail - 1} cycles"})
+        for seg_starts, seg_ends, seg_shift in segments:
+            keep = seg_ends > seg_starts
+            for start, end in zip(seg_starts[keep], seg_ends[keep]):
+                rows.append({"actuator": name, "start": start - seg_shift,
+                             "end": end - seg_shift, "cycles": "detail"})
+    data = pd.DataFrame(rows, columns=["actuator", "start", "end", "cycles"])
+    title = "Time (s)" + (", repeated cycles collapsed" if collapse else "")
+    return alt.Chart(data).mark_bar().encode(
+        x=alt.X("start:Q", title=title),
+        x2="end:Q",
+        y=alt.Y("actuator:N", title=None, sort=None),
+        color=alt.Color("cycles:N", legend=alt.Legend(title=None)),
+        tooltip=["actuator", "start", "end", "cycles"],
+    ).interactive(bind_y=False)
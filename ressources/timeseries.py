@@ -0,0 +1,148 @@
+"""Time-series buffer with min/max downsampling for long-run telemetry."""
+
+import math
+import threading
+
+
+class TimeSeries:
+    """
+    Telemetry of a run, aggregated in time buckets holding the min and max
+    of each channel.
+
+    There are never more than 2*width buckets: when this is reached, the
+    buckets are merged by pairs and their duration doubles. The memory used
+    and the number of points sent to a chart are therefore bounded whatever
+    the duration of the run.
+    """
+
+    def __init__(self, channels, width=600, resolution=1.0):
+        """
+        :param channels: names of the channels
+        :param width: number of buckets to keep, e.g. the chart width in pixels
+        :param resolution: initial duration of a bucket, in s
+        """
+        self.channels = list(channels)
+        self.width = width
+        self.resolution = resolution
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self, t0=None):
+        """
+        Forget all the samples.
+
+        :param t0: time origin of the series, the first sample if None
+        """
+        with self._lock:
+            self.t0 = t0
+            self.dt = self.resolution
+            self._buckets = []  # Completed buckets: (index, {channel: agg})
+            self._current = None
+            self.generation += 1
+
+    def append(self, t, values):
+        """
+        Add a sample.
+
+        :param t: time of the sample (e.g. time.time())
+        :param values: dict channel -> value, channels may be missing
+        """
+        with self._lock:
+            if self.t0 is None:
+                self.t0 = t
+            index = int((t - self.t0) // self.dt)
+            if self._current is None or self._current[0] != index:
+                self._close()
+                # The buckets may have been merged: dt doubled
+                index = int((t - self.t0) // self.dt)
+                if self._buckets and self._buckets[-1][0] == index:
+                    # Merged with the last one, reopened (the merge reset
+                    # the cursors of the consumers)
+                    self._current = self._buckets.pop()
+                else:
+                    self._current = (index, {})
+            aggregates = self._current[1]
+            for channel, value in values.items():
+                if value is None or value != value:  # None or NaN
+                    continue
+                agg = aggregates.get(channel)
+                if agg is None:
+                    aggregates[channel] = [value, t, value, t]
+                else:
+                    if value < agg[0]:
+                        agg[0], agg[1] = value, t
+                    if value > agg[2]:
+                        agg[2], agg[3] = value, t
+
+    def _close(self):
+        """Move the current bucket to the completed ones."""
+        if self._current is None:
+            return
+        self._buckets.append(self._current)
+        self._current = None
+        if len(self._buckets) >= 2 * self.width:
+            self._merge()
+
+    def _merge(self):
+        """Merge the buckets by pairs."""
+        merged = []
+        for index, aggregates in self._buckets:
+            index //= 2
+            if merged and merged[-1][0] == index:
+                into = merged[-1][1]
+                for channel, agg in aggregates.items():
+                    other = into.get(channel)
+                    if other is None:
+                        into[channel] = agg
+                        continue
+                    if agg[0] < other[0]:
+                        other[0], other[1] = agg[0], agg[1]
+                    if agg[2] > other[2]:
+                        other[2], other[3] = agg[2], agg[3]
+            else:
+                merged.append((index, dict(aggregates)))
+        self._buckets = merged
+        self.dt *= 2
+        self.generation += 1
+
+    def _rows(self, buckets, channels):
+        """
+        Two rows per bucket, at its start and middle, holding for each
+        channel its min and max in the order they occurred.
+        """
+        rows = []
+        for index, aggregates in buckets:
+            start = index * self.dt
+            first, second = {}, {}
+            for channel in channels:
+                agg = aggregates.get(channel)
+                if agg is None:
+                    first[channel] = second[channel] = math.nan
+                elif agg[1] <= agg[3]:
+                    first[channel], second[channel] = agg[0], agg[2]
+                else:
+                    first[channel], second[channel] = agg[2], agg[0]
+            rows.append((start, first))
+            rows.append((start + self.dt / 2, second))
+        return rows
+
+    def since(self, cursor, channels=None):
+        """
+        Return the completed buckets not seen yet by a consumer.
+
+        :param cursor: cursor returned by the previous call, None at first
+        :param channels: channels to return, all of them if None
+        :return: tuple (reset, rows, cursor); when reset is True, the
+        buckets have been merged or cleared since the previous call and rows
+        hold the whole history to display instead of the new rows only.
+        Rows are (time from t0 in s, {channel: value}).
+        """
+        channels = self.channels if channels is None else channels
+        with self._lock:
+            generation, seen = cursor if cursor is not None else (None, 0)
+            reset = generation != self.generation
+            if reset:
+                seen = 0
+            rows = self._rows(self._buckets[seen:], channels)
+            return reset, rows, (self.generation, len(self._buckets))
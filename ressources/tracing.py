@@ -0,0 +1,176 @@
+"""
+Timeline of the runs in the Chrome trace event format (chrome://tracing,
+https://ui.perfetto.dev).
+
+During a run, the spans of the steps, cycles and device calls are recorded
+as fixed-size binary records in a .trace file next to the log of the run,
+with the names of its tracks and spans in a .trace.json file. The export
+streams the records by chunks, so that it works for runs of any length:
+
+    python -m ressources.tracing Logs/2022-01-01-10:00:00_ALD.trace \
+        [--cycles 10-20] [-o trace.json]
+"""
+
+import argparse
+import json
+import sys
+import threading
+from collections import deque
+from time import perf_counter, time
+
+import numpy as np
+
+# Span of a track: start and end (perf_counter() s), track, name and cycle
+RECORD = np.dtype([("start", "<f8"), ("end", "<f8"), ("track", "<u2"),
+                   ("name", "<u2"), ("cycle", "<i4")])
+
+# Records written to the file at once
+CHUNK = 4096
+
+# Size of the table of the track and span names (ids are <u2), the last one
+# standing for all the names recorded once it is full
+MAX_NAMES = 65536
+OTHER = "(other)"
+
+
+class TraceRecorder:
+    """
+    Recorder of the spans of a run. Any thread can record: the spans are
+    queued without lock, and written by chunks by the thread recording the
+    last span of a chunk.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: .trace file of the run, its names go to path + ".json"
+        """
+        self.path = path
+        self.cycle = 0  # Cycle of the spans recorded from now on
+        self._file = open(path, "wb")
+        self._spans = deque()
+        self._names = {}
+        self._saved = -1  # Names in the .trace.json file
+        self._lock = threading.Lock()  # Writes to the files only
+        # Clocks of the start of the run, to convert the spans to wall time
+        self._origin = (time(), perf_counter())
+
+    def _id(self, name):
+        try:
+            return self._names[name]
+        except KeyError:
+            with self._lock:
+                if len(self._names) >= MAX_NAMES - 1:
+                    name = OTHER
+                return self._names.setdefault(name, len(self._names))
+
+    def record(self, track, name, start, end=None):
+        """
+        Record a span of a track.
+
+        :param start: perf_counter() at its start
+        :param end: perf_counter() at its end, now if None
+        """
+        self._spans.append((start, perf_counter() if end is None else end,
+                            self._id(track), self._id(name), self.cycle))
+        if len(self._spans) >= CHUNK:
+            self.flush()
+
+    def flush(self):
+        """Write the recorded spans to the files"""
+        with self._lock:
+            if self._file is None:
+                return
+            spans = [self._spans.popleft()
+                     for _ in range(len(self._spans))]
+            if spans:
+                self._file.write(np.array(spans, dtype=RECORD).tobytes())
+                self._file.flush()
+            # The names only change with new tracks, labels or devices
+            if len(self._names) != self._saved:
+                with open(self.path + ".json", "w") as names:
+                    json.dump({"origin": self._origin[0] - self._origin[1],
+                               "names": sorted(self._names,
+                                               key=self._names.get)},
+                              names)
+                self._saved = len(self._names)
+
+    def close(self):
+        """Write the last spans and close the files"""
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def export(path, out, cycles=None, chunk=65536):
+    """
+    Write the recorded spans of a run as a Chrome trace, one thread per
+    track, streaming the records by chunks.
+
+    :param path: .trace file of the run
+    :param out: text file object where the JSON trace is written
+    :param cycles: (first, last) cycles to export, all the run if None
+    :param chunk: number of records read at once
+    """
+    with open(path + ".json") as file:
+        header = json.load(file)
+    names, origin = header["names"], header["origin"]
+    out.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+    tracks, first = {}, True
+    with open(path, "rb") as file:
+        while True:
+            data = file.read(chunk * RECORD.itemsize)
+            records = np.frombuffer(data[:len(data) - len(data) % RECORD.itemsize],
+                                    dtype=RECORD)
+            if not len(records):
+                break
+            if cycles is not None:
+                records = records[(records["cycle"] >= cycles[0]) &
+                                  (records["cycle"] <= cycles[1])]
+            events = []
+            for track in np.unique(records["track"]).tolist():
+                if track not in tracks:
+                    tracks[track] = len(tracks) + 1
+                    events.append(json.dumps(
+                        {"name": "thread_name", "ph": "M", "pid": 1,
+                         "tid": tracks[track],
+                         "args": {"name": names[track]}}))
+            start = (records["start"] + origin) * 1e6
+            duration = (records["end"] - records["start"]) * 1e6
+            for record, ts, dur in zip(records.tolist(), start.tolist(),
+                                       duration.tolist()):
+                events.append(
+                    f'{{"name": {json.dumps(names[record[3]])}, "ph": "X", '
+                    f'"pid": 1, "tid": {tracks[record[2]]}, "ts": {ts:.3f}, '
+                    f'"dur": {dur:.3f}, "args": {{"cycle": {record[4]}}}}}')
+            if events:
+                out.write(("" if first else ",\n") + ",\n".join(events))
+                first = False
+    out.write("\n]}\n")
+
+
+def parse_cycles(text):
+    """Cycle range from "first-last" (or a single cycle), None if empty"""
+    if not text:
+        return None
+    first, _, last = text.partition("-")
+    try:
+        return int(first), int(last or first)
+    except ValueError:
+        raise ValueError(f"Cycles are given as first-last ({text}).") from None
+
+
+if __name__ == '__main__':  # running sample
+    parser = argparse.ArgumentParser(description="Export a run as a Chrome "
+                                     "trace")
+    parser.add_argument("trace", help=".trace file next to the log of the run")
+    parser.add_argument("--cycles", help="range of cycles, e.g. 10-20")
+    parser.add_argument("-o", "--output", help="JSON file, stdout if omitted")
+    args = parser.parse_args()
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        export(args.trace, out, parse_cycles(args.cycles))
+    finally:
+        if args.output:
+            out.close()
@@ -1,7 +1,8 @@
-from ressources.setup import *
+from ressources.control import *
 
-turn_ON(Carrier)
-citoctrl.open()
+ald = get()
+ald.turn_ON(Carrier)
+ald.citoctrl.open()
 cito_address = "/dev/ttyUSB0"
 citoctrl = cb.CitoBase(host_mode=1, host_addr=cito_address)
 
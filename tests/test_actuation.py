@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ressources.actuation import actuate, on_bus, skew_summary
+
+
+def _device(bus, sent, delay=0.):
+    """Action on a bus, recording its argument and its thread"""
+    @on_bus(bus)
+    def send(value):
+        time.sleep(delay)
+        sent.append((value, threading.current_thread().name))
+    return send
+
+
+@pytest.fixture
+def pool():
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="actuation-A")
+    yield pool
+    pool.shutdown()
+
+
+def test_buses_are_sent_concurrently(pool):
+    sent, record = [], deque()
+    relay, rf = _device("i2c", sent, 0.1), _device("rf", sent, 0.1)
+    started = time.perf_counter()
+    skew = actuate((relay, 1), (rf, 2), pool=pool, record=record)
+    assert time.perf_counter() - started < 0.18
+    assert skew == pytest.approx(0.1, abs=0.07)
+    assert list(record) == [skew]
+    # The first bus is sent from the calling thread, the other by the pool
+    assert sorted(sent) == [(1, threading.current_thread().name),
+                            (2, "actuation-A_0")]
+
+
+def test_buses_are_sent_in_turn_without_pool():
+    sent = []
+    skew = actuate((_device("i2c", sent, 0.05), 1),
+                   (_device("rf", sent, 0.05), 2), record=deque())
+    assert skew >= 0.1
+    assert [thread for _, thread in sent] == \
+           [threading.current_thread().name] * 2
+
+
+def test_actions_on_a_bus_keep_their_order(pool):
+    sent = []
+    relay, rf = _device("i2c", sent, 0.01), _device("rf", sent)
+    actuate((relay, 1), (rf, "on"), (relay, 2), None, (relay, 3), pool=pool,
+            record=deque())
+    assert [value for value, _ in sent if value != "on"] == [1, 2, 3]
+
+
+def test_errors_are_raised(pool):
+    @on_bus("rf")
+    def fail():
+        raise OSError("no answer")
+
+    with pytest.raises(OSError, match="no answer"):
+        actuate((_device("i2c", []), 1), (fail,), pool=pool, record=deque())
+
+
+def test_skew_summary():
+    record = deque()
+    assert actuate(None, record=record) == 0.
+    assert skew_summary(record=record) == {"transitions": 0, "mean_skew": 0.,
+                                           "max_skew": 0.}
+    record.extend([0.001, 0.003])
+    assert skew_summary(reset=False, record=record) == \
+           {"transitions": 2, "mean_skew": 2., "max_skew": 3.}
+    assert skew_summary(record=record)["transitions"] == 2
+    assert not record
+
+
+def test_concurrent_transitions():
+    # Transitions of several reactors at once, each with its own pool and
+    # record: a reactor never waits on the transitions of the others
+    reactors = [(ThreadPoolExecutor(max_workers=1), deque())
+                for _ in range(6)]
+
+    def run(pool, record):
+        sent = []
+        for i in range(5):
+            actuate((_device("i2c", sent, 0.02), i),
+                    (_device("rf", sent, 0.02), i), pool=pool, record=record)
+
+    threads = [threading.Thread(target=run, args=reactor)
+               for reactor in reactors]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.perf_counter() - started < 0.18
+    for pool, record in reactors:
+        pool.shutdown()
+        summary = skew_summary(record=record)
+        assert summary["transitions"] == 5
+        assert summary["max_skew"] < 35
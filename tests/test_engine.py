@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from ressources.engine import DryRun, changes, drive, dry_run
+from ressources.recipes import available, compile_recipe
+from ressources.timeline import bits
+
+
+def test_changes_close_first():
+    before, after = bits(["Prec1", "Carrier"]), bits(["Prec2", "Carrier"])
+    assert changes(before, after) == ((0, "Prec1"), (1, "Prec2"))
+    assert changes(after, after) == ()
+
+
+def _driven(recipe, overhead=0.):
+    """Full drive of a recipe, every iteration of its main loop run"""
+    backend = DryRun(recipe, overhead)
+    assert drive(recipe, backend)
+    return backend
+
+
+def _assert_same(recipe, overhead=0.):
+    trace, full = dry_run(recipe, overhead), _driven(recipe, overhead)
+    assert len(trace.actions) == len(full.actions)
+    if full.actions:
+        t, actuators, on = zip(*full.actions)
+        np.testing.assert_allclose(trace.actions["t"], t, atol=1e-9)
+        assert list(trace.actions["actuator"]) == list(actuators)
+        assert list(trace.actions["on"]) == list(on)
+    assert len(trace.steps) == len(full.steps)
+    if full.steps:
+        labels, starts, durations = zip(*full.steps)
+        assert list(trace.steps["label"]) == list(labels)
+        np.testing.assert_allclose(trace.steps["start"], starts, atol=1e-9)
+        np.testing.assert_allclose(trace.steps["duration"], durations)
+    assert trace.duration == pytest.approx(full.t)
+    assert trace.state == {name: bool(full.state & bits([name]))
+                           for name in trace.state}
+    assert trace.power == full.power
+
+
+@pytest.mark.parametrize("name", available())
+def test_dry_run_defaults(name):
+    recipe = compile_recipe(name)
+    if recipe.cycles > 20:
+        recipe = recipe.with_cycles(20)
+    _assert_same(recipe)
+
+
+@pytest.mark.parametrize("cycles", [1, 2, 3, 4, 5, 11])
+@pytest.mark.parametrize("name", ["ALD", "PEALD", "PulsedCVD", "PulsedPECVD",
+                                  "Supercycle"])
+def test_dry_run_cycles(name, cycles):
+    _assert_same(compile_recipe(name, N=cycles), overhead=0.003)
+
+
+@pytest.mark.parametrize("name, params", [
+    # Main loop without any step
+    ("Supercycle", {"M1": 0, "M2": 0, "N": 10}),
+    ("Supercycle", {"M1": 0, "M2": 0, "N": 1}),
+    ("ALD", {"N2": 0, "N": 6}),
+    # One of the inner loops empty
+    ("Supercycle", {"M1": 0, "M2": 2, "N": 6}),
+    ("Supercycle", {"M1": 4, "M2": 0, "N": 6}),
+    # Steps of zero duration
+    ("ALD", {"t1": 0, "p1": 0, "N": 8}),
+    ("PEALD", {"t2": 0, "p2": 0, "cutCarrier": False, "N": 8}),
+    ("PulsedPECVD", {"wait": 0, "N2": 3, "N": 7}),
+])
+def test_dry_run_edge_cases(name, params):
+    _assert_same(compile_recipe(name, **params))
+    _assert_same(compile_recipe(name, **params), overhead=0.01)
+
+
+def test_dry_run_many_cycles():
+    recipe = compile_recipe("ALD", N=100000)
+    trace = dry_run(recipe)
+    assert len(trace.steps) == recipe.steps
+    assert trace.duration == pytest.approx(recipe.total)
+    assert trace.steps["start"][-1] == pytest.approx(
+        recipe.total - trace.steps["duration"][-1])
+
+
+def test_drive_stops():
+    class Stopping(DryRun):
+        def wait(self, step, position):
+            super().wait(step, position)
+            return len(self.steps) < 3
+
+    recipe = compile_recipe("ALD", N=5)
+    backend = Stopping(recipe)
+    assert not drive(recipe, backend)
+    assert len(backend.steps) == 3
+    # Ended in the start state, without plasma
+    assert backend.state == recipe.start_state & ~bits(["RF"])
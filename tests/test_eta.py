@@ -0,0 +1,112 @@
+import os
+from datetime import timedelta
+
+import pytest
+
+from ressources.eta import (OverheadModel, OverheadModels, RemainingTime,
+                            parse_duration, read_runs)
+from ressources.engine import Backend, drive
+from ressources.recipes import compile_recipe
+
+
+@pytest.mark.parametrize("seconds", [0, 1.5, 59, 3600, 86399.25, 90061,
+                                     3 * 86400 + 7])
+def test_parse_duration(seconds):
+    assert parse_duration(str(timedelta(seconds=seconds))) == seconds
+
+
+def test_parse_duration_errors():
+    with pytest.raises(ValueError):
+        parse_duration("10 s")
+
+
+def _log(folder, name, recipe="ALD", ending="normal", planned=100.,
+         steps=20, cycles=10, duration=None, features=True):
+    duration = planned + 0.01 * steps + 0.5 * cycles + 2. \
+        if duration is None else duration
+    lines = [f"recipe {recipe}"]
+    if features:
+        lines += [f"planned {planned}", f"n_steps {steps}",
+                  f"n_cycles {cycles}"]
+    lines += [f"ending {ending}", f"duration {timedelta(seconds=duration)}"]
+    with open(os.path.join(folder, name), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def test_read_runs(tmp_path):
+    _log(tmp_path, "1.txt")
+    _log(tmp_path, "2.txt", ending="forced")
+    _log(tmp_path, "3.txt", features=False)
+    _log(tmp_path, "4.trace", recipe="CVD")
+    assert read_runs(str(tmp_path)) == [("ALD", 100., 20., 10., 107.2)]
+    assert read_runs(str(tmp_path / "none")) == []
+
+
+def test_fit_recovers_the_overheads():
+    runs = [(planned, steps, cycles,
+             planned + 0.01 * steps + 0.5 * cycles + 2.)
+            for planned, steps, cycles in [(100, 20, 10), (50, 400, 200),
+                                           (1000, 30, 1), (10, 2000, 1000),
+                                           (300, 60, 30)]]
+    model = OverheadModel.fit(runs)
+    assert (model.per_step, model.per_cycle, model.per_run) == pytest.approx(
+        (0.01, 0.5, 2.))
+    assert model.runs == 5
+    assert model.predict(10., 100, 10) == pytest.approx(18.)
+
+
+def test_fit_without_runs():
+    model = OverheadModel.fit([])
+    assert model.predict(10., 100, 10) == 10.
+
+
+def test_models_per_recipe(tmp_path):
+    models = OverheadModels(str(tmp_path), min_runs=2)
+    recipe = compile_recipe("ALD", N=10)
+    assert models.expected(recipe) == pytest.approx(recipe.total)
+    for i, (steps, cycles) in enumerate([(20, 10), (400, 200), (30, 1)]):
+        _log(tmp_path, f"{i}.txt", steps=steps, cycles=cycles)
+    _log(tmp_path, "other.txt", recipe="CVD", duration=500.)
+    # Read again once logs are added
+    assert models.get("ALD").runs == 3
+    assert models.get("CVD").runs == 4  # Not enough runs: all of them
+    assert models.expected(recipe) > recipe.total
+
+
+def test_remaining_time():
+    remaining = RemainingTime(planned=10., steps=4, per_step=0.5, alpha=0.5)
+    assert remaining.remaining == 12.
+    remaining.step_done(2.5, 3.5)  # 1 s of overhead
+    assert remaining.overhead == 0.75
+    assert remaining.remaining == pytest.approx(7.5 + 3 * 0.75)
+    for _ in range(3):
+        remaining.step_done(2.5, 2.5)
+    assert remaining.remaining == pytest.approx(0.)
+
+
+def test_eta_does_not_jump():
+    model = OverheadModel(per_step=0.01, per_cycle=0.5, per_run=2.)
+    recipe = compile_recipe("ALD", N=10)
+    remaining = RemainingTime.of(model, recipe)
+    # First ETA of the run, from the model
+    expected = model.predict(recipe.total, recipe.steps, recipe.cycles)
+    assert remaining.remaining == pytest.approx(expected)
+    etas = []
+
+    class Predicted(Backend):
+        """Steps and cycles lasting as the model predicts"""
+        t = 0.
+
+        def step_done(self, step, elapsed):
+            self.t += step.duration + model.per_step
+            remaining.step_done(step.duration, step.duration + model.per_step)
+            etas.append(self.t + remaining.remaining)
+
+        def cycle_done(self, iteration, count):
+            self.t += model.per_cycle
+            remaining.cycle_done()
+            etas.append(self.t + remaining.remaining)
+
+    drive(recipe, Predicted())
+    assert etas == pytest.approx([expected] * (recipe.steps + recipe.cycles))
+    assert remaining.remaining == pytest.approx(model.per_run)
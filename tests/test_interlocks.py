@@ -0,0 +1,177 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from ressources.interlocks import (_Cycles, bounded, exclusive, max_rf, purge,
+                                   rf_gases, rules, verify)
+from ressources.recipes import CompiledRecipe, available, compile_recipe, parse
+from ressources.timeline import bits
+
+ACTUATORS = ["Prec1", "Prec2", "Prec3", "Carrier", "RF"]
+
+
+def full(recipe, names=None):
+    """verify(), evaluated on the whole timeline of the recipe"""
+    names, checked = names or {}, rules(recipe)
+    cycles = _Cycles(bounded(recipe), 1)
+    pairs = checked["exclusive"]
+    return (exclusive(cycles, pairs, names) +
+            purge(cycles, pairs, checked["min_purge"], names) +
+            rf_gases(cycles, checked["rf_gases"], names) +
+            max_rf(cycles, checked["max_rf"]))
+
+
+def naive(recipe):
+    """Broken rules, walking the steps of the recipe one by one"""
+    checked, broken = rules(recipe), set()
+    steps = [(max(recipe.wait, 0), recipe.start_state)]
+    steps += [(step.duration, step.state) for step, _ in recipe.iter_steps()]
+    steps.append((0., recipe.start_state & ~bits(["RF"])))
+    on = [{name for name in ACTUATORS if state & bits([name])}
+          for _, state in steps]
+    for a, b in checked["exclusive"]:
+        if any(a in names and b in names for names in on):
+            broken.add(("exclusive", a, b))
+            continue  # The purges of the pair are not checked
+        # Pulses (first step, step after) of both, ordered by their start
+        pulses = sorted(_pulses(on, a, 0) + _pulses(on, b, 1))
+        for (first, after, owner), (following, _, other) in zip(pulses,
+                                                                pulses[1:]):
+            gap = sum(duration for duration, _ in steps[after:following])
+            if (owner != other and after <= following and
+                    gap < checked["min_purge"] - 1e-6):
+                broken.add(("purge", a, b))
+    if any("RF" in names and not names & set(checked["rf_gases"])
+           for names in on):
+        broken.add(("rf_gases",))
+    length = 0.
+    for (duration, _), names in zip(steps, on):
+        length = length + duration if "RF" in names else 0.
+        if length > checked["max_rf"] + 1e-6:
+            broken.add(("max_rf",))
+    return broken
+
+
+def _pulses(on, actuator, owner):
+    pulses, first = [], None
+    for index, names in enumerate(on + [set()]):
+        if actuator in names and first is None:
+            first = index
+        elif actuator not in names and first is not None:
+            pulses.append((first, index, owner))
+            first = None
+    return pulses
+
+
+def _kinds(messages):
+    """Broken rules in the messages of verify(), as returned by naive()"""
+    kinds = set()
+    for message in messages:
+        words = message.split()
+        if "together" in words:
+            kinds.add(("exclusive", words[0], words[2]))
+        elif "purged" in words:
+            kinds.add(("purge", words[0], words[2]))
+        elif "without" in words:
+            kinds.add(("rf_gases",))
+        elif "row" in words:
+            kinds.add(("max_rf",))
+    return kinds
+
+
+def _random_recipe(rng):
+    """Recipe with a random main loop, steps around it and interlocks"""
+    def steps(count):
+        return [{"label": f"s{rng.random():.6f}",
+                 "duration": rng.choice([0, 0.125, 0.5, 1, 1.5, 3, 40]),
+                 "on": rng.sample(ACTUATORS, rng.randint(0, 3))}
+                for _ in range(count)]
+
+    body = steps(rng.randint(0, 4))
+    if rng.random() < 0.4:
+        body.append({"repeat": rng.randint(0, 3), "sequence": steps(2)})
+    if not body:
+        body = steps(1)
+    spec = {"name": "random", "parameters": {"N": rng.choice([1, 2, 3, 4, 5,
+                                                             9, 1000])},
+            "start": {"on": rng.sample(ACTUATORS, rng.randint(0, 2)),
+                      "wait": rng.choice([-1, 0, 2])},
+            "interlocks": {"min_purge": rng.choice([0, 0.5, 1, 2]),
+                           "max_rf": rng.choice([2, 10, 100])},
+            "sequence": steps(rng.randint(0, 2)) +
+                        [{"repeat": "N", "sequence": body}] +
+                        steps(rng.randint(0, 2))}
+    if rng.random() < 0.3:
+        spec["interlocks"]["exclusive"] = []
+    content = json.dumps(spec)
+    return CompiledRecipe(parse(content), spec["parameters"])
+
+
+@pytest.mark.parametrize("name", available())
+def test_builtin_recipes_pass(name):
+    assert verify(compile_recipe(name)) == []
+
+
+@pytest.mark.parametrize("name", ["ALD", "PEALD", "PulsedPECVD", "Supercycle"])
+def test_verify_matches_the_full_timeline(name):
+    for params in ({"N": 20}, {"N": 20, "p1": 0.5}, {"N": 20, "p2": 0.2},
+                   {"N": 5, "t2": 700}, {"N": 2, "p1": 0}):
+        try:
+            recipe = compile_recipe(name, **params)
+        except ValueError:
+            continue
+        assert verify(recipe) == full(recipe)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_verify_random_recipes(seed):
+    rng = random.Random(seed)
+    for _ in range(25):
+        recipe = _random_recipe(rng)
+        messages = verify(recipe)
+        assert messages == full(recipe)
+        if recipe.cycles <= 9:
+            assert _kinds(messages) == naive(recipe)
+
+
+def test_empty_main_loop():
+    recipe = compile_recipe("Supercycle", M1=0, M2=0)
+    assert verify(recipe) == full(recipe) == []
+
+
+def test_limits_are_inclusive():
+    # A purge of exactly min_purge is enough, despite the rounding of the
+    # step times
+    recipe = compile_recipe("ALD", N=7, t1=0.05, p1=1, t2=0.05, p2=1)
+    assert verify(recipe) == []
+    recipe = compile_recipe("ALD", N=7, t1=0.05, p1=0.99, t2=0.05, p2=1)
+    assert "purged 0.99 s" in verify(recipe)[0]
+
+
+def test_messages():
+    recipe = compile_recipe("ALD", N=1000, p2=0.5)
+    [message] = verify(recipe, {"Prec1": "TEB", "Prec2": "H2"})
+    assert message.startswith("TEB and H2 are purged 0.5 s (< 1 s)")
+    assert message.endswith("999 times")
+    [message] = verify(compile_recipe("PECVD", t1=700))
+    assert message.startswith("RF on for 700 s in a row (> 600 s)")
+
+
+def test_recipes_relax_the_interlocks():
+    # The CVD recipes co-flow their precursors
+    assert rules(compile_recipe("CVD"))["exclusive"] == []
+    # The plasma cleaning lasts longer than the deposition plasmas
+    assert verify(compile_recipe("PlasmaClean", t2=1800)) == []
+    assert verify(compile_recipe("PlasmaClean", t2=10000))
+    assert verify(compile_recipe("PECVD", t1=1800))
+
+
+def test_timeline_bounds():
+    recipe = compile_recipe("PEALD", N=2)
+    timeline = bounded(recipe)
+    assert len(timeline) == recipe.steps + 2
+    assert timeline.state[0] == recipe.start_state
+    assert not timeline.on("RF")[-1]
+    np.testing.assert_allclose(timeline.start[1:-1], recipe.timeline().start)
@@ -0,0 +1,88 @@
+import pytest
+
+pytest.importorskip("streamlit")
+
+from ressources import livestatus  # noqa: E402
+
+
+class Clock:
+    """time module of livestatus, sleeping without waiting"""
+
+    def __init__(self):
+        self.now = 1000.
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.now += duration
+
+
+class Placeholder:
+    """Values sent to the browser, with their time"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.sent = []
+
+    def markdown(self, text):
+        self.sent.append((self.clock.now, text))
+
+    write = markdown
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(livestatus, "time", clock)
+    return clock
+
+
+def test_unchanged_values_are_not_sent(clock):
+    status, placeholder = livestatus.LiveStatus(), Placeholder(clock)
+    field = status.field(placeholder)
+    field.markdown("cycle 1")
+    clock.now += 1.
+    field.markdown("cycle 1")
+    assert placeholder.sent == [(1000., "cycle 1")]
+    assert field.due() is None
+
+
+def test_rate_limit(clock):
+    status = livestatus.LiveStatus(min_interval=0.5)
+    placeholder = Placeholder(clock)
+    field = status.field(placeholder)
+    for i in range(8):
+        field.markdown(f"step {i}")
+        clock.now += 0.125
+    # Every 0.5 s at most, the latest value of the interval
+    assert placeholder.sent == [(1000., "step 0"), (1000.5, "step 4")]
+    assert field.due() == 1001.
+    status.flush()
+    assert placeholder.sent[-1] == (1001., "step 7")
+    assert field.due() is None
+
+
+def test_back_to_the_sent_value(clock):
+    status, placeholder = livestatus.LiveStatus(), Placeholder(clock)
+    field = status.field(placeholder)
+    field.write("a")
+    field.write("b")
+    field.write("a")
+    status.flush()
+    assert placeholder.sent == [(1000., "a")]
+
+
+def test_updates_are_sent_while_waiting(clock):
+    status = livestatus.LiveStatus(min_interval=0.5)
+    placeholder = Placeholder(clock)
+    field = status.field(placeholder)
+    ticks = []
+    status.add_ticker(1., lambda: ticks.append(clock.now))
+    field.markdown("a")
+    field.markdown("b")
+    status.wait(2.)
+    # The tickers do not send the fields before their time
+    assert placeholder.sent == [(1000., "a"), (1000.5, "b")]
+    assert ticks == [1000., 1001.]
+    assert (clock.now, status.position) == (1002., 2.)
@@ -0,0 +1,101 @@
+import re
+import threading
+import uuid
+
+import pytest
+
+from ressources.metrics import counter, exposition, gauge, histogram
+
+# Sample line of the text format: name, optional labels, value
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*'
+                    r'(\{[a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*"'
+                    r'(,[a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*")*\})? '
+                    r'(\+Inf|-Inf|NaN|-?[0-9.e+-]+)$')
+
+
+@pytest.fixture
+def name():
+    """Name of a new metric family"""
+    return f"aldpi_test_{uuid.uuid4().hex[:8]}"
+
+
+def _family(name):
+    """Lines of the exposition of a family"""
+    return [line for line in exposition().splitlines()
+            if line.split(" ")[2 if line.startswith("#") else 0]
+            .startswith(name)]
+
+
+def test_counter(name):
+    total = counter(name, "Things done.", reactor="A")
+    assert counter(name, "Things done.", reactor="A") is total
+    total.inc()
+    total.inc(2)
+    assert _family(name) == [f"# HELP {name} Things done.",
+                             f"# TYPE {name} counter",
+                             f'{name}{{reactor="A"}} 3']
+
+
+def test_counts_of_ended_threads(name):
+    total = counter(name, "Things done.")
+
+    def work():
+        for _ in range(1000):
+            total.inc()
+
+    for _ in range(2):
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total.inc()
+    assert total.value() == 8002
+
+
+def test_histogram(name):
+    latency = histogram(name, "Latency.", buckets=(0.1, 1.), port="/dev/x")
+    for value in (0.05, 0.1, 0.5, 3.):
+        latency.observe(value)
+    assert _family(name)[2:] == [
+        f'{name}_bucket{{port="/dev/x",le="0.1"}} 2',
+        f'{name}_bucket{{port="/dev/x",le="1.0"}} 3',
+        f'{name}_bucket{{port="/dev/x",le="+Inf"}} 4',
+        f'{name}_sum{{port="/dev/x"}} 3.65',
+        f'{name}_count{{port="/dev/x"}} 4']
+
+
+def test_gauges(name):
+    value = [None]
+    gauge(name, "Level.", lambda: value[0], reactor="A")
+    # No sample without a value
+    assert _family(name) == [f"# HELP {name} Level.", f"# TYPE {name} gauge"]
+    value[0] = 2.5
+    assert _family(name)[2:] == [f'{name}{{reactor="A"}} 2.5']
+    gauge(name, "Level.", lambda: 7, reactor="A")
+    assert _family(name)[2:] == [f'{name}{{reactor="A"}} 7']
+    with pytest.raises(ValueError, match="is a gauge"):
+        counter(name, "Level.", reactor="B")
+
+
+def test_label_values_are_escaped(name):
+    counter(name, "Escaped.", recipe='a "b"\\c\nd').inc()
+    assert _family(name)[2:] == [f'{name}{{recipe="a \\"b\\"\\\\c\\nd"}} 1']
+
+
+def test_exposition_format(name):
+    counter(name, "Escaped.", recipe='x"\n').inc()
+    histogram(f"{name}_seconds", "Latency.").observe(0.2)
+    text = exposition()
+    assert text.endswith("\n")
+    helped = set()
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            helped.add(line.split(" ")[2])
+        elif line.startswith("# TYPE "):
+            _, _, family, kind = line.split(" ")
+            assert family in helped
+            assert kind in ("counter", "gauge", "histogram")
+        else:
+            assert SAMPLE.match(line), line
+    assert "process_resident_memory_bytes" in helped
@@ -0,0 +1,74 @@
+import math
+import os
+import select
+
+import pytest
+
+from ressources.mkssim import MKSSimulator
+
+
+def test_setpoints_range_and_correction():
+    sim = MKSSimulator(range_code=6, corr_factor=100)
+    assert sim.handle("FS 1 500") is None
+    assert sim.handle("FS 1 R") == "500"
+    assert sim.handle("RA 2 R") == "6"
+    sim.handle("RA 2 9")
+    sim.handle("GC 2 50")
+    assert (sim.handle("RA 2 R"), sim.handle("GC 2 R")) == ("9", "50")
+    assert sim.handle("FS 1 R") == "500"
+
+
+def test_invalid_commands():
+    sim = MKSSimulator(channels=4)
+    assert sim.handle("FS") is None
+    assert sim.handle("FS x R") is None
+    assert sim.handle("FS 9 R") is None
+    assert sim.handle("XX 1 R") is None
+
+
+def test_flow_needs_the_channel_and_the_main_valve():
+    sim = MKSSimulator(tau=0)
+    sim.handle("FS 1 400")
+    assert sim.handle("FL 1") == "0"
+    sim.handle("ON 1")
+    assert sim.handle("FL 1") == "0"
+    sim.handle("ON 0")
+    assert sim.handle("FL 1") == "400"
+    # 40 % of 100 SCCM
+    assert sim.flow_sccm(1) == pytest.approx(40.)
+    sim.handle("OF 0")
+    assert sim.handle("FL 1") == "0"
+
+
+def test_first_order_response():
+    sim = MKSSimulator(tau=1.)
+    sim.handle("FS 1 1000")
+    sim.handle("ON 1")
+    sim.handle("ON 0")
+    # One time constant later
+    sim.channels[1]["updated"] -= 1.
+    assert int(sim.handle("FL 1")) == pytest.approx(1000 * (1 - math.exp(-1)),
+                                                    abs=5)
+
+
+def _ask(fd, command):
+    """Answer of the simulator to a command sent on its pty"""
+    os.write(fd, f"{command}\r\n".encode())
+    answer = b""
+    while not answer.endswith(b"\r\n"):
+        ready, _, _ = select.select([fd], [], [], 2.)
+        assert ready, f"No answer to {command}"
+        answer += os.read(fd, 1024)
+    return answer.decode().strip()
+
+
+def test_pty():
+    with MKSSimulator(tau=0) as sim:
+        fd = os.open(sim.port, os.O_RDWR | os.O_NOCTTY)
+        try:
+            os.write(fd, b"FS 2 250\r\nON 2\r\nON 0\r\n")
+            assert _ask(fd, "FS 2 R") == "250"
+            assert _ask(fd, "FL 2") == "250"
+        finally:
+            os.close(fd)
+    assert sim.port is not None and sim._master is None
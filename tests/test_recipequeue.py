@@ -0,0 +1,95 @@
+import threading
+import time
+
+from ressources.recipequeue import (RecipeQueue, QueueRunner, PENDING,
+                                    RUNNING, DONE, CANCELLED, INTERRUPTED)
+
+
+def test_queue_survives_a_restart(tmp_path):
+    path = tmp_path / "queue.json"
+    queue = RecipeQueue(str(path))
+    first = queue.add("ALD", {"N": 10})
+    second = queue.add("CVD", {})
+    queue.mark(first, RUNNING, started=1.)
+    queue.set(paused=False, handoff=5.)
+
+    restarted = RecipeQueue(str(path))
+    assert [entry["id"] for entry in restarted.entries] == [first, second]
+    assert restarted.entries[0]["status"] == INTERRUPTED
+    assert restarted.entries[0]["params"] == {"N": 10}
+    assert restarted.handoff == 5.
+    # Nothing restarts unattended after an interrupted run
+    assert restarted.paused
+
+
+def test_move_and_cancel(tmp_path):
+    queue = RecipeQueue(str(tmp_path / "queue.json"))
+    ids = [queue.add(name, {}) for name in ("A", "B", "C")]
+    queue.move(ids[2], -5)
+    assert [entry["recipe"] for entry in queue.snapshot()] == ["C", "A", "B"]
+    assert queue.cancel(ids[0]) == PENDING
+    assert queue.next()["recipe"] == "C"
+    queue.move(ids[0], 1)  # Not pending anymore
+    assert [entry["recipe"] for entry in queue.snapshot()] == ["C", "A", "B"]
+
+
+def test_eta(tmp_path):
+    queue = RecipeQueue(str(tmp_path / "queue.json"), handoff=10.)
+    running = queue.add("A", {})
+    queue.add("B", {})
+    queue.mark(running, RUNNING, started=100.)
+    plan = queue.eta(lambda entry: 50., now=120.)
+    assert [(start, end) for _, start, end in plan] == [(100., 150.),
+                                                        (160., 210.)]
+
+
+def _runner(tmp_path, handoff):
+    queue = RecipeQueue(str(tmp_path / "queue.json"), handoff=handoff)
+    ran = []
+
+    def execute(entry, stop):
+        ran.append(entry["recipe"])
+        return True
+
+    runner = QueueRunner(queue, execute, lambda: None, threading.Lock())
+    return queue, runner, ran
+
+
+def _until(condition, timeout=5.):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_runner_runs_the_entries_in_order(tmp_path):
+    queue, runner, ran = _runner(tmp_path, handoff=0.)
+    for name in ("A", "B", "C"):
+        queue.add(name, {})
+    queue.set(paused=False)
+    runner.start()
+    runner.wake()
+    assert _until(lambda: len(ran) == 3)
+    assert ran == ["A", "B", "C"]
+    assert _until(lambda: all(entry["status"] == DONE
+                              for entry in queue.snapshot()))
+
+
+def test_pause_ends_the_handoff(tmp_path):
+    queue, runner, ran = _runner(tmp_path, handoff=60.)
+    queue.add("A", {})
+    second = queue.add("B", {})
+    queue.set(paused=False)
+    runner.start()
+    runner.wake()
+    assert _until(lambda: ran == ["A"])
+    runner.pause()
+    queue.cancel(second)
+    queue.add("C", {})
+    time.sleep(0.1)
+    # Resumed long before the end of the handoff: the runner waits for
+    # the next entry again, and runs it right away
+    queue.set(paused=False)
+    runner.wake()
+    assert _until(lambda: ran == ["A", "C"], timeout=3.)
+    assert queue.snapshot()[1]["status"] == CANCELLED
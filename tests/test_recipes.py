@@ -0,0 +1,122 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from ressources.recipes import RECIPES_DIR, available, compile_recipe, parse
+from ressources.timeline import bits
+
+
+def test_compile_is_cached():
+    assert compile_recipe("ALD", N=5) is compile_recipe("ALD", N=5)
+    assert compile_recipe("ALD", N=5) is not compile_recipe("ALD", N=6)
+
+
+def test_file_and_name():
+    recipe = compile_recipe("PulsedCVD")
+    assert recipe.file == "PulsedCVD"
+    assert recipe.name == "Pulsed CVD"
+    # The file name compiles the same recipe back, e.g. for a replay
+    assert compile_recipe(recipe.file, **recipe.params) is recipe
+
+
+def test_invalid_names():
+    with pytest.raises(ValueError, match="Unknown recipe"):
+        compile_recipe("Nothing")
+    with pytest.raises(ValueError, match="Unknown parameters"):
+        compile_recipe("ALD", M1=2)
+
+
+@pytest.mark.parametrize("params", [
+    {"N": [1, 2]}, {"t1": {"a": 1}}, {"N": "5"}, {"N": True},
+    {"cutCarrier": 1}, {"prec1": 2}, {"N": 2.7}, {"N": float("inf")},
+    {"N": float("nan")},
+])
+def test_invalid_values(params):
+    # Rejected as any other bad parameter (the daemon answers 400), before
+    # the cache lookup for the unhashable ones
+    with pytest.raises(ValueError, match="Invalid value|Non-integer repeat"):
+        compile_recipe("ALD", **params)
+
+
+def test_integer_values():
+    assert compile_recipe("ALD", N=3.0).cycles == 3
+    assert compile_recipe("ALD", t1=1, cutCarrier=True, prec1="TMA")
+
+
+@pytest.mark.parametrize("content, message", [
+    ("[]", "must be an object"),
+    ('{"name": "x", "parameters": {}}', "Missing recipe key"),
+    ('{"name": "x", "parameters": {}, "sequence": [], "other": 1}',
+     "Unknown recipe keys"),
+    ('{"name": "x", "parameters": {}, "sequence": []}', "non-empty list"),
+    ('{"name": "x", "parameters": {}, "sequence": '
+     '[{"label": "a", "duration": "t", "on": []}]}', "unknown parameter"),
+    ('{"name": "x", "parameters": {"t": 1}, "sequence": '
+     '[{"label": "a", "duration": "t", "on": ["Prec9"]}]}', "unknown actuator"),
+    ('{"name": "x", "parameters": {"t": true}, "sequence": '
+     '[{"label": "a", "duration": "t", "on": []}]}', "must be a number"),
+    ('{"name": "x", "parameters": {"t": 1}, "sequence": '
+     '[{"label": "{u}", "duration": "t", "on": []}]}', "Invalid label"),
+    ('{"name": "x", "parameters": {"t": 1}, "interlocks": {"max": 1}, '
+     '"sequence": [{"label": "a", "duration": "t", "on": []}]}',
+     "unknown rules"),
+])
+def test_parse_errors(content, message):
+    with pytest.raises(ValueError, match=message):
+        parse(content)
+
+
+@pytest.mark.parametrize("name", available())
+def test_structure_and_timeline(name):
+    recipe = compile_recipe(name)
+    if recipe.cycles > 7:
+        recipe = recipe.with_cycles(7)
+    steps = list(recipe.iter_steps())
+    timeline = recipe.timeline()
+    assert len(timeline) == recipe.steps == len(steps)
+    assert timeline.total == pytest.approx(recipe.total)
+    assert timeline.total == pytest.approx(sum(step.duration
+                                               for step, _ in steps))
+    assert list(timeline.state) == [step.state for step, _ in steps]
+    assert list(timeline.label) == [step.index for step, _ in steps]
+    np.testing.assert_allclose(timeline.start,
+                               np.cumsum([0.] + [step.duration
+                                                 for step, _ in steps])[:-1])
+
+
+@pytest.mark.parametrize("name", ["ALD", "PEALD", "Supercycle"])
+def test_dose(name):
+    recipe = compile_recipe(name, N=9)
+    timeline = recipe.timeline()
+    dose = recipe.dose()
+    state = np.concatenate(([recipe.start_state], timeline.state))
+    for actuator in ("Prec1", "Prec2", "Carrier", "RF"):
+        on = state & bits([actuator]) != 0
+        assert dose[actuator]["time"] == pytest.approx(
+            timeline.duration[on[1:]].sum())
+        assert dose[actuator]["pulses"] == np.count_nonzero(on[1:] & ~on[:-1])
+
+
+def test_with_cycles():
+    recipe = compile_recipe("PEALD", N=100)
+    short = recipe.with_cycles(3)
+    assert (short.cycles, recipe.cycles) == (3, 100)
+    assert short.total == pytest.approx(recipe.total * 3 / 100)
+    assert len(recipe.timeline()) == recipe.steps
+
+
+def test_conditional_actuators():
+    cut = compile_recipe("ALD", cutCarrier=True, N=1).timeline()
+    kept = compile_recipe("ALD", cutCarrier=False, N=1).timeline()
+    assert not np.all(cut.on("Carrier"))
+    assert np.all(kept.on("Carrier"))
+
+
+def test_recipe_files_are_valid():
+    for name in available():
+        path = os.path.join(RECIPES_DIR, f"{name}.json")
+        with open(path, encoding="utf-8") as f:
+            assert json.load(f)["parameters"]
+        compile_recipe(name)
@@ -0,0 +1,77 @@
+import threading
+from time import perf_counter
+from types import SimpleNamespace
+
+from ressources.recipes import compile_recipe
+from ressources.replay import CHUNK, DeviceRecorder, RecordingBus, load
+
+
+class Bus:
+    def write_byte_data(self, address, register, value):
+        pass
+
+
+class File:
+    """File of a recording, with the threads writing it"""
+
+    def __init__(self, file):
+        self.file = file
+        self.threads = set()
+
+    def write(self, text):
+        self.threads.add(threading.current_thread().name)
+        return self.file.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def _reactor():
+    """Reactor with its relays only"""
+    return SimpleNamespace(name="A", gases={"Prec1": "TMA"},
+                           relays={"TMA": [16, 1]}, mfc_channels={},
+                           bus=Bus(), citoctrl=None, mksctrl=None)
+
+
+def test_events_are_written_by_the_recorder(tmp_path):
+    path = tmp_path / "run.replay.jsonl"
+    reactor = _reactor()
+    recorder = DeviceRecorder(path, reactor, compile_recipe("ALD", N=2))
+    file = recorder._file = File(recorder._file)
+    assert isinstance(reactor.bus, RecordingBus)
+
+    def run():
+        for i in range(3 * CHUNK):
+            reactor.bus.write_byte_data(16, 1, i % 2)
+            recorder.record("transition", perf_counter(),
+                            changes=[[0, "Prec1"]], duration=0.)
+
+    thread = threading.Thread(target=run, name="executor")
+    thread.start()
+    thread.join()
+    recorder.close()
+    assert not isinstance(reactor.bus, RecordingBus)
+    assert "executor" not in file.threads
+    header, events = load(path)
+    assert (header["reactor"], header["file"]) == ("A", "ALD")
+    assert [event["value"] for event in events["i2c"]] == \
+           [i % 2 for i in range(3 * CHUNK)]
+    assert len(events["transition"]) == 3 * CHUNK
+    times = [event["t"] for event in events["i2c"]]
+    assert times == sorted(times)
+
+
+def test_events_are_written_meanwhile(tmp_path):
+    path = tmp_path / "run.replay.jsonl"
+    reactor = _reactor()
+    recorder = DeviceRecorder(path, reactor, compile_recipe("ALD", N=2))
+    for _ in range(CHUNK):
+        reactor.bus.write_byte_data(16, 1, 1)
+    # Written by the recorder before the end of the run
+    for _ in range(100):
+        text = path.read_text()
+        if text.count('"kind": "i2c"') == CHUNK and text.endswith("\n"):
+            break
+        threading.Event().wait(0.01)
+    assert len(load(path)[1]["i2c"]) == CHUNK
+    recorder.close()
@@ -0,0 +1,77 @@
+import sys
+import threading
+
+import pytest
+
+from ressources.runstate import RunState
+
+
+@pytest.fixture(autouse=True)
+def switch_often():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Interleave the publishers as much as possible
+    yield
+    sys.setswitchinterval(interval)
+
+
+def _concurrently(*targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_publishers_keep_their_fields():
+    run = RunState()
+    run.begin(recipe="ALD")
+    count = 5000
+
+    def publisher(field):
+        return lambda: [run.publish(**{field: i}) for i in range(count)]
+
+    _concurrently(*(publisher(field) for field in ("step", "cycle", "eta")))
+    state = run.snapshot()
+    assert (state["step"], state["cycle"], state["eta"]) == (count - 1,) * 3
+    assert state["running"] and state["recipe"] == "ALD"
+    assert run.version == 1 + 3 * count
+
+
+def test_end_is_never_lost():
+    for _ in range(20):
+        run = RunState()
+        run.begin()
+        started = threading.Event()
+
+        def executor():
+            for i in range(500):
+                run.publish(step=i)
+                started.set()
+
+        def stop():
+            started.wait()
+            run.end(ending="forced")
+
+        _concurrently(executor, stop)
+        state = run.snapshot()
+        assert not state["running"] and state["ended"]
+        assert state["ending"] == "forced" and state["step"] == 499
+
+
+def test_sinks_see_the_snapshots_in_order():
+    run, seen = RunState(), []
+    run.subscribe(lambda snapshot: seen.append((run.version, snapshot)))
+    _concurrently(*(lambda: [run.publish(step=i) for i in range(2000)]
+                    for _ in range(3)))
+    versions = [version for version, _ in seen]
+    assert versions == list(range(1, 6001))
+    assert seen[-1][1] is run.snapshot()
+
+
+def test_wait():
+    run = RunState()
+    version = run.version
+    assert run.wait(version, timeout=0.01) == (version, run.snapshot())
+    threading.Timer(0.01, run.begin, kwargs={"recipe": "CVD"}).start()
+    version, state = run.wait(version, timeout=5.)
+    assert version == 1 and state["recipe"] == "CVD"
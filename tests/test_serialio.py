@@ -0,0 +1,85 @@
+import threading
+import uuid
+
+import pytest
+
+from ressources.serialio import (SAFETY, SETPOINT, TELEMETRY, PortScheduler,
+                                 scheduler)
+
+
+@pytest.fixture
+def blocked():
+    """Scheduler of a new port, its worker blocked until the event is set"""
+    sched = PortScheduler(f"test-{uuid.uuid4().hex[:8]}")
+    release, started = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    sched.submit(block, priority=SAFETY)
+    assert started.wait(5)
+    yield sched, release
+    release.set()
+
+
+def test_lanes_are_served_by_priority(blocked):
+    sched, release = blocked
+    done = []
+    futures = [sched.submit(done.append, f"poll {i}", key=f"flow{i}")
+               for i in range(3)]
+    futures.append(sched.submit(done.append, "setpoint", priority=SETPOINT))
+    futures.append(sched.submit(done.append, "rf off", priority=SAFETY))
+    assert sched.depth() == {"safety": 1, "setpoint": 1, "telemetry": 3}
+    release.set()
+    for future in futures:
+        future.result(5)
+    # The setpoint overtakes the polls queued before it, FIFO in a lane
+    assert done == ["rf off", "setpoint", "poll 0", "poll 1", "poll 2"]
+
+
+def test_queued_polls_are_coalesced(blocked):
+    sched, release = blocked
+    calls = []
+
+    def poll():
+        calls.append(1)
+        return len(calls)
+
+    first = sched.submit(poll, key="flow1")
+    assert sched.submit(poll, key="flow1") is first
+    other = sched.submit(poll, key="flow2")
+    # Setpoints are never coalesced
+    setpoints = [sched.submit(poll, key="flow1", priority=SETPOINT)
+                 for _ in range(2)]
+    release.set()
+    assert sorted([first.result(5), other.result(5)] +
+                  [future.result(5) for future in setpoints]) == [1, 2, 3, 4]
+    assert len(calls) == 4
+    assert sched.metrics()["telemetry"]["coalesced"] == 1
+    # Once served, a key is queued again
+    assert sched.submit(poll, key="flow1") is not first
+
+
+def test_call_and_errors():
+    sched = PortScheduler(f"test-{uuid.uuid4().hex[:8]}")
+    assert sched.call(pow, 2, 10, priority=SETPOINT, timeout=5) == 1024
+
+    def fail():
+        raise OSError("no answer")
+
+    with pytest.raises(OSError, match="no answer"):
+        sched.call(fail, timeout=5)
+    metrics = sched.metrics()
+    assert (metrics["setpoint"]["count"], metrics["setpoint"]["errors"]) == \
+           (1, 0)
+    assert (metrics["telemetry"]["count"],
+            metrics["telemetry"]["errors"]) == (1, 1)
+    with pytest.raises(ValueError, match="Unknown priority"):
+        sched.submit(pow, 2, 2, priority=TELEMETRY + 1)
+
+
+def test_one_scheduler_per_port():
+    port = f"test-{uuid.uuid4().hex[:8]}"
+    assert scheduler(port) is scheduler(port)
+    assert scheduler(port) is not scheduler(f"{port}-other")
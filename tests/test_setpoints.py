@@ -0,0 +1,78 @@
+import pytest
+
+from ressources.setpoints import SetpointCache
+
+
+class Port:
+    """Bytes written to a device, by a writer succeeding or not"""
+
+    def __init__(self):
+        self.sent = []
+        self.fails = False
+
+    def write(self, data):
+        self.sent.append(data)
+        return not self.fails
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.]
+    monkeypatch.setattr("ressources.setpoints.monotonic", lambda: now[0])
+    return now
+
+
+def test_unchanged_setpoints_send_nothing():
+    cache, port = SetpointCache(), Port()
+    assert cache.write("power", 50, port.write, b"P50")
+    assert cache.write("power", 50, port.write, b"P50")
+    assert port.sent == [b"P50"]
+    assert cache.write("power", 60, port.write, b"P60")
+    assert cache.write("power", 60, port.write, b"P60", force=True)
+    assert port.sent == [b"P50", b"P60", b"P60"]
+    assert cache.setpoint("power") == 60
+
+
+def test_failed_writes_are_retried():
+    cache, port = SetpointCache(), Port()
+    cache.write("power", 50, port.write, b"P50")
+    port.fails = True
+    assert not cache.write("power", 60, port.write, b"P60")
+    assert cache.setpoint("power") is None
+    port.fails = False
+    # Whatever the device holds, the next write is sent
+    assert cache.write("power", 50, port.write, b"P50")
+    assert port.sent == [b"P50", b"P60", b"P50"]
+
+
+def test_invalidate():
+    cache, port = SetpointCache(), Port()
+    cache.write("power", 50, port.write, b"P50")
+    cache.write("mode", 1, port.write, b"M1")
+    cache.invalidate("power")
+    assert (cache.setpoint("power"), cache.setpoint("mode")) == (None, 1)
+    cache.invalidate()
+    assert cache.setpoint("mode") is None
+    cache.write("mode", 1, port.write, b"M1")
+    assert port.sent == [b"P50", b"M1", b"M1"]
+
+
+def test_readbacks(clock):
+    cache, reads = SetpointCache(), []
+
+    def read(value):
+        reads.append(value)
+        return value
+
+    assert cache.readback("power", read, 48) == 48
+    clock[0] += 2.
+    assert cache.readback("power", read, 49, max_age=5.) == 48
+    assert cache.readback("power", read, 49) == 48
+    assert cache.readback("power", read, 49, max_age=1.) == 49
+    assert cache.snapshot() == {"power": (49, 0.)}
+    # A new setpoint drops the readback of the previous one
+    cache.write("power", 60, lambda: True)
+    assert cache.readback("power", read, 59, max_age=5.) == 59
+    cache.update("power", 60)
+    assert cache.readback("power", read, 0) == 60
+    assert reads == [48, 49, 59]
@@ -0,0 +1,156 @@
+import sys
+import threading
+import uuid
+from multiprocessing import resource_tracker
+
+import pytest
+
+import ressources.statusblock as statusblock
+from ressources.statusblock import StatusBlock, TELEMETRY
+
+
+def _pair():
+    """Writer and reader of a new block, in the same process"""
+    name = f"aldpi_test_{uuid.uuid4().hex[:8]}"
+    writer = StatusBlock.create(name)
+    reader = StatusBlock.attach(name)
+    # attach() unregistered the block of the writer from the tracker
+    resource_tracker.register(writer._shm._name, "shared_memory")
+    return writer, reader
+
+
+@pytest.fixture
+def blocks():
+    writer, reader = _pair()
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+
+def test_update_and_read(blocks):
+    writer, reader = blocks
+    writer.update(recipe="PEALD", cycle=3, cycles=10, relays=0b101, rf=True,
+                  telemetry={"forward": 30., "flow1": 12.5})
+    writer.flush()
+    status = reader.read()
+    assert (status["recipe"], status["cycle"], status["cycles"]) == \
+        ("PEALD", 3, 10)
+    assert status["relays"] == 0b101 and status["rf"]
+    assert status["telemetry"]["forward"] == 30.
+    assert status["telemetry"]["flow1"] == 12.5
+    assert status["sequence"] % 2 == 0
+
+
+def test_unknown_fields(blocks):
+    writer, _ = blocks
+    with pytest.raises(KeyError):
+        writer.update(speed=1)
+    with pytest.raises(KeyError):
+        writer.update(telemetry={"pressure": 1.})
+
+
+def test_update_from_run(blocks):
+    writer, reader = blocks
+    writer.update_from_run({"running": True, "recipe": "ALD", "cycle": 2,
+                            "N": 5, "step": 3})
+    writer.flush()
+    status = reader.read()
+    assert (status["recipe"], status["cycle"], status["cycles"],
+            status["step"]) == ("ALD", 2, 5, 3)
+
+
+def test_concurrent_updates_are_all_written(blocks):
+    writer, reader = blocks
+
+    def update(slot):
+        for value in range(1000):
+            writer.update(telemetry={slot: float(value)})
+
+    threads = [threading.Thread(target=update, args=(slot,))
+               for slot in TELEMETRY]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.flush()
+    assert reader.read()["telemetry"] == {slot: 999. for slot in TELEMETRY}
+
+
+def test_read_during_a_write(blocks):
+    writer, reader = blocks
+    sequence = reader.read()["sequence"]
+    # A write in progress: odd sequence
+    statusblock._SEQUENCE.pack_into(reader._buf, 0, sequence + 1)
+    with pytest.raises(TimeoutError):
+        reader.read(retries=10)
+    statusblock._SEQUENCE.pack_into(reader._buf, 0, sequence + 2)
+    assert reader.read(retries=1)["sequence"] == sequence + 2
+
+
+def test_read_retries_when_written_meanwhile(blocks, monkeypatch):
+    writer, reader = blocks
+    writer.update(cycle=1, cycles=1)
+    writer.flush()
+    body, reads = statusblock._BODY, []
+
+    class Overwritten:
+        """The body, written by the writer while the first read of it"""
+        size = body.size
+        pack = body.pack
+
+        def unpack_from(self, buffer, offset):
+            if not reads:
+                values = body.unpack_from(buffer, offset)
+                sequence = statusblock._SEQUENCE.unpack_from(buffer, 0)[0]
+                writer.update(cycle=2, cycles=2)
+                writer.flush()
+                assert statusblock._SEQUENCE.unpack_from(buffer, 0)[0] > \
+                    sequence
+                reads.append(values)
+                return values
+            reads.append(None)
+            return body.unpack_from(buffer, offset)
+
+    monkeypatch.setattr(statusblock, "_BODY", Overwritten())
+    status = reader.read()
+    assert len(reads) == 2
+    assert (status["cycle"], status["cycles"]) == (2, 2)
+
+
+def test_readers_never_see_torn_writes(blocks):
+    writer, reader = blocks
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    done = threading.Event()
+
+    def write():
+        for i in range(20000):
+            writer.update(cycle=i, cycles=i, step=i)
+        done.set()
+
+    try:
+        threading.Thread(target=write).start()
+        while not done.is_set():
+            status = reader.read()
+            assert status["cycle"] == status["cycles"] == status["step"]
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def test_invalid_values(blocks, capsys):
+    writer, reader = blocks
+    writer.update(step=1)
+    writer.update(cycle="two")
+    writer.update(cycles=3)
+    writer.flush()
+    status = reader.read()
+    assert (status["step"], status["cycle"], status["cycles"]) == (1, 0, 3)
+    assert "struct.error" in capsys.readouterr().err
+
+
+def test_close_writes_the_last_updates():
+    writer, reader = _pair()
+    writer.update(step=7)
+    writer.close()
+    assert reader.read()["step"] == 7
+    reader.close()
@@ -0,0 +1,54 @@
+import math
+import random
+
+import pytest
+
+from ressources.timeseries import TimeSeries
+
+
+def _times(rows):
+    return [t for t, _ in rows]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bucket_times_never_decrease(seed):
+    rng = random.Random(seed)
+    series = TimeSeries(["a"], width=2)
+    t, cursor, shown = 0., None, []
+    for _ in range(2000):
+        t += rng.choice([0.3, 1., 2.5, 7.])
+        series.append(t, {"a": rng.random()})
+        reset, rows, cursor = series.since(cursor)
+        shown = rows if reset else shown + rows
+        times = _times(shown)
+        assert times == sorted(times)
+        assert all(start <= t for start in times)
+    # Never more than 2*width buckets
+    assert len(shown) <= 2 * 2 * series.width
+
+
+def test_merge_keeps_the_extremes():
+    series = TimeSeries(["a"], width=2)
+    for t in range(40):
+        series.append(float(t), {"a": float(t % 7)})
+    reset, rows, _ = series.since(None)
+    assert series.dt == 16.
+    assert _times(rows) == [0., 8., 16., 24.]
+    # [0, 16): min 0 at t=0 then max 6 at t=6; [16, 32): max 6 at t=20
+    # then min 0 at t=21
+    assert [row["a"] for _, row in rows] == [0., 6., 6., 0.]
+
+
+def test_missing_values_and_cursor():
+    series = TimeSeries(["a", "b"], width=100)
+    series.append(0., {"a": 1., "b": None})
+    series.append(1.5, {"a": float("nan"), "b": 2.})
+    series.append(2.5, {"a": 3.})
+    reset, rows, cursor = series.since(None, ["a", "b"])
+    assert reset and len(rows) == 4
+    assert rows[0][1]["a"] == 1. and math.isnan(rows[0][1]["b"])
+    assert math.isnan(rows[2][1]["a"]) and rows[2][1]["b"] == 2.
+    reset, rows, cursor = series.since(cursor)
+    assert not reset and rows == []
+    series.clear()
+    assert series.since(cursor)[0]
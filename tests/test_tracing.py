@@ -0,0 +1,64 @@
+import io
+import json
+
+from ressources.tracing import (CHUNK, MAX_NAMES, OTHER, TraceRecorder,
+                                export, parse_cycles)
+
+
+def _export(path, cycles=None):
+    out = io.StringIO()
+    export(path, out, cycles)
+    return [event for event in json.loads(out.getvalue())["traceEvents"]
+            if event["ph"] == "X"]
+
+
+def test_long_run(tmp_path):
+    path = str(tmp_path / "run.trace")
+    tracer = TraceRecorder(path)
+    spans = 70000
+    for cycle in range(1, spans + 1):
+        tracer.cycle = cycle
+        tracer.record("Steps", "Pulse", 1.)
+        tracer.record("Cycles", "cycle", 0.5, 1.5)
+    tracer.close()
+    events = _export(path, (100, 65600))
+    assert len(events) == 2 * 65501
+    assert {event["name"] for event in events} == {"Pulse", "cycle"}
+    assert events[-1]["args"]["cycle"] == 65600
+
+
+def test_names_are_bounded(tmp_path):
+    path = str(tmp_path / "run.trace")
+    tracer = TraceRecorder(path)
+    for i in range(MAX_NAMES + 10):
+        tracer.record("Track", f"span {i}", 0., 1.)
+    tracer.close()
+    with open(path + ".json") as file:
+        names = json.load(file)["names"]
+    assert len(names) == MAX_NAMES and names[-1] == OTHER
+    events = _export(path)
+    assert len(events) == MAX_NAMES + 10
+    assert events[-1]["name"] == OTHER
+
+
+def test_names_written_on_change(tmp_path, monkeypatch):
+    path = str(tmp_path / "run.trace")
+    tracer = TraceRecorder(path)
+    opened = []
+    real_open = open
+
+    def counting_open(file, *args, **kwargs):
+        opened.append(file)
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", counting_open)
+    for _ in range(5 * CHUNK):
+        tracer.record("Steps", "Pulse", 0., 1.)
+    tracer.close()
+    assert opened.count(path + ".json") == 1
+
+
+def test_parse_cycles():
+    assert parse_cycles("") is None
+    assert parse_cycles("3") == (3, 3)
+    assert parse_cycles("10-20") == (10, 20)